@@ -0,0 +1,220 @@
+"""帖子热度排行与统计
+
+获取到的帖子列表中的点击数、评论数、创建时间和活跃时间按列保存在 NumPy 数组中，
+排行和分组统计都是对整列的向量化运算，几十万个帖子也只需几毫秒。
+同一帖子再次获取到时原地更新所在行。只保存ID和数值列，不持有帖子对象，
+每个帖子约占 64 字节加一个字典项；排行结果中的帖子也由这些列构建。
+
+排行方式:
+- hot: 热度随发帖时间衰减，(点击数 + 评论数 × COMMENT_WEIGHT) / (小时数 + 2) ^ gravity
+- trend: 互动量的对数按距最后活跃的时间指数衰减，每过 half_life 秒减半
+- hit / comment: 点击数 / 评论数
+"""
+import threading
+import time
+
+import numpy as np
+
+# 一条评论折算的点击数
+COMMENT_WEIGHT = 10
+
+ORDERS = ('hot', 'trend', 'hit', 'comment')
+
+# group 为 (板块ID, 子版块ID) 的分组编号，统计时直接按编号 bincount，无需排序
+_COLUMNS = ('post_id', 'cat_id', 'tag_id', 'group', 'hit', 'comments', 'create_time', 'active_time')
+
+# 排行结果中每个帖子的字段：(中文键, 列名)
+RECORD_FIELDS = (
+    ('帖子ID', 'post_id'),
+    ('子版块ID', 'tag_id'),
+    ('点击数', 'hit'),
+    ('评论数', 'comments'),
+    ('创建时间', 'create_time'),
+    ('活跃时间', 'active_time'),
+)
+
+
+class PostAnalytics:
+    """帖子数值字段的列式存储"""
+
+    def __init__(self, capacity=4096, gravity=1.8, half_life=6 * 3600):
+        """
+        参数:
+            capacity (int): 初始容量，不够时翻倍，默认为4096
+            gravity (float): hot 排行的时间衰减指数，默认为1.8
+            half_life (float): trend 排行的半衰期（秒），默认为6小时
+        """
+        self.gravity = gravity
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._size = 0
+        self._rows = {}       # 帖子ID -> 行号
+        self._groups = {}     # (板块ID, 子版块ID) -> 分组编号
+        for name in _COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=np.int64))
+
+    def __len__(self):
+        return self._size
+
+    def add_posts(self, cat_id, posts):
+        """加入或更新帖子列表中的帖子
+
+        参数:
+            cat_id (int): 板块ID
+            posts (list): 帖子（Post 或同样键名的字典）
+        """
+        if not posts:
+            return
+        with self._lock:
+            rows = []
+            for post in posts:
+                row = self._rows.get(post['帖子ID'])
+                if row is None:
+                    row = self._append(post['帖子ID'])
+                rows.append(row)
+            rows = np.array(rows, dtype=np.int64)
+            tags = [post.get('子版块ID', 0) or 0 for post in posts]
+            self.post_id[rows] = [post['帖子ID'] for post in posts]
+            self.cat_id[rows] = cat_id
+            self.tag_id[rows] = tags
+            self.group[rows] = [self._groups.setdefault((cat_id, tag), len(self._groups)) for tag in tags]
+            self.hit[rows] = [post['点击数'] for post in posts]
+            self.comments[rows] = [post['评论数'] for post in posts]
+            self.create_time[rows] = [post['创建时间'] for post in posts]
+            self.active_time[rows] = [post['活跃时间'] for post in posts]
+
+    def _append(self, post_id):
+        """为新帖子分配一行，容量不够时翻倍"""
+        if self._size == len(self.post_id):
+            for name in _COLUMNS:
+                column = getattr(self, name)
+                grown = np.zeros(len(column) * 2, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                setattr(self, name, grown)
+        row = self._size
+        self._size += 1
+        self._rows[post_id] = row
+        return row
+
+    # ---- 排行 ----
+
+    def scores(self, order, rows, now_ms):
+        """计算指定行的排行分数
+
+        参数:
+            order (str): 排行方式，见 ORDERS
+            rows (ndarray): 行号
+            now_ms (int): 当前时间（毫秒时间戳）
+        """
+        hit = self.hit[rows].astype(np.float64)
+        comments = self.comments[rows].astype(np.float64)
+        if order == 'hit':
+            return hit
+        if order == 'comment':
+            return comments
+        engagement = hit + comments * COMMENT_WEIGHT
+        if order == 'hot':
+            hours = np.maximum(now_ms - self.create_time[rows], 0) / 3600000.0
+            return engagement / (hours + 2.0) ** self.gravity
+        if order == 'trend':
+            idle = np.maximum(now_ms - self.active_time[rows], 0) / 1000.0
+            return np.log1p(engagement) * np.exp2(-idle / self.half_life)
+        raise ValueError(f"不支持的排行方式: {order}，可选: {'、'.join(ORDERS)}")
+
+    def rankings(self, cat_id, tag_id=None, order='hot', limit=20, now=None):
+        """返回板块（或子版块）内排行前 limit 的帖子
+
+        参数:
+            cat_id (int): 板块ID
+            tag_id (int): 子版块ID，默认为None（整个板块）
+            order (str): 排行方式，见 ORDERS，默认为 hot
+            limit (int): 返回的帖子数，默认为20
+            now (float): 计算时间衰减使用的当前时间（秒），默认为当前时间
+
+        返回:
+            (total, ranked): 参与排行的帖子数和 [(分数, 帖子)]，分数从高到低；
+            帖子为包含 RECORD_FIELDS 中各字段的字典
+        """
+        now_ms = int((time.time() if now is None else now) * 1000)
+        with self._lock:
+            mask = self.cat_id[:self._size] == cat_id
+            if tag_id is not None:
+                mask &= self.tag_id[:self._size] == tag_id
+            rows = np.flatnonzero(mask)
+            scores = self.scores(order, rows, now_ms)
+            top = _top_k(scores, limit)
+            columns = [(key, getattr(self, name)[rows[top]].tolist()) for key, name in RECORD_FIELDS]
+            return len(rows), [(float(scores[i]), {key: values[n] for key, values in columns})
+                               for n, i in enumerate(top)]
+
+    # ---- 统计 ----
+
+    def stats(self, now=None, active_window=24 * 3600):
+        """按板块和子版块汇总
+
+        参数:
+            now (float): 当前时间（秒），默认为当前时间
+            active_window (float): 统计多久以内活跃的帖子数（秒），默认为24小时
+
+        返回:
+            list: 每个板块一项，包含 '子版块' 列表，均按帖子数从多到少排列
+        """
+        since_ms = int(((time.time() if now is None else now) - active_window) * 1000)
+        with self._lock:
+            size = self._size
+            groups = list(self._groups)
+            group = self.group[:size]
+            hit = self.hit[:size]
+            active_time = self.active_time[:size]
+            counts = np.bincount(group, minlength=len(groups))
+            hits = np.bincount(group, weights=hit, minlength=len(groups))
+            comments = np.bincount(group, weights=self.comments[:size], minlength=len(groups))
+            recent = np.bincount(group, weights=(active_time >= since_ms).astype(np.float64), minlength=len(groups))
+            max_hits = np.zeros(len(groups), dtype=np.int64)
+            np.maximum.at(max_hits, group, hit)
+            latest = np.zeros(len(groups), dtype=np.int64)
+            np.maximum.at(latest, group, active_time)
+
+        # 分组数只有板块数 × 子版块数，逐组合并到板块即可
+        categories = {}
+        for code, (cat_id, tag_id) in enumerate(groups):
+            if not counts[code]:
+                continue
+            values = [int(counts[code]), int(hits[code]), int(comments[code]), int(max_hits[code]),
+                      int(recent[code]), int(latest[code])]
+            total = categories.setdefault(cat_id, [0, 0, 0, 0, 0, 0, []])
+            for i, value in enumerate(values):
+                total[i] = max(total[i], value) if i in (3, 5) else total[i] + value
+            total[6].append(_summary('子版块ID', tag_id, *values))
+        result = []
+        for cat_id, total in categories.items():
+            summary = _summary('板块ID', cat_id, *total[:6])
+            summary['子版块'] = sorted(total[6], key=lambda tag: -tag['帖子数'])
+            result.append(summary)
+        result.sort(key=lambda category: -category['帖子数'])
+        return result
+
+
+def _top_k(scores, k):
+    """返回分数最高的 k 个下标（从高到低），只对前 k 个排序"""
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _summary(key_name, key, count, hits, comments, max_hit, recent, latest):
+    return {
+        key_name: key,
+        '帖子数': count,
+        '总点击数': hits,
+        '总评论数': comments,
+        '平均点击数': round(hits / count, 1),
+        '平均评论数': round(comments / count, 2),
+        '最高点击数': max_hit,
+        '近期活跃帖子数': recent,
+        '最近活跃时间': latest,
+    }
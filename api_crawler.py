@@ -0,0 +1,714 @@
+"""葫芦侠接口采集器
+
+封装板块、帖子列表、帖子详情和图片的上游请求，以及缓存、镜像、索引、限速和熔断。
+网站（app.py）和命令行（crawler.py）共用这个采集器；本模块不依赖 Flask，
+导入时不会创建网站的全局对象或日志文件。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+from cache import TTLCache, SingleFlight, LRUCache
+from category_index import CategoryIndex
+from transport import HttpTransport, RETRY_STATUSES
+from metrics import Counter, Histogram, stage
+from scheduler import PRIORITY_BACKGROUND, current_priority, priority, run_with_priority
+from circuit_breaker import STALE, UNAVAILABLE, degraded, mark_degraded, reset_degraded
+import upstream
+
+# 上游请求指标，由网站的 /metrics 导出
+UPSTREAM_LATENCY = Histogram('huluxia_upstream_request_seconds', '上游请求耗时（秒）', ['endpoint'])
+UPSTREAM_ERRORS = Counter('huluxia_upstream_errors_total', '上游请求失败次数', ['endpoint', 'reason'])
+UPSTREAM_RETRIES = Counter('huluxia_upstream_retries_total', '经调度器重试的上游请求次数', ['endpoint', 'status'])
+STALE_RESPONSES = Counter('huluxia_stale_responses_total', '上游失败时改为返回最近一次成功数据的次数', ['kind'])
+
+
+def _call_in_worker(level, func, *args):
+    """在线程池中以指定优先级调用 func，返回 (结果, 本次调用标记的降级状态)"""
+    reset_degraded()
+    with priority(level):
+        result = func(*args)
+    return result, degraded()
+
+class HuluxiaCrawler:
+    """葫芦侠数据采集器"""
+    
+    def __init__(self, category_ttl=300, transport=None, base_url=upstream.BASE_URL, max_workers=8, mirror=None,
+                 search_index=None, scheduler=None, prefetch_ttl=60, prefetch_size=256, breaker=None,
+                 stale_ttl=3600, stale_size=1024, parallel_workers=16, analytics=None, max_retries=2):
+        """
+        参数:
+            category_ttl (float): 板块列表缓存有效期（秒），默认为300
+            transport (HttpTransport): 共享的HTTP传输层，默认新建一个连接池。设置了 scheduler 时
+                传输层不应再按状态码重试（retry_statuses=()），由采集器经调度器重试
+            base_url (str): 上游接口地址，测试时可指向本地桩服务
+            max_workers (int): 批量获取帖子详情时的最大并发数，默认为8
+            mirror (Mirror): 本地SQLite镜像，设置后优先从镜像读取并写入获取到的数据
+            search_index (SearchIndex): 全文索引，设置后获取到的帖子和评论会增量加入索引
+            scheduler (CrawlScheduler): 上游请求调度器，设置后按接口限速并按优先级排队
+            prefetch_ttl (float): 预取的评论页的有效期（秒），默认为60
+            prefetch_size (int): 最多保留的预取评论页数，默认为256
+            breaker (CircuitBreaker): 上游熔断器，设置后失败过多的接口会暂停请求、直接失败
+            stale_ttl (float): 上游失败时可以返回多久以内的最近成功数据（秒），默认为3600
+            stale_size (int): 最多保留的最近成功的帖子列表和帖子详情数，默认为1024
+            parallel_workers (int): 同一请求内并发获取不同数据时的线程数，默认为16
+            analytics (PostAnalytics): 帖子热度统计，设置后获取到的帖子列表会加入统计
+            max_retries (int): 设置了 scheduler 时，上游返回限流或5xx后的最大重试次数，默认为2
+        """
+        self.base_url = base_url
+        self.transport = transport or HttpTransport(retry_statuses=() if scheduler is not None else RETRY_STATUSES)
+        self.max_retries = max_retries
+        self.mirror = mirror
+        self.search_index = search_index
+        self.analytics = analytics
+        self.scheduler = scheduler
+        self.breaker = breaker
+        # 合并并发的相同帖子列表/详情请求
+        self.flight = SingleFlight(name='上游请求合并')
+        # 批量获取帖子详情使用的线程池
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='post-detail')
+        # 预取下一页评论：结果放入 comment_pages，翻页时直接使用
+        self.comment_pages = LRUCache(maxsize=prefetch_size, ttl=prefetch_ttl, name='评论页预取')
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='comment-prefetch')
+        # 同一请求内互不依赖的上游调用（如板块信息与帖子列表）并发执行，
+        # 与批量获取分开，避免页面请求排在大批量任务之后
+        self.parallel_executor = ThreadPoolExecutor(max_workers=parallel_workers, thread_name_prefix='parallel-fetch')
+        self._prefetch_lock = threading.Lock()
+        self._prefetching = set()
+        # 最近一次成功获取的帖子列表和帖子详情，上游失败时改为返回这些数据
+        self.last_good = LRUCache(maxsize=stale_size, ttl=stale_ttl, name='最近成功数据')
+        self.headers = dict(upstream.HEADERS)
+        # 帖子列表请求头
+        self.post_headers = dict(upstream.POST_HEADERS)
+        # 帖子详情请求头
+        self.detail_headers = dict(upstream.DETAIL_HEADERS)
+        # 图片请求头
+        self.image_headers = dict(upstream.IMAGE_HEADERS)
+        # 板块列表几乎不变，所有路由共享同一份缓存；缓存值为随列表一起构建的索引
+        self.category_cache = TTLCache(self._load_category_index, ttl=category_ttl, name='板块缓存')
+    
+    def gather(self, *calls):
+        """并发执行多个互不依赖的调用，按顺序返回结果列表，总耗时取决于最慢的一个
+        
+        第一个调用在当前线程中执行，其余的提交到线程池。当前请求的优先级会带到线程池中，
+        各调用标记的降级状态（过期数据/不可用）合并回当前线程；线程池中的阶段耗时
+        不计入当前请求的 Server-Timing。
+        
+        参数:
+            calls: (函数, 参数...) 元组
+        """
+        level = current_priority()
+        futures = [self.parallel_executor.submit(_call_in_worker, level, call[0], *call[1:])
+                   for call in calls[1:]]
+        results = [calls[0][0](*calls[0][1:])]
+        for future in futures:
+            result, marks = future.result()
+            for kind in marks:
+                mark_degraded(kind)
+            results.append(result)
+        return results
+    
+    def get_categories(self):
+        """获取葫芦侠板块信息（带缓存）"""
+        return self.get_category_index().categories
+    
+    def get_category_index(self):
+        """获取板块索引，获取失败时返回空索引
+        
+        刷新失败时缓存继续返回旧的板块列表，此时标记为过期数据。
+        """
+        try:
+            index = self.category_cache.get()
+        except Exception as e:
+            logging.error(f"获取板块信息失败: {str(e)}")
+            mark_degraded(UNAVAILABLE)
+            return CategoryIndex([])
+        if self.category_cache.is_failing():
+            mark_degraded(STALE)
+        return index
+    
+    def get_category(self, category_id):
+        """按板块ID查找板块，未找到返回None"""
+        return self.get_category_index().get(category_id)
+    
+    def _load_category_index(self):
+        """获取板块列表并构建索引，优先使用镜像中未过期的数据"""
+        categories = self.mirror.get_categories() if self.mirror else None
+        if categories is None:
+            categories = self._fetch_categories()
+            self._write_mirror('upsert_categories', categories)
+        return CategoryIndex(categories)
+    
+    def _write_mirror(self, method, *args):
+        """写入本地镜像，失败只记录日志"""
+        if not self.mirror:
+            return
+        try:
+            with stage('store'):
+                getattr(self.mirror, method)(*args)
+        except Exception as e:
+            logging.error(f"写入本地镜像失败: {str(e)}")
+    
+    def _update_index(self, method, *args):
+        """更新全文索引，失败只记录日志"""
+        if self.search_index is None:
+            return
+        try:
+            with stage('store'):
+                getattr(self.search_index, method)(*args)
+        except Exception as e:
+            logging.error(f"更新搜索索引失败: {str(e)}")
+    
+    def _update_analytics(self, cat_id, posts):
+        """把帖子加入热度统计，失败只记录日志"""
+        if self.analytics is None:
+            return
+        try:
+            with stage('store'):
+                self.analytics.add_posts(cat_id, posts)
+        except Exception as e:
+            logging.error(f"更新热度统计失败: {str(e)}")
+    
+    def _request(self, endpoint, url, headers, params=None):
+        """发送GET请求，设置了调度器时对限流和5xx响应重试，返回最后一次的响应
+        
+        每次重试都重新经过熔断检查和调度器排队：失败已报告给调度器，接口速率随之降低，
+        上游的 Retry-After 也会让调度器暂停发放令牌，重试自然退避。
+        """
+        attempt = 0
+        while True:
+            response = self._send(endpoint, url, headers, params)
+            if (self.scheduler is None or response.status_code not in RETRY_STATUSES
+                    or attempt >= self.max_retries):
+                return response
+            attempt += 1
+            UPSTREAM_RETRIES.inc(endpoint, response.status_code)
+            logging.warning(f"上游接口 {endpoint} 返回 HTTP {response.status_code}，第 {attempt} 次重试")
+    
+    def _send(self, endpoint, url, headers, params=None):
+        """经熔断检查和调度器限速后发送一次GET请求，记录耗时与失败次数，
+        并把结果反馈给调度器和熔断器"""
+        if self.breaker is not None:
+            try:
+                self.breaker.allow(endpoint)
+            except Exception:
+                UPSTREAM_ERRORS.inc(endpoint, 'circuit_open')
+                raise
+        if self.scheduler is not None:
+            try:
+                with stage('queue'):
+                    self.scheduler.acquire(endpoint)
+            except Exception:
+                if self.breaker is not None:
+                    self.breaker.release(endpoint)
+                raise
+        
+        started = time.monotonic()
+        try:
+            with stage('upstream'):
+                response = self.transport.get(url, headers=headers, params=params)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            UPSTREAM_LATENCY.observe(elapsed, endpoint)
+            UPSTREAM_ERRORS.inc(endpoint, type(e).__name__)
+            if self.scheduler is not None:
+                self.scheduler.report(endpoint, ok=False, latency=elapsed)
+            if self.breaker is not None:
+                self.breaker.record(endpoint, False)
+            raise
+        
+        elapsed = time.monotonic() - started
+        UPSTREAM_LATENCY.observe(elapsed, endpoint)
+        if not response.ok:
+            UPSTREAM_ERRORS.inc(endpoint, f"HTTP {response.status_code}")
+        # 4xx（如帖子不存在）是正常结果，只有限流和5xx计为失败，熔断器和调度器使用同一判断
+        healthy = response.status_code < 500 and response.status_code != 429
+        if self.breaker is not None:
+            self.breaker.record(endpoint, healthy)
+        if self.scheduler is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            self.scheduler.report(endpoint, ok=healthy, latency=elapsed, status=response.status_code,
+                                  retry_after=float(retry_after) if retry_after.isdigit() else None)
+        return response
+    
+    def fetch_image(self, url):
+        """从图片CDN下载图片，返回 (图片字节, Content-Type)，失败时抛出异常
+        
+        图片不在接口服务器上，不经过调度器限速和熔断器：否则一个页面的十几张图片
+        要排在接口的令牌桶后面，CDN的错误也会计入接口的熔断状态。图片缓存已合并了
+        同一图片的并发下载，这里只记录耗时和失败次数。
+        """
+        started = time.monotonic()
+        try:
+            with stage('upstream'):
+                response = self.transport.get(url, headers=self.image_headers)
+        except Exception as e:
+            UPSTREAM_LATENCY.observe(time.monotonic() - started, 'image')
+            UPSTREAM_ERRORS.inc('image', type(e).__name__)
+            raise
+        UPSTREAM_LATENCY.observe(time.monotonic() - started, 'image')
+        if not response.ok:
+            UPSTREAM_ERRORS.inc('image', f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return response.content, response.headers.get('Content-Type', '')
+    
+    def _fetch_categories(self):
+        """从上游获取板块信息，失败时抛出异常"""
+        # 使用需求文件中指定的板块接口
+        url = urljoin(self.base_url, upstream.CATEGORY_LIST_PATH)
+        logging.info(f"开始获取板块信息: {url}")
+        
+        response = self._request('categories', url, self.headers)
+        response.raise_for_status()  # 如果请求不成功则抛出异常
+        
+        # 解析JSON响应
+        with stage('parse'):
+            data = response.json()
+            categories_data = upstream.parse_categories(data)
+        logging.info(f"成功获取板块信息，状态消息: {data.get('msg', '')}")
+        logging.info(f"共获取到 {len(categories_data)} 个板块")
+        return categories_data
+
+    def get_posts(self, cat_id, tag_id=0, count=20, sort_by=0, start=0):
+        """获取特定板块的帖子列表
+        
+        并发的相同请求只访问一次上游，调用者共享同一个返回值（不应修改）。
+        
+        参数:
+            cat_id (int): 板块ID
+            tag_id (int): 子版块ID，默认为0（全部）
+            count (int): 每页显示的帖子数量，默认为20
+            sort_by (int): 排序方式，默认为0
+            start (int): 分页游标，取上一页返回的“下一页游标”，默认为0（第一页）
+        """
+        key = ('posts', int(cat_id), int(tag_id), int(count), int(sort_by), int(start))
+        try:
+            return self._load_posts(key)
+        except Exception as e:
+            logging.error(f"获取板块帖子列表失败: {str(e)}")
+            return self._fallback(key, upstream.empty_posts(cat_id, tag_id, start))
+
+    def _load_posts(self, key):
+        """依次从本地镜像和上游获取帖子列表，上游失败时抛出异常"""
+        _, cat_id, tag_id, count, sort_by, start = key
+        # 镜像只保存按活跃时间排序的板块首页
+        if self.mirror and not tag_id and sort_by == upstream.SORT_BY_ACTIVE and not start:
+            mirrored = self.mirror.get_posts(cat_id, count)
+            if mirrored is not None:
+                # 镜像中的帖子可能由其他进程（采集 worker）写入，同样加入热度统计
+                self._update_analytics(cat_id, mirrored['帖子列表'])
+                return mirrored
+        
+        return self.flight.do(key, lambda: self._remember(key, self.fetch_posts(cat_id, tag_id, count, sort_by, start)))
+
+    def _remember(self, key, value):
+        """记录最近一次成功获取的数据"""
+        self.last_good.set(key, value)
+        return value
+
+    def _fallback(self, key, default):
+        """上游失败时返回最近一次成功的数据并标记为过期，没有时返回 default 并标记为不可用"""
+        stale = self.last_good.get(key)
+        if stale is None:
+            mark_degraded(UNAVAILABLE)
+            return default
+        mark_degraded(STALE)
+        STALE_RESPONSES.inc(key[0])
+        return stale
+
+    def _fetch_posts(self, cat_id, tag_id, count, sort_by, start):
+        """从上游获取帖子列表，失败时返回空列表"""
+        try:
+            return self.fetch_posts(cat_id, tag_id, count, sort_by, start)
+        except Exception as e:
+            logging.error(f"获取板块帖子列表失败: {str(e)}")
+            return upstream.empty_posts(cat_id, tag_id, start)
+
+    def fetch_posts(self, cat_id, tag_id=0, count=20, sort_by=0, start=0):
+        """直接从上游获取帖子列表并写入镜像和索引，失败时抛出异常
+        
+        不读取镜像、不合并并发请求，供采集任务使用。参数含义同 get_posts。
+        """
+        # 构建帖子列表接口URL
+        url = f"{self.base_url}{upstream.POST_LIST_PATH}"
+        params = upstream.post_list_params(cat_id, tag_id, count, sort_by, start)
+        
+        logging.info(f"开始获取板块帖子列表: 板块ID={cat_id}, 子版块ID={tag_id}, 游标={start}")
+        
+        response = self._request('posts', url, self.post_headers, params)
+        response.raise_for_status()
+        
+        # 解析JSON响应
+        with stage('parse'):
+            data = response.json()
+            posts_data = upstream.parse_posts(data, cat_id, tag_id, start)
+        logging.info(f"成功获取板块帖子列表，状态消息: {data.get('msg', '')}")
+        
+        self._write_mirror('upsert_posts', cat_id, posts_data['帖子列表'])
+        self._update_index('add_posts', posts_data['帖子列表'])
+        self._update_analytics(cat_id, posts_data['帖子列表'])
+        return posts_data
+
+    def iter_post_pages(self, cat_id, tag_id=0, count=20, sort_by=0, start=0):
+        """逐页遍历板块下的帖子列表
+        
+        每次产出 (本页游标, 帖子列表数据)，直到没有更多帖子为止。
+        某页获取失败时抛出异常（不当作最后一页），可从该页的游标重新开始。
+        参数含义同 get_posts。
+        """
+        cursor = start
+        while True:
+            page = self._load_posts(('posts', int(cat_id), int(tag_id), int(count), int(sort_by), int(cursor)))
+            yield cursor, page
+            next_cursor = page['下一页游标']
+            if not page['帖子列表'] or not page['是否有更多'] or next_cursor == cursor:
+                return
+            cursor = next_cursor
+
+    def iter_posts(self, cat_id, tag_id=0, limit=None, count=20, sort_by=0, start=0, prefetch=1):
+        """逐条遍历板块下的帖子，按需翻页
+        
+        后台线程最多预取 prefetch 页，内存占用与板块帖子总数无关。
+        提前结束遍历（break 或关闭生成器）时后台线程随之退出；
+        某页获取失败时，已预取的帖子照常产出，之后抛出该异常。
+        
+        参数:
+            cat_id (int): 板块ID
+            tag_id (int): 子版块ID，默认为0（全部）
+            limit (int): 最多返回的帖子数量，默认为None（不限）
+            count (int): 每页请求的帖子数量，默认为20
+            sort_by (int): 排序方式，默认为0
+            start (int): 起始分页游标，默认为0（第一页）
+            prefetch (int): 预取的页数，默认为1
+        """
+        pages = queue.Queue(maxsize=max(prefetch, 1))
+        stop = threading.Event()
+        
+        def offer(item):
+            # 阻塞等待消费者取走，期间检查是否已停止
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            # 预取属于后台请求，不与交互请求抢占令牌
+            try:
+                with priority(PRIORITY_BACKGROUND):
+                    for _, page in self.iter_post_pages(cat_id, tag_id, count, sort_by, start):
+                        if not offer(page):
+                            return
+            except Exception as e:
+                # 交给消费者抛出，不当作遍历结束
+                offer(e)
+                return
+            offer(None)
+        
+        producer = threading.Thread(target=produce, daemon=True, name=f"iter-posts-{cat_id}")
+        producer.start()
+        
+        yielded = 0
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                for post in page['帖子列表']:
+                    if limit is not None and yielded >= limit:
+                        return
+                    yield post
+                    yielded += 1
+        finally:
+            stop.set()
+
+    def iter_export_records(self, cat_id, tag_id=0, with_details=False, count=20, sort_by=0, start=0):
+        """逐页产出板块导出记录，用于NDJSON导出
+        
+        每次产出 (下一页游标, 本页记录列表)。每条记录为帖子数据，附带所在页的
+        游标（'游标'），需要详情时并发获取并放在 '详情' 字段（失败为None）。
+        任意时刻只在内存中保留一页数据。帖子列表获取失败时抛出异常，
+        可从最后产出的下一页游标继续。
+        """
+        for cursor, page in self.iter_post_pages(cat_id, tag_id, count, sort_by, start):
+            posts = page['帖子列表']
+            details = {}
+            if with_details and posts:
+                details, _ = self.get_post_details([post['帖子ID'] for post in posts])
+            
+            records = []
+            for post in posts:
+                record = dict(post)
+                record['游标'] = cursor
+                if with_details:
+                    record['详情'] = details.get(post['帖子ID'])
+                records.append(record)
+            yield page['下一页游标'], records
+
+    def get_post_detail(self, post_id, page_no=1, page_size=20):
+        """获取帖子详细内容
+        
+        并发的相同请求只访问一次上游，调用者共享同一个返回值（不应修改）。
+        
+        参数:
+            post_id (int): 帖子ID
+            page_no (int): 评论页码，默认为1
+            page_size (int): 每页评论数量，默认为20
+        """
+        key = ('detail', int(post_id), int(page_no), int(page_size))
+        prefetched = self.comment_pages.get(key)
+        if prefetched is not None:
+            return prefetched
+        try:
+            return self._load_post_detail(key)
+        except Exception as e:
+            logging.error(f"获取帖子详情失败: {str(e)}")
+            return self._fallback(key, None)
+
+    def _load_post_detail(self, key):
+        """依次从本地镜像和上游获取帖子详情，上游失败时抛出异常"""
+        _, post_id, page_no, page_size = key
+        if self.mirror:
+            mirrored = self.mirror.get_post_detail(post_id, page_no, page_size)
+            if mirrored is not None:
+                return mirrored
+        
+        return self.flight.do(key, lambda: self._remember(key, self.fetch_post_detail(post_id, page_no, page_size)))
+
+    def prefetch_comments(self, post_id, page_no, page_size=20, max_pending=32):
+        """在后台获取帖子的一页评论，之后请求这一页时直接返回
+        
+        已预取或正在预取的页不会重复提交；等待中的预取超过 max_pending 个时放弃本次预取。
+        预取使用后台优先级，不与页面请求抢占上游配额。
+        
+        参数:
+            post_id (int): 帖子ID
+            page_no (int): 评论页码
+            page_size (int): 每页评论数量，默认为20
+            max_pending (int): 最多同时等待的预取数，默认为32
+        
+        返回:
+            bool: 是否提交了预取
+        """
+        key = ('detail', int(post_id), int(page_no), int(page_size))
+        with self._prefetch_lock:
+            if key in self._prefetching or len(self._prefetching) >= max_pending or key in self.comment_pages:
+                return False
+            self._prefetching.add(key)
+        self.prefetch_executor.submit(self._prefetch, key)
+        return True
+
+    def _prefetch(self, key):
+        try:
+            with priority(PRIORITY_BACKGROUND):
+                detail = self._load_post_detail(key)
+            if detail is not None:
+                self.comment_pages.set(key, detail)
+        except Exception as e:
+            logging.error(f"预取评论失败: 帖子ID={key[1]} 页码={key[2]}: {str(e)}")
+        finally:
+            with self._prefetch_lock:
+                self._prefetching.discard(key)
+
+    def iter_comment_pages(self, post_id, page_no=1, page_size=20, concurrency=4):
+        """按页码顺序逐页产出帖子的评论
+        
+        每次产出 (页码, 帖子详情)。第一页之后按帖子的评论数推算总页数，
+        最多同时获取 concurrency 页；某页评论不足一页时结束（评论数偏少时继续往后翻）。
+        某页获取失败时记录日志并结束，可从该页码重新开始。
+        
+        参数:
+            post_id (int): 帖子ID
+            page_no (int): 起始页码，默认为1
+            page_size (int): 每页评论数量，默认为20
+            concurrency (int): 同时获取的最大页数，默认为4
+        """
+        first = self.get_post_detail(post_id, page_no, page_size)
+        if first is None:
+            return
+        yield page_no, first
+        if not first['是否有更多评论']:
+            return
+        
+        # 线程池中的任务沿用调用者的请求优先级
+        level = current_priority()
+        last_page = max(page_no + 1, -(-first['评论数'] // page_size))
+        next_page = page_no + 1
+        pending = deque()
+        try:
+            while True:
+                while next_page <= last_page and len(pending) < max(concurrency, 1):
+                    future = self.executor.submit(run_with_priority, level, self.get_post_detail,
+                                                  post_id, next_page, page_size)
+                    pending.append((next_page, future))
+                    next_page += 1
+                if not pending:
+                    return
+                
+                current, future = pending.popleft()
+                detail = future.result()
+                if detail is None:
+                    logging.error(f"获取评论失败: 帖子ID={post_id} 页码={current}")
+                    return
+                yield current, detail
+                if not detail['是否有更多评论']:
+                    return
+                if current == last_page:
+                    last_page += 1
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def fetch_post_detail(self, post_id, page_no=1, page_size=20):
+        """直接从上游获取帖子详情并写入镜像和索引，失败时抛出异常
+        
+        不读取镜像和预取结果、不合并并发请求，供采集任务使用。参数含义同 get_post_detail。
+        """
+        # 构建帖子详情接口URL
+        url = f"{self.base_url}{upstream.POST_DETAIL_PATH}"
+        params = upstream.post_detail_params(post_id, page_no, page_size)
+        
+        logging.info(f"开始获取帖子详情: 帖子ID={post_id}")
+        
+        response = self._request('detail', url, self.detail_headers, params)
+        response.raise_for_status()
+        
+        # 解析JSON响应
+        with stage('parse'):
+            data = response.json()
+            post_detail = upstream.parse_post_detail(data, page_no, page_size)
+        self._write_mirror('upsert_post_detail', post_detail)
+        self._update_index('add_post_detail', post_detail)
+        return post_detail
+
+    def get_post_details(self, post_ids, page_no=1, page_size=20, timeout=None):
+        """并发获取多个帖子的详细内容
+        
+        重复的帖子ID只请求一次。单个帖子变慢不会阻塞其他帖子，
+        整体耗时接近最慢的一次请求（或 timeout）。上游失败与帖子不存在分别报告，
+        各帖子标记的降级状态（过期数据/不可用）合并到当前线程。
+        
+        参数:
+            post_ids (list): 帖子ID列表
+            page_no (int): 评论页码，默认为1
+            page_size (int): 每页评论数量，默认为20
+            timeout (float): 等待所有请求完成的最长时间（秒），默认为None（一直等待）
+        
+        返回:
+            (results, errors): {帖子ID: 帖子详情} 和 {帖子ID: 错误信息}
+        """
+        post_ids = list(dict.fromkeys(post_ids))
+        # 线程池中的任务沿用调用者的请求优先级
+        level = current_priority()
+        futures = {self.executor.submit(_call_in_worker, level, self.get_post_detail,
+                                        post_id, page_no, page_size): post_id
+                   for post_id in post_ids}
+        wait(futures, timeout=timeout)
+        
+        results = {}
+        errors = {}
+        for future, post_id in futures.items():
+            if not future.done():
+                future.cancel()
+                errors[post_id] = '获取超时'
+            elif future.exception() is not None:
+                errors[post_id] = str(future.exception())
+                mark_degraded(UNAVAILABLE)
+            else:
+                detail, marks = future.result()
+                for kind in marks:
+                    mark_degraded(kind)
+                if detail is not None:
+                    results[post_id] = detail
+                elif UNAVAILABLE in marks:
+                    errors[post_id] = '上游服务暂时不可用'
+                else:
+                    errors[post_id] = f"未找到ID为 {post_id} 的帖子"
+        return results, errors
+
+    def sync_category(self, cat_id, count=50, max_pages=20):
+        """把板块的最新变化增量同步到本地镜像
+        
+        按活跃时间倒序翻页，遇到不晚于上次水位线的帖子即停止，
+        然后只重新获取活跃时间有变化的帖子详情（第一页评论）。
+        某页获取失败、翻到 max_pages 页仍未到达水位线或有详情获取失败时，
+        已取到的变化照常写入镜像，但不推进水位线，下次同步重新检查这些帖子。
+        
+        参数:
+            cat_id (int): 板块ID
+            count (int): 每页获取的帖子数量，默认为50
+            max_pages (int): 单次同步最多翻的页数，默认为20
+        """
+        if not self.mirror:
+            raise RuntimeError("未配置本地镜像，无法同步")
+        
+        with priority(PRIORITY_BACKGROUND):
+            return self._sync_category(cat_id, count, max_pages)
+    
+    def _sync_category(self, cat_id, count, max_pages):
+        """执行一次板块同步，参数同 sync_category"""
+        watermark = self.mirror.get_watermark(cat_id)
+        newest = watermark
+        changed = []
+        pages = 0
+        cursor = 0
+        complete = False
+        while pages < max_pages:
+            try:
+                page = self.fetch_posts(cat_id, 0, count, upstream.SORT_BY_ACTIVE, cursor)
+            except Exception as e:
+                logging.error(f"同步板块 {cat_id} 时获取第 {pages + 1} 页失败: {str(e)}")
+                break
+            posts = page['帖子列表']
+            if not posts:
+                complete = True
+                break
+            pages += 1
+            newer = [post for post in posts if post['活跃时间'] > watermark]
+            changed.extend(post['帖子ID'] for post in newer)
+            newest = max(newest, max(post['活跃时间'] for post in posts))
+            if len(newer) < len(posts) or not page['是否有更多'] or page['下一页游标'] == cursor:
+                complete = True
+                break
+            cursor = page['下一页游标']
+        
+        if not pages:
+            logging.error(f"同步板块 {cat_id} 失败：未获取到帖子列表")
+            return {'板块ID': cat_id, '页数': 0, '变化帖子数': 0, '更新详情数': 0}
+        
+        to_refresh = self.mirror.changed_posts(changed)
+        reset_degraded()
+        details, errors = self.get_post_details(to_refresh)
+        # 详情来自过期数据或上游不可用时没有写入镜像；不存在的帖子不影响水位线
+        if degraded():
+            complete = False
+        if complete:
+            self.mirror.set_watermark(cat_id, newest)
+        else:
+            logging.warning(f"板块 {cat_id} 本次同步不完整，水位线保持不变")
+        logging.info(f"板块 {cat_id} 同步完成: {pages} 页, {len(changed)} 个帖子有变化, "
+                     f"更新详情 {len(details)} 个, 失败 {len(errors)} 个")
+        return {'板块ID': cat_id, '页数': pages, '变化帖子数': len(changed), '更新详情数': len(details)}
+
+def start_mirror_sync(crawler, cat_ids, interval=60):
+    """启动后台线程，定期把指定板块增量同步到本地镜像"""
+    def run():
+        while True:
+            for cat_id in cat_ids:
+                try:
+                    crawler.sync_category(cat_id)
+                except Exception as e:
+                    logging.error(f"同步板块 {cat_id} 失败: {str(e)}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=run, daemon=True, name='mirror-sync')
+    thread.start()
+    return thread
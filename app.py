@@ -1,10 +1,63 @@
-from flask import Flask, render_template, jsonify, request
-import requests
-from urllib.parse import urljoin
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context, g, make_response, redirect, send_file
+from flask import before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
+from urllib.parse import urlencode
+import atexit
+import functools
+import hashlib
 import logging
-from datetime import datetime
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from cache import ResponseCache
+from content import render_content, cache_stats as content_cache_stats, set_image_url
+from transport import HttpTransport
+from mirror import Mirror
+from search_index import SearchIndex
+from image_cache import ImageCache
+from metrics import REGISTRY, Counter, Histogram, SIZE_BUCKETS, begin_trace, end_trace, current_trace, stage
+from scheduler import CrawlScheduler, PRIORITY_BACKGROUND, priority
+from compression import compress_response
+from change_feed import ChangeFeed
+from analytics import PostAnalytics, ORDERS
+from circuit_breaker import CircuitBreaker, STALE, UNAVAILABLE, degraded, reset_degraded
+from api_crawler import HuluxiaCrawler, start_mirror_sync
+import models
+import upstream
+
+
+class JSONProvider(DefaultJSONProvider):
+    """API响应的JSON编码
+
+    中文不再转义为 \\uXXXX；模型在定义时已按键排序，编码时不再排序。
+    紧凑输出时使用 models.dumps（安装了 orjson 时由它编码），响应体直接使用编码后的字节。
+    """
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # 调试模式下 jsonify 要求缩进输出，交给标准库
+        if kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        return models.dumps(obj)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(models.dumpb(obj) + b'\n', mimetype=self.mimetype)
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, models.Model):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 
 # 配置日志
 logging.basicConfig(
@@ -16,6 +69,16 @@ logging.basicConfig(
     ]
 )
 
+# 运行指标，由 /metrics 导出
+REQUEST_LATENCY = Histogram('huluxia_http_request_seconds', '请求处理耗时（秒，不含流式响应的输出）', ['endpoint', 'status'])
+RESPONSE_SIZE = Histogram('huluxia_http_response_bytes', '响应体大小（字节）', ['endpoint'], buckets=SIZE_BUCKETS)
+TEMPLATE_RENDER = Histogram('huluxia_template_render_seconds', '模板渲染耗时（秒）', ['template'])
+FORMAT_CONTENT = Histogram('huluxia_format_content_seconds', '帖子内容转换为HTML的耗时（秒）')
+COMPRESSED_RESPONSES = Counter('huluxia_compressed_responses_total', '压缩后返回的响应数', ['encoding'])
+
+# 设置后所有响应都带 Server-Timing 头；否则只有请求带 X-Server-Timing 头时才返回
+SERVER_TIMING_ALWAYS = os.environ.get('HULUXIA_SERVER_TIMING') == '1'
+
 # 添加时间戳格式化过滤器
 @app.template_filter('datetime')
 def format_datetime(timestamp):
@@ -29,326 +92,273 @@ def format_datetime(timestamp):
 @app.template_filter('format_content')
 def format_content(content):
     """将帖子内容中的复杂格式转换为HTML"""
-    if not content:
-        return ""
-    
-    import re
-    
-    # 1. 处理<text>标签，并添加段落标签
-    def process_text(match):
-        text = match.group(1)
-        if text.strip():  # 如果文本不为空
-            return f'<p class="post-text">{text}</p>'
-        return ''
-    
-    content = re.sub(r'<text>(.*?)</text>', process_text, content)
-    
-    # 2. 收集所有图片URL
-    image_urls = []
-    
-    # 处理<image>标签中的图片URL
-    def collect_image_from_tag(match):
-        image_url = match.group(1).split(',')[0]
-        image_urls.append(image_url)
-        return ''  # 移除标签，后面会重新添加图片
-    
-    content = re.sub(r'<image>(.*?)</image>', collect_image_from_tag, content)
-    
-    # 处理@URL格式的图片
-    def collect_image_from_url(match):
-        url = match.group(1)
-        image_urls.append(url)
-        return ''  # 移除URL，后面会重新添加图片
-    
-    content = re.sub(r'@(http[s]?://\S+)', collect_image_from_url, content)
-    
-    # 3. 将换行符转换为HTML段落
-    paragraphs = content.split('\n')
-    content = ''.join([f'<p class="post-text">{p}</p>' for p in paragraphs if p.strip()])
-    
-    # 4. 将收集到的图片按每行3张的方式添加到内容后面，并支持Lightbox点击放大
-    if image_urls:
-        content += '<div class="post-image-gallery">'
-        
-        for i in range(0, len(image_urls), 3):
-            content += '<div class="post-image-row">'
-            # 获取当前行的图片（最多3张）
-            row_images = image_urls[i:i+3]
-            for j, img_url in enumerate(row_images):
-                img_index = i + j + 1  # 图片索引从1开始
-                content += f'''
-                <div class="post-image-container">
-                    <a href="{img_url}" data-lightbox="post-images" data-title="帖子图片 {img_index}">
-                        <img src="{img_url}" alt="帖子图片" class="post-image">
-                    </a>
-                </div>
-                '''
-            content += '</div>'
-        
-        content += '</div>'
-    
-    return content
-
-class HuluxiaCrawler:
-    """葫芦侠数据采集器"""
-    
-    def __init__(self):
-        self.base_url = "http://floor.huluxia.com"
-        self.headers = {
-            'Host': 'floor.huluxia.com',
-            'Accept': 'application/json, text/json, text/x-json, text/javascript, application/xml, text/xml',
-            'User-Agent': 'PHP cURL Request',
-            'Connection': 'Keep-Alive',
-            'Accept-Encoding': 'gzip, deflate'
-        }
-        # 帖子列表请求头
-        self.post_headers = {
-            'Connection': 'close',
-            'Host': 'floor.huluxia.com',
-            'Accept-Encoding': 'gzip',
-            'User-Agent': 'okhttp/3.8.1',
-            'Content-Type': 'application/json; charset=utf-8'
-        }
-        # 帖子详情请求头
-        self.detail_headers = {
-            'Connection': 'close',
-            'Host': 'floor.huluxia.com',
-            'Accept-Encoding': 'gzip',
-            'User-Agent': 'okhttp/3.8.1',
-            'Content-Type': 'application/json; charset=utf-8'
-        }
-    
-    def get_categories(self):
-        """获取葫芦侠板块信息"""
-        try:
-            # 使用需求文件中指定的板块接口
-            url = urljoin(self.base_url, "/category/list/ANDROID/2.0")
-            logging.info(f"开始获取板块信息: {url}")
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()  # 如果请求不成功则抛出异常
-            
-            # 解析JSON响应
-            data = response.json()
-            logging.info(f"成功获取板块信息，状态消息: {data.get('msg', '')}")
-            
-            # 提取板块数据
-            categories = data.get('categories', [])
-            logging.info(f"共获取到 {len(categories)} 个板块")
-            
-            # 整理板块数据
-            categories_data = []
-            for category in categories:
-                category_info = {
-                    '板块ID': category.get('categoryID', ''),
-                    '板块名称': category.get('title', ''),
-                    '板块描述': category.get('description', ''),
-                    '帖子数量': category.get('postCount', 0),
-                    '浏览数量': category.get('viewCount', 0),
-                    '板块图标': category.get('icon', ''),
-                    '模型类型': category.get('model', 0),
-                    '是否精品': category.get('isGood', 0),
-                    '是否订阅': category.get('isSubscribe', 0),
-                    '排序序号': category.get('seq', 0),
-                    '订阅类型': category.get('subscribeType', 0),
-                }
-                
-                # 提取版主信息
-                moderators = category.get('moderator', [])
-                moderator_names = [mod.get('nick', '') for mod in moderators]
-                category_info['版主'] = '、'.join(moderator_names)
-                
-                # 提取子版块（标签）信息，包含ID和名称
-                tags = category.get('tags', [])
-                category_info['子版块'] = [{'ID': tag.get('ID', ''), '名称': tag.get('name', '')} for tag in tags]
-                
-                categories_data.append(category_info)
-            
-            return categories_data
-            
-        except Exception as e:
-            logging.error(f"获取板块信息失败: {str(e)}")
-            return []
-    
-    def get_posts(self, cat_id, tag_id=0, count=20, sort_by=0):
-        """获取特定板块的帖子列表
-        
-        参数:
-            cat_id (int): 板块ID
-            tag_id (int): 子版块ID，默认为0（全部）
-            count (int): 每页显示的帖子数量，默认为20
-            sort_by (int): 排序方式，默认为0
-        """
-        try:
-            # 构建帖子列表接口URL
-            url = f"{self.base_url}/post/list/ANDROID/4.1.8"
-            params = {
-                'platform': 2,
-                'gkey': '000000',
-                'app_version': '4.3.0.3',
-                'versioncode': 20141494,
-                'market_id': 'floor_web',
-                'count': count,
-                'cat_id': cat_id,
-                'tag_id': tag_id,
-                'sort_by': sort_by
-            }
-            
-            logging.info(f"开始获取板块帖子列表: 板块ID={cat_id}, 子版块ID={tag_id}")
-            
-            response = requests.get(url, headers=self.post_headers, params=params, timeout=10)
-            response.raise_for_status()
-            
-            # 解析JSON响应
-            data = response.json()
-            logging.info(f"成功获取板块帖子列表，状态消息: {data.get('msg', '')}")
-            
-            # 提取帖子数据
-            posts = data.get('posts', [])
-            more = data.get('more', 0)  # 是否有更多帖子
+    with FORMAT_CONTENT.time(), stage('transform'):
+        return render_content(content)
+
+@app.template_filter('image_url')
+def image_url(url, width=None):
+    """把允许代理的图片地址改写为本地图片代理地址，width 为缩略图宽度"""
+    if not url or image_cache is None or not image_cache.is_allowed(url):
+        return url
+    params = {'url': url}
+    if width:
+        params['w'] = width
+    return '/img/?' + urlencode(params)
+
+def start_index_saver(search_index, interval=300):
+    """启动后台线程，定期保存有变化的搜索索引，并在进程退出时保存"""
+    def save():
+        if search_index.dirty:
+            try:
+                search_index.save()
+            except Exception as e:
+                logging.error(f"保存搜索索引失败: {str(e)}")
+    
+    def run():
+        while True:
+            time.sleep(interval)
+            save()
+    
+    atexit.register(save)
+    thread = threading.Thread(target=run, daemon=True, name='search-index-saver')
+    thread.start()
+    return thread
+
+# 创建爬虫实例，同一进程内的所有请求共享一个连接池
+# 限流和5xx响应由采集器经调度器重试，传输层只重试连接错误
+transport = HttpTransport(
+    pool_maxsize=int(os.environ.get('HULUXIA_POOL_SIZE', 16)),
+    max_retries=int(os.environ.get('HULUXIA_MAX_RETRIES', 2)),
+    connect_timeout=float(os.environ.get('HULUXIA_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('HULUXIA_READ_TIMEOUT', 10)),
+    retry_statuses=(),
+)
+# 上游请求限速：每个接口独立的令牌桶，速率在 [最低, 最高] 之间自适应调整
+scheduler = CrawlScheduler(
+    rate=float(os.environ.get('HULUXIA_RATE_LIMIT', 5)),
+    min_rate=float(os.environ.get('HULUXIA_MIN_RATE', 0.5)),
+    max_rate=float(os.environ.get('HULUXIA_MAX_RATE', 20)),
+    max_wait=float(os.environ.get('HULUXIA_QUEUE_MAX_WAIT', 10)),
+)
+# 上游熔断：接口最近的失败比例超过阈值后暂停请求，期间直接返回最近一次成功的数据
+breaker = CircuitBreaker(
+    failure_rate=float(os.environ.get('HULUXIA_BREAKER_FAILURE_RATE', 0.5)),
+    min_requests=int(os.environ.get('HULUXIA_BREAKER_MIN_REQUESTS', 10)),
+    open_seconds=float(os.environ.get('HULUXIA_BREAKER_OPEN_SECONDS', 30)),
+)
+# 设置 HULUXIA_MIRROR_DB 后启用本地镜像
+mirror = None
+if os.environ.get('HULUXIA_MIRROR_DB'):
+    mirror = Mirror(os.environ['HULUXIA_MIRROR_DB'], max_age=float(os.environ.get('HULUXIA_MIRROR_MAX_AGE', 600)))
+# 全文索引始终在内存中维护，设置 HULUXIA_SEARCH_INDEX 后定期保存到磁盘
+search_index = SearchIndex(os.environ.get('HULUXIA_SEARCH_INDEX'))
+if search_index.path:
+    start_index_saver(search_index, interval=float(os.environ.get('HULUXIA_SEARCH_SAVE_INTERVAL', 300)))
+# 帖子热度排行与统计，数据来自获取过的帖子列表
+analytics = PostAnalytics(half_life=float(os.environ.get('HULUXIA_TREND_HALF_LIFE', 6 * 3600)))
+crawler = HuluxiaCrawler(
+    category_ttl=float(os.environ.get('HULUXIA_CATEGORY_TTL', 300)),
+    transport=transport,
+    base_url=os.environ.get('HULUXIA_BASE_URL', upstream.BASE_URL),
+    max_workers=int(os.environ.get('HULUXIA_DETAIL_WORKERS', 8)),
+    mirror=mirror,
+    search_index=search_index,
+    analytics=analytics,
+    scheduler=scheduler,
+    prefetch_ttl=float(os.environ.get('HULUXIA_COMMENT_PREFETCH_TTL', 60)),
+    parallel_workers=int(os.environ.get('HULUXIA_PARALLEL_WORKERS', 16)),
+    breaker=breaker,
+    stale_ttl=float(os.environ.get('HULUXIA_STALE_MAX_AGE', 3600)),
+    max_retries=int(os.environ.get('HULUXIA_MAX_RETRIES', 2)),
+)
+# 图片代理：头像、板块图标和帖子图片经本地磁盘缓存转发，并按需生成缩略图
+image_cache = None
+if os.environ.get('HULUXIA_IMAGE_PROXY', '1') != '0':
+    image_cache = ImageCache(
+        os.environ.get('HULUXIA_IMAGE_CACHE_DIR', 'image_cache'),
+        crawler.fetch_image,
+        max_bytes=int(float(os.environ.get('HULUXIA_IMAGE_CACHE_MB', 512)) * 1024 * 1024),
+        allowed_hosts=[host.strip() for host in os.environ.get('HULUXIA_IMAGE_HOSTS', 'huluxia.com,huluxia.net').split(',')
+                       if host.strip()],
+    )
+    # 帖子内容中的图库同样改写为代理地址（转义后放入HTML属性）
+    set_image_url(lambda url, width=None: image_url(url, width).replace('&', '&amp;'))
+if mirror and os.environ.get('HULUXIA_SYNC_CATEGORIES'):
+    start_mirror_sync(
+        crawler,
+        [int(cat_id) for cat_id in os.environ['HULUXIA_SYNC_CATEGORIES'].split(',') if cat_id.strip()],
+        interval=float(os.environ.get('HULUXIA_SYNC_INTERVAL', 60)),
+    )
+
+# 新帖推送：订阅的板块共用一个后台轮询循环
+change_feed = ChangeFeed(
+    crawler.get_posts,
+    interval=float(os.environ.get('HULUXIA_STREAM_INTERVAL', 30)),
+    history=int(os.environ.get('HULUXIA_STREAM_HISTORY', 1000)),
+)
+# 推送连接单次最多订阅的板块数
+MAX_STREAM_CATEGORIES = 20
+# 推送连接在没有事件时发送注释行的间隔（秒），保持连接并及时发现客户端断开
+STREAM_KEEPALIVE = 15
+
+# 批量接口单次允许的最大帖子数量
+MAX_BATCH_POSTS = int(os.environ.get('HULUXIA_MAX_BATCH_POSTS', 100))
+# 批量接口等待所有帖子的最长时间（秒）
+BATCH_TIMEOUT = float(os.environ.get('HULUXIA_BATCH_TIMEOUT', 30))
+# 返回一页评论后是否在后台预取下一页
+COMMENT_PREFETCH = os.environ.get('HULUXIA_COMMENT_PREFETCH', '1') != '0'
+# 评论流接口同时获取的最大页数
+COMMENT_STREAM_CONCURRENCY = int(os.environ.get('HULUXIA_COMMENT_STREAM_CONCURRENCY', 4))
+
+# 响应压缩：文本类响应达到该字节数后按 Accept-Encoding 压缩，设为 HULUXIA_COMPRESS=0 关闭
+COMPRESS_RESPONSES = os.environ.get('HULUXIA_COMPRESS', '1') != '0'
+COMPRESS_MIN_SIZE = int(os.environ.get('HULUXIA_COMPRESS_MIN_SIZE', 1024))
+
+# 上游失败且没有可用的旧数据时返回503的提示
+UPSTREAM_UNAVAILABLE = "上游服务暂时不可用，请稍后重试"
+
+# 页面渲染结果缓存
+page_cache = ResponseCache(maxsize=int(os.environ.get('HULUXIA_PAGE_CACHE_SIZE', 1024)))
+
+def cached_page(ttl, query_args=()):
+    """缓存页面渲染结果，并支持条件请求
+    
+    缓存键由路由、路径参数和 query_args 中列出的查询参数组成。视图需要把
+    上游数据的更新时间（毫秒时间戳）写入 g.upstream_mtime，据此生成
+    Last-Modified；ETag 取页面内容的摘要，评论、点击数等任何变化都会改变 ETag。
+    没有设置 g.upstream_mtime 时（如错误页）或上游失败返回了过期数据时不缓存。客户端携带的
+    If-None-Match/If-Modified-Since 匹配时直接返回304。
+    
+    参数:
+        ttl (float): 缓存有效期（秒）
+        query_args (tuple): 参与缓存键的查询参数名
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            args = tuple(request.args.get(name) for name in query_args)
+            key = (request.endpoint, tuple(sorted(kwargs.items())), args)
             
-            # 整理帖子数据
-            posts_data = []
-            for post in posts:
-                post_info = {
-                    '帖子ID': post.get('postID', ''),
-                    '标题': post.get('title', ''),
-                    '内容': post.get('detail', ''),
-                    '图片': post.get('images', []),
-                    '点击数': post.get('hit', 0),
-                    '评论数': post.get('commentCount', 0),
-                    '创建时间': post.get('createTime', 0),
-                    '活跃时间': post.get('activeTime', 0),
-                    '是否精华': post.get('isGood', 0),
-                }
-                
-                # 提取用户信息
-                user = post.get('user', {})
-                post_info['用户'] = {
-                    '用户ID': user.get('userID', 0),
-                    '昵称': user.get('nick', ''),
-                    '头像': user.get('avatar', ''),
-                    '性别': user.get('gender', 0),
-                    '等级': user.get('level', 0),
-                }
+            entry = page_cache.get(key)
+            if entry is None:
+                g.upstream_mtime = None
+                rv = view(**kwargs)
+                mtime = g.pop('upstream_mtime', None)
+                if mtime is None or not isinstance(rv, str) or degraded():
+                    return rv
                 
-                posts_data.append(post_info)
-            
-            return {
-                '帖子列表': posts_data,
-                '是否有更多': more,
-                '板块ID': cat_id,
-                '子版块ID': tag_id,
-            }
-            
-        except Exception as e:
-            logging.error(f"获取板块帖子列表失败: {str(e)}")
-            return {'帖子列表': [], '是否有更多': 0, '板块ID': cat_id, '子版块ID': tag_id}
-
-    def get_post_detail(self, post_id, page_no=1, page_size=20):
-        """获取帖子详细内容
-        
-        参数:
-            post_id (int): 帖子ID
-            page_no (int): 评论页码，默认为1
-            page_size (int): 每页评论数量，默认为20
-        """
-        try:
-            # 构建帖子详情接口URL
-            url = f"{self.base_url}/post/detail/ANDROID/2.3"
-            params = {
-                'platform': 2,
-                'gkey': '000000',
-                'app_version': '4.0.1.7',
-                'versioncode': 300,
-                'market_id': 'tool_web',
-                '_key': '',
-                'device_code': '[d]c24a6dbd-5823-4c08-a559-19569c07c6fa',
-                'post_id': post_id,
-                'page_no': page_no,
-                'page_size': page_size,
-                'doc': 1
-            }
-            
-            logging.info(f"开始获取帖子详情: 帖子ID={post_id}")
-            
-            response = requests.get(url, headers=self.detail_headers, params=params, timeout=10)
-            response.raise_for_status()
+                etag = hashlib.md5(rv.encode('utf-8')).hexdigest()
+                last_modified = datetime.fromtimestamp(mtime / 1000, tz=timezone.utc)
+                entry = page_cache.set(key, rv, etag, last_modified, ttl)
             
-            # 解析JSON响应
-            data = response.json()
-            
-            # 从 post 对象中提取帖子详情数据
-            post_data = data.get('post', {})
-            
-            # 保存原始帖子内容，不进行任何预处理
-            content = post_data.get('detail', '') or post_data.get('description', '')
-            
-            post_detail = {
-                '帖子ID': post_data.get('postID', ''),
-                '标题': post_data.get('title', ''),
-                '内容': content,  # 保存原始内容
-                '图片': post_data.get('images', []),
-                '点击数': post_data.get('hit', 0),
-                '评论数': post_data.get('commentCount', 0),
-                '创建时间': post_data.get('createTime', 0),
-                '活跃时间': post_data.get('updateTime', 0) or post_data.get('createTime', 0),
-                '是否精华': post_data.get('isGood', 0),
-                '评论列表': data.get('comments', []),
-                '是否有更多评论': len(data.get('comments', [])) >= page_size,
-                '当前页码': page_no,
-                '每页数量': page_size,
-            }
-            
-            # 提取用户信息
-            user = post_data.get('user', {})
-            post_detail['用户'] = {
-                '用户ID': user.get('userID', 0),
-                '昵称': user.get('nick', ''),
-                '头像': user.get('avatar', ''),
-                '性别': user.get('gender', 0),
-                '等级': user.get('level', 0),
-            }
-            
-            return post_detail
-            
-        except Exception as e:
-            logging.error(f"获取帖子详情失败: {str(e)}")
-            return None
+            response = make_response(entry.body)
+            # 压缩后的字节不同但内容等价，使用弱ETag；要求客户端每次重新验证
+            response.set_etag(entry.etag, weak=True)
+            response.last_modified = entry.last_modified
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+_render_local = threading.local()
+
+def _template_started(sender, template, context, **extra):
+    """模板开始渲染，支持嵌套渲染"""
+    stack = getattr(_render_local, 'stack', None)
+    if stack is None:
+        stack = _render_local.stack = []
+    stack.append(time.perf_counter())
+    trace = current_trace()
+    if trace is not None:
+        trace.start('render')
 
-# 创建爬虫实例
-crawler = HuluxiaCrawler()
+def _template_finished(sender, template, context, **extra):
+    """模板渲染完成，记录耗时"""
+    stack = getattr(_render_local, 'stack', None)
+    if not stack:
+        return
+    TEMPLATE_RENDER.observe(time.perf_counter() - stack.pop(), template.name or 'string')
+    trace = current_trace()
+    if trace is not None:
+        trace.stop()
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    reset_degraded()
+    if SERVER_TIMING_ALWAYS or request.headers.get('X-Server-Timing'):
+        begin_trace()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_LATENCY.observe(time.perf_counter() - g.pop('request_started', time.perf_counter()),
+                            endpoint, response.status_code)
+    # 流式响应的大小此时未知，不计入
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint)
+    trace = end_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+    if STALE in degraded():
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
+
+@app.after_request
+def compress(response):
+    # 后注册的 after_request 先执行，响应大小指标记录的是压缩后的大小
+    if COMPRESS_RESPONSES:
+        encoding = compress_response(response, request.accept_encodings, COMPRESS_MIN_SIZE)
+        if encoding:
+            COMPRESSED_RESPONSES.inc(encoding)
+    return response
+
+@app.teardown_request
+def clear_trace(exc):
+    # 视图抛出异常时 after_request 不会执行
+    end_trace()
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 格式的运行指标"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
     """首页，显示所有板块列表"""
     categories = crawler.get_categories()
+    if not categories and UNAVAILABLE in degraded():
+        return render_template('error.html', message=UPSTREAM_UNAVAILABLE), 503
     return render_template('index.html', categories=categories)
 
 @app.route('/category/<int:category_id>')
+@cached_page(ttl=float(os.environ.get('HULUXIA_CATEGORY_PAGE_TTL', 15)), query_args=('tag_id',))
 def category_detail(category_id):
     """显示特定板块的详细信息"""
-    categories = crawler.get_categories()
+    # 获取子版块ID参数
+    tag_id = request.args.get('tag_id', 0, type=int)
     
-    # 查找目标板块
-    target_category = None
-    for category in categories:
-        if str(category_id) == str(category['板块ID']):
-            target_category = category
-            break
+    # 板块信息和帖子列表互不依赖，同时获取
+    posts_data, target_category = crawler.gather((crawler.get_posts, category_id, tag_id),
+                                                 (crawler.get_category, category_id))
     
     if not target_category:
+        if UNAVAILABLE in degraded():
+            return render_template('error.html', message=UPSTREAM_UNAVAILABLE), 503
         return render_template('error.html', message=f"未找到ID为 {category_id} 的板块")
     
-    # 获取子版块ID参数
-    tag_id = request.args.get('tag_id', 0, type=int)
-    
-    # 获取板块帖子列表
-    posts_data = crawler.get_posts(category_id, tag_id)
+    if UNAVAILABLE in degraded():
+        return render_template('error.html', message=UPSTREAM_UNAVAILABLE), 503
+    if posts_data['帖子列表']:
+        g.upstream_mtime = max(post['活跃时间'] for post in posts_data['帖子列表'])
     
     return render_template('category.html', category=target_category, posts=posts_data, current_tag_id=tag_id)
 
 @app.route('/post/<int:post_id>')
+@cached_page(ttl=float(os.environ.get('HULUXIA_POST_PAGE_TTL', 30)), query_args=('page', 'size'))
 def post_detail(post_id):
     """显示帖子详细内容"""
     page_no = request.args.get('page', 1, type=int)
@@ -357,55 +367,380 @@ def post_detail(post_id):
     post_data = crawler.get_post_detail(post_id, page_no, page_size)
     
     if not post_data:
+        if UNAVAILABLE in degraded():
+            return render_template('error.html', message=UPSTREAM_UNAVAILABLE), 503
         return render_template('error.html', message=f"未找到ID为 {post_id} 的帖子")
     
+    # 新评论不会改变帖子的活跃时间（帖子编辑时间），取本页最新评论时间中较晚的一个
+    g.upstream_mtime = max([post_data['活跃时间']] + [comment.get('createTime', 0) for comment in post_data['评论列表']])
+    if COMMENT_PREFETCH and post_data['是否有更多评论']:
+        crawler.prefetch_comments(post_id, page_no + 1, page_size)
     return render_template('post.html', post=post_data)
 
+@app.route('/img/')
+def image_proxy():
+    """图片代理，参数 url 为原图地址，w 为缩略图宽度
+    
+    支持 ETag 条件请求和 Range 请求；下载失败时重定向到原图。
+    """
+    url = request.args.get('url', '')
+    width = request.args.get('w', type=int)
+    
+    if image_cache is None or not image_cache.is_allowed(url):
+        return jsonify({"error": "不允许代理该图片地址"}), 403
+    
+    try:
+        path, mimetype, digest = image_cache.get(url, width)
+        # 内容按摘要寻址，同一地址的内容极少变化，允许客户端缓存一天
+        return send_file(path, mimetype=mimetype, etag=digest, conditional=True, max_age=86400)
+    except Exception as e:
+        logging.error(f"代理图片失败: {url}: {str(e)}")
+        return redirect(url)
+
 @app.route('/api/categories')
 def api_categories():
     """API接口，返回所有板块信息的JSON数据"""
     categories = crawler.get_categories()
+    if not categories and UNAVAILABLE in degraded():
+        return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
     return jsonify(categories)
 
 @app.route('/api/category/<int:category_id>')
 def api_category(category_id):
     """API接口，返回特定板块信息的JSON数据"""
-    categories = crawler.get_categories()
-    
-    # 查找目标板块
-    target_category = None
-    for category in categories:
-        if str(category_id) == str(category['板块ID']):
-            target_category = category
-            break
+    target_category = crawler.get_category(category_id)
     
     if not target_category:
+        if UNAVAILABLE in degraded():
+            return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
         return jsonify({"error": f"未找到ID为 {category_id} 的板块"}), 404
     
     return jsonify(target_category)
 
+@app.route('/api/category/search')
+def api_category_search():
+    """API接口，按名称搜索板块"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 20, type=int)
+    
+    if not query.strip():
+        return jsonify({"error": "缺少搜索关键字参数 q"}), 400
+    
+    return jsonify(crawler.get_category_index().search(query, limit))
+
+def requested_fields(model_cls):
+    """解析查询参数 fields（逗号分隔的中文字段名），未指定时返回None，包含未知字段时抛出 ValueError"""
+    return models.parse_fields(model_cls, request.args.get('fields'))
+
 @app.route('/api/posts/<int:category_id>')
 def api_posts(category_id):
-    """API接口，返回特定板块帖子列表的JSON数据"""
+    """API接口，返回特定板块帖子列表的JSON数据
+    
+    查询参数 fields 指定每个帖子只返回哪些字段，如 fields=帖子ID,标题
+    """
     tag_id = request.args.get('tag_id', 0, type=int)
     count = request.args.get('count', 20, type=int)
     sort_by = request.args.get('sort_by', 0, type=int)
+    start = request.args.get('start', 0, type=int)
+    try:
+        fields = requested_fields(models.Post)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    posts_data = crawler.get_posts(category_id, tag_id, count, sort_by)
+    posts_data = crawler.get_posts(category_id, tag_id, count, sort_by, start)
+    if UNAVAILABLE in degraded():
+        return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
+    if fields is not None:
+        posts_data = {**posts_data, '帖子列表': [models.project(post, fields) for post in posts_data['帖子列表']]}
     return jsonify(posts_data)
 
 @app.route('/api/post/<int:post_id>')
 def api_post(post_id):
-    """API接口，返回帖子详情的JSON数据"""
+    """API接口，返回帖子详情的JSON数据
+    
+    查询参数 fields 指定只返回哪些字段，如 fields=帖子ID,标题,评论数
+    """
     page_no = request.args.get('page', 1, type=int)
     page_size = request.args.get('size', 20, type=int)
+    try:
+        fields = requested_fields(models.PostDetail)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     post_data = crawler.get_post_detail(post_id, page_no, page_size)
     
     if not post_data:
+        if UNAVAILABLE in degraded():
+            return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
+        return jsonify({"error": f"未找到ID为 {post_id} 的帖子"}), 404
+    
+    if COMMENT_PREFETCH and post_data['是否有更多评论']:
+        crawler.prefetch_comments(post_id, page_no + 1, page_size)
+    return jsonify(models.project(post_data, fields))
+
+@app.route('/api/post/<int:post_id>/comments')
+def api_post_comments(post_id):
+    """API接口，以NDJSON流的形式返回帖子的全部评论
+    
+    每行一条评论（上游原始字段），附带所在页码 '页码'；多页并发获取，按页码顺序输出，
+    重复的评论只输出一次。中断后可用最后一条评论的 '页码' 作为 page 参数重新请求。
+    """
+    page_no = request.args.get('page', 1, type=int)
+    page_size = request.args.get('size', 20, type=int)
+    concurrency = min(max(request.args.get('concurrency', COMMENT_STREAM_CONCURRENCY, type=int), 1),
+                      COMMENT_STREAM_CONCURRENCY)
+    
+    pages = crawler.iter_comment_pages(post_id, page_no, page_size, concurrency)
+    # 整个帖子的评论属于后台采集，让位于页面和其他API请求
+    with priority(PRIORITY_BACKGROUND):
+        first = next(pages, None)
+    if first is None:
+        if UNAVAILABLE in degraded():
+            return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
         return jsonify({"error": f"未找到ID为 {post_id} 的帖子"}), 404
     
-    return jsonify(post_data)
+    def generate():
+        seen = set()
+        page = first
+        with priority(PRIORITY_BACKGROUND):
+            try:
+                while page is not None:
+                    current, detail = page
+                    for comment in detail['评论列表']:
+                        comment_id = comment.get('commentID')
+                        if comment_id in seen:
+                            continue
+                        seen.add(comment_id)
+                        yield models.dumps({**comment, '页码': current}) + '\n'
+                    page = next(pages, None)
+            finally:
+                # 客户端断开时取消尚未开始的页
+                pages.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/stream')
+def api_stream():
+    """API接口，以Server-Sent Events推送订阅板块的新帖和有新回复的帖子
+    
+    查询参数 categories 为逗号分隔的板块ID，fields 同 /api/posts。每个事件为
+    {"板块ID": ..., "帖子": {...}}；断线重连时浏览器会自动带上 Last-Event-ID 头，
+    服务端补发之后的事件，无法补发时发送 reset 事件。某个板块的变化过多、
+    无法逐条推送时发送数据为 {"板块ID": ...} 的 reset 事件。
+    
+    订阅在开始输出时进行，输出结束（包括客户端断开）时取消，未开始输出的响应不占用订阅。
+    """
+    try:
+        cat_ids = {int(cat_id) for cat_id in request.args.get('categories', '').split(',') if cat_id.strip()}
+    except ValueError:
+        return jsonify({"error": "categories 必须为逗号分隔的板块ID"}), 400
+    if not cat_ids:
+        return jsonify({"error": "缺少订阅的板块参数 categories"}), 400
+    if len(cat_ids) > MAX_STREAM_CATEGORIES:
+        return jsonify({"error": f"单次最多订阅 {MAX_STREAM_CATEGORIES} 个板块"}), 400
+    try:
+        fields = requested_fields(models.Post)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    if not change_feed.can_subscribe(cat_ids):
+        return jsonify({"error": f"同时订阅的板块数已达上限 {change_feed.max_categories}"}), 503
+    
+    def generate():
+        try:
+            change_feed.subscribe(cat_ids)
+        except ValueError as e:
+            # 检查之后其他连接订阅了新板块
+            yield f"event: error\ndata: {models.dumps({'error': str(e)})}\n\n"
+            return
+        try:
+            yield f"retry: {STREAM_KEEPALIVE * 1000}\n\n"
+            events, seq, reset = change_feed.events_after(last_event_id or change_feed.last_event_id(), cat_ids)
+            if reset:
+                yield f"id: {change_feed.last_event_id()}\nevent: reset\ndata: {{}}\n\n"
+            while True:
+                for event_id, cat_id, post in events:
+                    if post is None:
+                        yield f"id: {event_id}\nevent: reset\ndata: {models.dumps({'板块ID': cat_id})}\n\n"
+                        continue
+                    data = models.dumps({'板块ID': cat_id, '帖子': models.project(post, fields)})
+                    yield f"id: {event_id}\nevent: post\ndata: {data}\n\n"
+                events, seq = change_feed.wait(seq, cat_ids, STREAM_KEEPALIVE)
+                if not events:
+                    yield ": keepalive\n\n"
+        finally:
+            change_feed.unsubscribe(cat_ids)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stream/stats')
+def api_stream_stats():
+    """API接口，返回新帖推送的轮询与订阅统计"""
+    return jsonify(change_feed.stats())
+
+@app.route('/api/posts/details', methods=['POST'])
+def api_post_details():
+    """API接口，批量返回多个帖子详情的JSON数据
+    
+    请求体: {"ids": [帖子ID, ...], "page": 评论页码, "size": 每页评论数量}
+    查询参数 fields 指定每个帖子只返回哪些字段
+    
+    获取失败的帖子放在 '错误' 中，上游失败和帖子不存在的错误信息不同；
+    全部帖子都因上游失败而没有结果时返回503。
+    """
+    try:
+        fields = requested_fields(models.PostDetail)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "请求体需包含非空的帖子ID列表 ids"}), 400
+    
+    try:
+        post_ids = [int(post_id) for post_id in ids]
+        page_no = int(payload.get('page', 1))
+        page_size = int(payload.get('size', 20))
+    except (TypeError, ValueError):
+        return jsonify({"error": "帖子ID、page、size 必须为整数"}), 400
+    
+    post_ids = list(dict.fromkeys(post_ids))
+    if len(post_ids) > MAX_BATCH_POSTS:
+        return jsonify({"error": f"单次最多获取 {MAX_BATCH_POSTS} 个帖子"}), 400
+    
+    results, errors = crawler.get_post_details(post_ids, page_no, page_size, timeout=BATCH_TIMEOUT)
+    body = {
+        '帖子详情': {str(post_id): models.project(detail, fields) for post_id, detail in results.items()},
+        '错误': {str(post_id): message for post_id, message in errors.items()},
+    }
+    if not results and UNAVAILABLE in degraded():
+        body['error'] = UPSTREAM_UNAVAILABLE
+        return jsonify(body), 503
+    return jsonify(body)
+
+@app.route('/api/search')
+def api_search():
+    """API接口，在已获取过的帖子标题、内容和评论中全文搜索"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 20, type=int)
+    
+    if not query.strip():
+        return jsonify({"error": "缺少搜索关键字参数 q"}), 400
+    
+    started = time.perf_counter()
+    results = search_index.search(query, limit)
+    return jsonify({
+        '关键字': query,
+        '结果': results,
+        '耗时毫秒': round((time.perf_counter() - started) * 1000, 3),
+    })
+
+@app.route('/api/rankings/<int:category_id>')
+def api_rankings(category_id):
+    """API接口，返回板块内已获取过的帖子的排行
+    
+    查询参数: order（hot/trend/hit/comment，默认hot）、tag_id（可选，只排子版块）、
+    limit（默认20，最多100）。排行只保存帖子的ID和数值字段，标题等内容需另行获取。
+    """
+    order = request.args.get('order', 'hot')
+    tag_id = request.args.get('tag_id', type=int)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    if order not in ORDERS:
+        return jsonify({"error": f"不支持的排行方式: {order}，可选: {'、'.join(ORDERS)}"}), 400
+    
+    started = time.perf_counter()
+    total, ranked = analytics.rankings(category_id, tag_id, order, limit)
+    return jsonify({
+        '板块ID': category_id,
+        '排行方式': order,
+        '帖子数': total,
+        '排行': [{'排名': rank, '分数': score, '帖子': post} for rank, (score, post) in enumerate(ranked, 1)],
+        '耗时毫秒': round((time.perf_counter() - started) * 1000, 3),
+    })
+
+@app.route('/api/stats')
+def api_stats():
+    """API接口，按板块和子版块汇总已获取过的帖子的点击、评论和活跃情况"""
+    started = time.perf_counter()
+    categories = analytics.stats()
+    return jsonify({
+        '帖子数': len(analytics),
+        '板块': categories,
+        '耗时毫秒': round((time.perf_counter() - started) * 1000, 3),
+    })
+
+@app.route('/api/export/<int:category_id>')
+def api_export(category_id):
+    """API接口，以NDJSON流的形式导出板块下的全部帖子
+    
+    每行一条帖子记录，获取到一页即输出一页。中断后可用最后一条记录的
+    '游标' 作为 start 参数重新请求，最多重复输出一页。
+    
+    第一页获取失败时返回503。之后某页获取失败时响应已经开始，最后输出一行
+    {"错误": ..., "下一页游标": ...}，客户端应以该游标作为 start 重新请求。
+    """
+    tag_id = request.args.get('tag_id', 0, type=int)
+    sort_by = request.args.get('sort_by', 0, type=int)
+    start = request.args.get('start', 0, type=int)
+    with_details = request.args.get('details', 0, type=int) == 1
+    
+    pages = crawler.iter_export_records(category_id, tag_id, with_details, sort_by=sort_by, start=start)
+    # 整板块导出属于后台采集，让位于页面和其他API请求
+    with priority(PRIORITY_BACKGROUND):
+        try:
+            first = next(pages, None)
+        except Exception as e:
+            logging.error(f"导出板块 {category_id} 失败: {str(e)}")
+            return jsonify({"error": UPSTREAM_UNAVAILABLE}), 503
+    
+    def generate():
+        with priority(PRIORITY_BACKGROUND):
+            page = first
+            cursor = start
+            try:
+                while page is not None:
+                    cursor, records = page
+                    for record in records:
+                        yield models.dumps(record) + '\n'
+                    page = next(pages, None)
+            except Exception as e:
+                logging.error(f"导出板块 {category_id} 中断: {str(e)}")
+                yield models.dumps({'错误': UPSTREAM_UNAVAILABLE, '下一页游标': cursor}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """API接口，返回缓存命中统计"""
+    return jsonify({
+        'categories': crawler.category_cache.stats(),
+        'format_content': content_cache_stats(),
+        'pages': page_cache.stats(),
+        'singleflight': crawler.flight.stats(),
+        'comment_pages': crawler.comment_pages.stats(),
+        'last_good': crawler.last_good.stats(),
+        'mirror': crawler.mirror.stats() if crawler.mirror else None,
+        'search_index': search_index.stats(),
+        'images': image_cache.stats() if image_cache else None,
+    })
+
+@app.route('/api/transport/stats')
+def api_transport_stats():
+    """API接口，返回上游连接池统计"""
+    return jsonify(crawler.transport.stats())
+
+@app.route('/api/scheduler/stats')
+def api_scheduler_stats():
+    """API接口，返回各上游接口的当前速率与排队统计"""
+    return jsonify(scheduler.stats())
+
+@app.route('/api/circuit/stats')
+def api_circuit_stats():
+    """API接口，返回各上游接口的熔断状态"""
+    return jsonify(breaker.stats())
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
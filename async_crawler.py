@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from urllib.parse import urljoin
+
+import aiohttp
+
+import upstream
+
+
+class AsyncHuluxiaCrawler:
+    """葫芦侠数据采集器（asyncio版本）
+
+    与 HuluxiaCrawler 提供相同的 get_categories、get_posts、get_post_detail 接口
+    和相同结构的返回数据。所有请求共享一个 aiohttp 会话，并通过信号量限制并发数，
+    适合一次性并发获取大量帖子。
+
+    用法:
+        async with AsyncHuluxiaCrawler(concurrency=50) as crawler:
+            details = await crawler.get_post_details([1, 2, 3])
+    """
+
+    def __init__(self, base_url=upstream.BASE_URL, concurrency=20,
+                 connect_timeout=3.05, read_timeout=10):
+        """
+        参数:
+            base_url (str): 上游接口地址，测试时可指向本地桩服务
+            concurrency (int): 同时进行的最大请求数，默认为20
+            connect_timeout (float): 建立连接的超时时间（秒）
+            read_timeout (float): 读取响应的超时时间（秒）
+        """
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.headers = dict(upstream.HEADERS)
+        self.post_headers = dict(upstream.POST_HEADERS)
+        self.detail_headers = dict(upstream.DETAIL_HEADERS)
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _ensure_session(self):
+        """在当前事件循环中创建会话（只创建一次）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        """关闭会话并释放所有连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_json(self, url, headers, params=None):
+        """发送GET请求并解析JSON响应，失败时抛出异常"""
+        session = self._ensure_session()
+        async with self._semaphore:
+            async with session.get(url, headers=headers, params=params) as response:
+                response.raise_for_status()
+                # 上游返回的Content-Type并不总是application/json
+                return await response.json(content_type=None)
+
+    async def get_categories(self):
+        """获取葫芦侠板块信息"""
+        try:
+            url = urljoin(self.base_url, upstream.CATEGORY_LIST_PATH)
+            logging.info(f"开始获取板块信息: {url}")
+
+            data = await self._get_json(url, self.headers)
+            logging.info(f"成功获取板块信息，状态消息: {data.get('msg', '')}")
+
+            return upstream.parse_categories(data)
+
+        except Exception as e:
+            logging.error(f"获取板块信息失败: {str(e)}")
+            return []
+
+    async def get_posts(self, cat_id, tag_id=0, count=20, sort_by=0, start=0):
+        """获取特定板块的帖子列表
+
+        参数:
+            cat_id (int): 板块ID
+            tag_id (int): 子版块ID，默认为0（全部）
+            count (int): 每页显示的帖子数量，默认为20
+            sort_by (int): 排序方式，默认为0
+            start (int): 分页游标，取上一页返回的“下一页游标”，默认为0（第一页）
+        """
+        try:
+            url = f"{self.base_url}{upstream.POST_LIST_PATH}"
+            params = upstream.post_list_params(cat_id, tag_id, count, sort_by, start)
+
+            logging.info(f"开始获取板块帖子列表: 板块ID={cat_id}, 子版块ID={tag_id}, 游标={start}")
+
+            data = await self._get_json(url, self.post_headers, params)
+            logging.info(f"成功获取板块帖子列表，状态消息: {data.get('msg', '')}")
+
+            return upstream.parse_posts(data, cat_id, tag_id, start)
+
+        except Exception as e:
+            logging.error(f"获取板块帖子列表失败: {str(e)}")
+            return upstream.empty_posts(cat_id, tag_id, start)
+
+    async def get_post_detail(self, post_id, page_no=1, page_size=20):
+        """获取帖子详细内容
+
+        参数:
+            post_id (int): 帖子ID
+            page_no (int): 评论页码，默认为1
+            page_size (int): 每页评论数量，默认为20
+        """
+        try:
+            url = f"{self.base_url}{upstream.POST_DETAIL_PATH}"
+            params = upstream.post_detail_params(post_id, page_no, page_size)
+
+            logging.info(f"开始获取帖子详情: 帖子ID={post_id}")
+
+            data = await self._get_json(url, self.detail_headers, params)
+
+            return upstream.parse_post_detail(data, page_no, page_size)
+
+        except Exception as e:
+            logging.error(f"获取帖子详情失败: {str(e)}")
+            return None
+
+    async def get_post_details(self, post_ids, page_no=1, page_size=20):
+        """并发获取多个帖子的详细内容
+
+        并发数受构造时的 concurrency 限制。返回 {帖子ID: 帖子详情}，
+        获取失败的帖子对应的值为None。
+        """
+        post_ids = list(dict.fromkeys(post_ids))
+        results = await asyncio.gather(
+            *(self.get_post_detail(post_id, page_no, page_size) for post_id in post_ids))
+        return dict(zip(post_ids, results))
@@ -0,0 +1,106 @@
+"""热度排行与统计基准测试
+
+生成指定数量的帖子（分布在多个板块和子版块中）加入 PostAnalytics，对比：
+- 排行：NumPy 向量化计算分数并取前K个，与遍历帖子字典计算分数再 heapq.nlargest
+- 统计：按板块和子版块汇总，与遍历帖子字典累加
+
+两种方式的排行结果会先比较一次，确认一致。
+
+运行: python benchmarks/bench_analytics.py [--posts 300000] [--categories 20] [--number 20]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import COMMENT_WEIGHT, PostAnalytics  # noqa: E402
+
+
+def make_posts(total, categories, seed=1):
+    """生成 {板块ID: [帖子]}，帖子只包含参与统计的字段"""
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+    by_category = {cat_id: [] for cat_id in range(1, categories + 1)}
+    for post_id in range(total):
+        created = now - rng.randrange(30 * 86400000)
+        by_category[rng.randint(1, categories)].append({
+            '帖子ID': post_id,
+            '子版块ID': rng.randrange(8),
+            '点击数': int(rng.paretovariate(1.2) * 100),
+            '评论数': int(rng.paretovariate(1.5) * 5),
+            '创建时间': created,
+            '活跃时间': created + rng.randrange(now - created + 1),
+        })
+    return by_category
+
+
+def loop_hot(posts, limit, gravity, now_ms):
+    """逐个帖子计算 hot 分数"""
+    def score(post):
+        hours = max(now_ms - post['创建时间'], 0) / 3600000.0
+        return (post['点击数'] + post['评论数'] * COMMENT_WEIGHT) / (hours + 2.0) ** gravity
+    return heapq.nlargest(limit, posts, key=score)
+
+
+def loop_stats(by_category):
+    """逐个帖子按板块和子版块累加"""
+    result = {}
+    for cat_id, posts in by_category.items():
+        tags = {}
+        for post in posts:
+            tag = tags.setdefault(post['子版块ID'], [0, 0, 0])
+            tag[0] += 1
+            tag[1] += post['点击数']
+            tag[2] += post['评论数']
+        result[cat_id] = tags
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热度排行与统计基准测试')
+    parser.add_argument('--posts', type=int, default=300000, help='帖子总数')
+    parser.add_argument('--categories', type=int, default=20, help='板块数')
+    parser.add_argument('--limit', type=int, default=20, help='排行返回的帖子数')
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    by_category = make_posts(args.posts, args.categories)
+    analytics = PostAnalytics()
+    started = time.perf_counter()
+    for cat_id, posts in by_category.items():
+        for i in range(0, len(posts), 50):
+            analytics.add_posts(cat_id, posts[i:i + 50])
+    print(f"加入 {len(analytics)} 个帖子（每次50个）: {time.perf_counter() - started:.2f} 秒")
+
+    # 帖子最多的板块
+    cat_id = max(by_category, key=lambda key: len(by_category[key]))
+    posts = by_category[cat_id]
+    now = time.time()
+    now_ms = int(now * 1000)
+
+    _, ranked = analytics.rankings(cat_id, order='hot', limit=args.limit, now=now)
+    expected = loop_hot(posts, args.limit, analytics.gravity, now_ms)
+    assert [post['帖子ID'] for _, post in ranked] == [post['帖子ID'] for post in expected], "排行结果不一致"
+
+    # 循环版本较慢，执行次数取十分之一
+    loop_number = max(args.number // 10, 1)
+    cases = [
+        (f"板块排行（{len(posts)}个帖子） 循环", loop_number,
+         lambda: loop_hot(posts, args.limit, analytics.gravity, now_ms)),
+        (f"板块排行（{len(posts)}个帖子） NumPy", args.number,
+         lambda: analytics.rankings(cat_id, limit=args.limit, now=now)),
+        (f"分组统计（{len(analytics)}个帖子） 循环", loop_number, lambda: loop_stats(by_category)),
+        (f"分组统计（{len(analytics)}个帖子） NumPy", args.number, lambda: analytics.stats(now=now)),
+    ]
+    for label, number, func in cases:
+        seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{label:<36} {seconds * 1000:10.3f} ms/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""format_content 微基准测试
+
+对比旧版多次 re.sub 实现与新版单次扫描实现（冷缓存、热缓存）在
+包含大量 <image> 标签的长帖子上的耗时。
+
+运行: python benchmarks/bench_format_content.py [--images 300] [--paragraphs 200] [--number 50]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import content  # noqa: E402
+
+
+def legacy_format_content(text):
+    """旧版实现（逐步 re.sub + 字符串拼接），作为对照"""
+    if not text:
+        return ""
+
+    def process_text(match):
+        inner = match.group(1)
+        if inner.strip():
+            return f'<p class="post-text">{inner}</p>'
+        return ''
+
+    text = re.sub(r'<text>(.*?)</text>', process_text, text)
+
+    image_urls = []
+
+    def collect_image_from_tag(match):
+        image_urls.append(match.group(1).split(',')[0])
+        return ''
+
+    text = re.sub(r'<image>(.*?)</image>', collect_image_from_tag, text)
+
+    def collect_image_from_url(match):
+        image_urls.append(match.group(1))
+        return ''
+
+    text = re.sub(r'@(http[s]?://\S+)', collect_image_from_url, text)
+
+    paragraphs = text.split('\n')
+    text = ''.join([f'<p class="post-text">{p}</p>' for p in paragraphs if p.strip()])
+
+    if image_urls:
+        text += '<div class="post-image-gallery">'
+        for i in range(0, len(image_urls), 3):
+            text += '<div class="post-image-row">'
+            row_images = image_urls[i:i+3]
+            for j, img_url in enumerate(row_images):
+                img_index = i + j + 1
+                text += f'''
+                <div class="post-image-container">
+                    <a href="{img_url}" data-lightbox="post-images" data-title="帖子图片 {img_index}">
+                        <img src="{img_url}" alt="帖子图片" class="post-image">
+                    </a>
+                </div>
+                '''
+            text += '</div>'
+        text += '</div>'
+
+    return text
+
+
+def build_post(images, paragraphs):
+    """构造包含大量段落和图片标签的帖子内容"""
+    parts = []
+    for i in range(max(images, paragraphs)):
+        if i < paragraphs:
+            parts.append(f'<text>第{i}段 葫芦侠三楼 测试内容 ' + '正文' * 20 + '</text>\n')
+        if i < images:
+            parts.append(f'<image>http://cdn.u1.huluxia.com/g4/M00/{i:04d}.jpg,1080,1920</image>')
+    return ''.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='format_content 微基准测试')
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    post = build_post(args.images, args.paragraphs)
+    assert content.render_content(post) == legacy_format_content(post), '新旧实现输出不一致'
+
+    def cold():
+        content.clear_cache()
+        content.render_content(post)
+
+    results = [
+        ('旧版实现', lambda: legacy_format_content(post)),
+        ('单次扫描（冷缓存）', cold),
+        ('单次扫描（热缓存）', lambda: content.render_content(post)),
+    ]
+    print(f"帖子长度: {len(post)} 字符, 图片: {args.images}, 段落: {args.paragraphs}")
+    for name, func in results:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        print(f"{name:<20} {seconds * 1000:8.3f} ms/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""上游响应整理微基准测试
+
+测量 get_posts/get_post_detail/get_categories 中把上游JSON整理为中文键数据
+（upstream.parse_*）的耗时，输入为 fixtures/ 中录制的响应。
+JSON解析（json.loads）单独列出，便于区分两部分的开销。
+
+运行: python benchmarks/bench_normalize.py [--number 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import upstream  # noqa: E402
+from stub_upstream import FIXTURES_DIR  # noqa: E402
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上游响应整理微基准测试')
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    raw_categories = read_fixture('category_list.json')
+    raw_posts = read_fixture('post_list.json')
+    raw_detail = read_fixture('post_detail.json')
+    categories = json.loads(raw_categories)
+    posts = json.loads(raw_posts)
+    detail = json.loads(raw_detail)
+
+    results = [
+        (f"json.loads 板块列表（{len(categories['categories'])}个）", lambda: json.loads(raw_categories)),
+        ('parse_categories', lambda: upstream.parse_categories(categories)),
+        (f"json.loads 帖子列表（{len(posts['posts'])}个）", lambda: json.loads(raw_posts)),
+        ('parse_posts', lambda: upstream.parse_posts(posts, 2)),
+        (f"json.loads 帖子详情（{len(detail['comments'])}条评论）", lambda: json.loads(raw_detail)),
+        ('parse_post_detail', lambda: upstream.parse_post_detail(detail)),
+    ]
+    for name, func in results:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        print(f"{name:<36} {seconds * 1e6:10.2f} us/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""网站路由压力测试
+
+在本进程内启动上游替身（stub_upstream.py）和多线程的 Flask 服务，
+用多个并发客户端依次压测每个路由，输出吞吐量和 p50/p99 延迟。
+
+默认关闭页面缓存和本地镜像，并放开上游限速，测的是每次都要访问上游的路径；
+加 --cached 时保留页面缓存，测缓存命中的路径。
+排行和统计路由汇总的是前面的路由获取过的帖子，单独压测时数据为空；
+推送路由（api_stream）的连接不会结束，每个请求读到第一段数据即断开，测的是建立订阅的开销；
+图片路由经本地磁盘缓存代理替身生成的图片，前 --posts 个请求下载原图并生成缩略图，之后命中缓存。
+压测客户端与服务在同一进程中会争用GIL，需要更准确的绝对数值时，可先单独启动
+stub_upstream.py 和网站，再用 --target 指向网站地址。
+
+运行: python benchmarks/bench_routes.py [--concurrency 16] [--requests 400] [--latency 0.02]
+                                        [--error-rate 0] [--routes post,api_posts]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import StubUpstream  # noqa: E402
+
+CATEGORY_ID = 2
+ORDERS = ('hot', 'trend', 'hit', 'comment')
+
+# 响应不会结束的路由，只读取第一段数据
+STREAMING_ROUTES = {'api_stream'}
+
+
+def build_routes(posts_per_category, upstream_url):
+    """返回 [(名称, 方法, 路径生成函数, 请求体生成函数)]，路径按请求序号变化以覆盖不同的帖子
+
+    参数:
+        posts_per_category (int): 替身每个板块的帖子总数
+        upstream_url (str): 网站连接的上游替身地址，图片路由代理其中的图片
+    """
+    def post_id(i):
+        return CATEGORY_ID * 1000000 + i % posts_per_category
+
+    def image_path(i):
+        return '/img/?' + urlencode({'url': f"{upstream_url}/image/{i % posts_per_category}.png", 'w': 160})
+
+    return [
+        ('index', 'GET', lambda i: '/', None),
+        ('category', 'GET', lambda i: f'/category/{CATEGORY_ID}', None),
+        ('post', 'GET', lambda i: f'/post/{post_id(i)}', None),
+        ('api_categories', 'GET', lambda i: '/api/categories', None),
+        ('api_category', 'GET', lambda i: f'/api/category/{CATEGORY_ID}', None),
+        ('api_category_search', 'GET', lambda i: '/api/category/search?q=游戏', None),
+        ('api_posts', 'GET', lambda i: f'/api/posts/{CATEGORY_ID}?start={i % 10 * 20}', None),
+        ('api_posts_fields', 'GET', lambda i: f'/api/posts/{CATEGORY_ID}?start={i % 10 * 20}&fields=帖子ID,标题', None),
+        ('api_post', 'GET', lambda i: f'/api/post/{post_id(i)}', None),
+        ('api_post_comments', 'GET', lambda i: f'/api/post/{post_id(i)}/comments', None),
+        ('api_post_details', 'POST', lambda i: '/api/posts/details',
+         lambda i: {'ids': [post_id(i * 10 + k) for k in range(10)]}),
+        ('api_search', 'GET', lambda i: '/api/search?q=游戏攻略', None),
+        ('api_export', 'GET', lambda i: f'/api/export/{CATEGORY_ID}', None),
+        ('api_rankings', 'GET', lambda i: f'/api/rankings/{CATEGORY_ID}?order={ORDERS[i % len(ORDERS)]}', None),
+        ('api_stats', 'GET', lambda i: '/api/stats', None),
+        ('api_stream', 'GET', lambda i: f'/api/stream?categories={CATEGORY_ID}', None),
+        ('img', 'GET', image_path, None),
+        ('api_cache_stats', 'GET', lambda i: '/api/cache/stats', None),
+        ('api_transport_stats', 'GET', lambda i: '/api/transport/stats', None),
+        ('api_scheduler_stats', 'GET', lambda i: '/api/scheduler/stats', None),
+        ('api_circuit_stats', 'GET', lambda i: '/api/circuit/stats', None),
+        ('metrics', 'GET', lambda i: '/metrics', None),
+    ]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def send(session, method, url, body, stream=False):
+    """发送一个请求并读取响应，stream 为True时只读取第一段数据后断开"""
+    response = session.request(method, url, json=body, timeout=60, stream=stream)
+    if stream:
+        next(response.iter_content(None), None)
+        response.close()
+    else:
+        response.content
+    return response
+
+
+def run_route(base_url, method, make_path, make_body, total, concurrency, stream=False):
+    """以 concurrency 个并发客户端发送 total 个请求，返回 (耗时列表, 失败数, 总耗时)"""
+    local = threading.local()
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    results_lock = threading.Lock()
+
+    def worker():
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        mine = []
+        failed = 0
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                response = send(session, method, base_url + make_path(i),
+                                make_body(i) if make_body else None, stream)
+                if response.status_code >= 400:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            mine.append(time.perf_counter() - started)
+        with results_lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+    return sorted(latencies), errors[0], elapsed
+
+
+def run_all(base_url, routes, args):
+    """依次压测每个路由并输出结果表"""
+    print(f"并发 {args.concurrency}，每个路由 {args.requests} 个请求")
+    print(f"{'路由':<22}{'请求数':>8}{'失败':>6}{'吞吐(次/秒)':>14}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for name, method, make_path, make_body in routes:
+        stream = name in STREAMING_ROUTES
+        if name == 'api_export':
+            total = args.export_requests
+        elif stream:
+            total = args.stream_requests
+        else:
+            total = args.requests
+        # 预热一次，排除模板编译和首次建立连接的影响
+        send(requests, method, base_url + make_path(0), make_body(0) if make_body else None, stream)
+        latencies, errors, elapsed = run_route(base_url, method, make_path, make_body, total,
+                                               args.concurrency, stream)
+        print(f"{name:<22}{len(latencies):>8}{errors:>6}{len(latencies) / elapsed:>14.1f}"
+              f"{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网站路由压力测试')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发客户端数')
+    parser.add_argument('--requests', type=int, default=400, help='每个路由的请求数')
+    parser.add_argument('--export-requests', type=int, default=8, help='导出路由的请求数（每次导出整个板块）')
+    parser.add_argument('--stream-requests', type=int, default=64,
+                        help='推送路由的请求数（客户端断开后，服务端要到下一次心跳才结束对应的推送）')
+    parser.add_argument('--latency', type=float, default=0.02, help='上游固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.01, help='上游随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='上游返回500的概率')
+    parser.add_argument('--posts', type=int, default=200, help='每个板块的帖子总数')
+    parser.add_argument('--routes', help='只压测指定的路由，逗号分隔')
+    parser.add_argument('--cached', action='store_true', help='保留页面缓存')
+    parser.add_argument('--target', help='压测已启动的网站（如 http://127.0.0.1:5000），不再启动替身和服务')
+    parser.add_argument('--upstream', default='http://127.0.0.1:8081',
+                        help='使用 --target 时网站连接的上游替身地址，图片路由代理其中的图片')
+    args = parser.parse_args()
+
+    def select_routes(upstream_url):
+        routes = build_routes(args.posts, upstream_url)
+        if args.routes:
+            wanted = set(args.routes.split(','))
+            routes = [route for route in routes if route[0] in wanted]
+        return routes
+
+    if args.target:
+        print(f"压测目标: {args.target}")
+        run_all(args.target.rstrip('/'), select_routes(args.upstream.rstrip('/')), args)
+        return
+
+    stub = StubUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        posts_per_category=args.posts, seed=1).start()
+    routes = select_routes(stub.url)
+
+    # 必须在导入 app 之前设置
+    workdir = tempfile.mkdtemp(prefix='huluxia-bench-')
+    os.environ['HULUXIA_BASE_URL'] = stub.url
+    os.environ.setdefault('HULUXIA_RATE_LIMIT', '100000')
+    os.environ.setdefault('HULUXIA_MAX_RATE', '100000')
+    os.environ.setdefault('HULUXIA_IMAGE_CACHE_DIR', os.path.join(workdir, 'images'))
+    os.environ['HULUXIA_IMAGE_HOSTS'] = '127.0.0.1'
+    os.environ.pop('HULUXIA_IMAGE_PROXY', None)
+    os.environ.setdefault('HULUXIA_POOL_SIZE', str(max(16, args.concurrency * 2)))
+    os.environ.setdefault('HULUXIA_MAX_RETRIES', '0')
+    os.environ.pop('HULUXIA_MIRROR_DB', None)
+    os.environ.pop('HULUXIA_SEARCH_INDEX', None)
+    if not args.cached:
+        os.environ['HULUXIA_POST_PAGE_TTL'] = '0'
+        os.environ['HULUXIA_CATEGORY_PAGE_TTL'] = '0'
+
+    import logging
+    from werkzeug.serving import make_server
+    import app as webapp
+    # 日志输出会显著影响结果，压测期间关闭（注入的上游错误可在 /metrics 中查看）
+    logging.disable(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='bench-server').start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"上游替身: {stub.url}（延迟 {args.latency}s + 抖动 {args.jitter}s，错误率 {args.error_rate}）")
+    print(f"页面缓存: {'开' if args.cached else '关'}")
+    run_all(base_url, routes, args)
+
+    server.shutdown()
+    stub.stop()
+    print(f"上游共收到 {stub.requests} 个请求，注入错误 {stub.errors} 个")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""API响应序列化微基准测试
+
+对比两种方式把帖子列表（默认100个帖子）和帖子详情编码为JSON的耗时：
+- 原方式：整理为普通字典，再按 jsonify 的默认设置编码（sort_keys=True、ensure_ascii=True）
+- 现方式：整理为 models.py 中的模型，再由 API 响应使用的 models.dumpb 编码为字节
+  （安装了 orjson 时由它把模型当作数据类直接编码，另外列出模型改用标准库 json 编码的耗时作对照）
+
+两种方式的输出会先做一次 json.loads 比较，确认内容一致；另外用 tracemalloc
+统计整理结果本身占用的内存（缓存中保存的就是这部分数据）。
+
+运行: python benchmarks/bench_serialize.py [--posts 100] [--number 500]
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import models  # noqa: E402
+import upstream  # noqa: E402
+from stub_upstream import load_fixture  # noqa: E402
+
+
+def dict_user(user):
+    return {
+        '用户ID': user.get('userID', 0),
+        '昵称': user.get('nick', ''),
+        '头像': user.get('avatar', ''),
+        '性别': user.get('gender', 0),
+        '等级': user.get('level', 0),
+    }
+
+
+def dict_posts(data, cat_id):
+    """改用模型之前的 parse_posts"""
+    posts_data = []
+    for post in data.get('posts', []):
+        posts_data.append({
+            '帖子ID': post.get('postID', ''),
+            '标题': post.get('title', ''),
+            '内容': post.get('detail', ''),
+            '图片': post.get('images', []),
+            '点击数': post.get('hit', 0),
+            '评论数': post.get('commentCount', 0),
+            '创建时间': post.get('createTime', 0),
+            '活跃时间': post.get('activeTime', 0),
+            '是否精华': post.get('isGood', 0),
+            '子版块ID': post.get('tagid', 0),
+            '用户': dict_user(post.get('user', {})),
+        })
+    return {'帖子列表': posts_data, '是否有更多': data.get('more', 0), '板块ID': cat_id,
+            '子版块ID': 0, '下一页游标': data.get('start', len(posts_data))}
+
+
+def dict_post_detail(data, page_no=1, page_size=20):
+    """改用模型之前的 parse_post_detail"""
+    post = data.get('post', {})
+    comments = data.get('comments', [])
+    return {
+        '帖子ID': post.get('postID', ''),
+        '标题': post.get('title', ''),
+        '内容': post.get('detail', '') or post.get('description', ''),
+        '图片': post.get('images', []),
+        '点击数': post.get('hit', 0),
+        '评论数': post.get('commentCount', 0),
+        '创建时间': post.get('createTime', 0),
+        '活跃时间': post.get('updateTime', 0) or post.get('createTime', 0),
+        '是否精华': post.get('isGood', 0),
+        '评论列表': comments,
+        '是否有更多评论': len(comments) >= page_size,
+        '当前页码': page_no,
+        '每页数量': page_size,
+        '用户': dict_user(post.get('user', {})),
+    }
+
+
+def old_dumps(data):
+    return json.dumps(data, sort_keys=True)
+
+
+def allocated(func):
+    """返回 func 的返回值占用的内存（字节）"""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API响应序列化微基准测试')
+    parser.add_argument('--posts', type=int, default=100, help='帖子列表中的帖子数')
+    parser.add_argument('--number', type=int, default=500)
+    args = parser.parse_args()
+
+    post_list = load_fixture('post_list.json')
+    template = post_list['posts']
+    post_list['posts'] = [copy.copy(template[i % len(template)]) for i in range(args.posts)]
+    detail = load_fixture('post_detail.json')
+
+    cases = [
+        (f"帖子列表（{args.posts}个）", lambda: dict_posts(post_list, 2),
+         lambda: upstream.parse_posts(post_list, 2)),
+        (f"帖子详情（{len(detail['comments'])}条评论）", lambda: dict_post_detail(detail),
+         lambda: upstream.parse_post_detail(detail)),
+    ]
+    for name, parse_dict, parse_model in cases:
+        old_data, new_data = parse_dict(), parse_model()
+        old_json, new_json = old_dumps(old_data), models.dumps(new_data)
+        assert json.loads(old_json) == json.loads(new_json), f"{name} 输出不一致"
+
+        print(f"{name}  JSON 原 {len(old_json.encode('utf-8'))} 字节 / 现 {len(new_json.encode('utf-8'))} 字节，"
+              f"内存 原 {allocated(parse_dict)} 字节 / 现 {allocated(parse_model)} 字节")
+        results = [
+            ('  整理（字典）', parse_dict),
+            ('  整理（模型）', parse_model),
+            ('  编码（字典，sort_keys）', lambda: old_dumps(old_data)),
+            ('  编码（模型）', lambda: models.dumpb(new_data)),
+            ('  编码（模型，标准库 json）', lambda: models._encoder.encode(new_data)),
+            ('  整理+编码（原）', lambda: old_dumps(parse_dict())),
+            ('  整理+编码（现）', lambda: models.dumpb(parse_model())),
+        ]
+        for label, func in results:
+            seconds = min(timeit.repeat(func, number=args.number, repeat=7)) / args.number
+            print(f"{label:<30} {seconds * 1e6:10.2f} us/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""floor.huluxia.com 的本地替身
+
+用 fixtures/ 中录制的板块列表、帖子列表和帖子详情响应模拟上游接口，
+可注入固定延迟、随机抖动和错误，供基准测试和离线调试使用。
+
+- 帖子列表按 cat_id/start 生成不同的帖子ID和活跃时间，每个板块共 --posts 个帖子
+- 帖子详情把 post_id 写回响应，评论按 page_no/page_size 分页
+- /image/<名称>.png 返回生成的 PNG 图片，供图片代理使用（需把替身的地址加入 HULUXIA_IMAGE_HOSTS）
+- 错误注入：按 --error-rate 的概率返回500，按 --drop-rate 的概率直接断开连接
+
+单独运行（然后用 HULUXIA_BASE_URL=http://127.0.0.1:8081 python app.py 启动网站）:
+    python benchmarks/stub_upstream.py --port 8081 --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def make_png(width=640, height=480):
+    """生成渐变色的 RGB PNG 图片，尺寸与帖子中的普通图片相当"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    rows = b''.join(
+        b'\x00' + bytes(value for x in range(width) for value in (x * 255 // width, y * 255 // height, 128))
+        for y in range(height)
+    )
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(rows, 6)) + chunk(b'IEND', b''))
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有5，并发连接一多新连接就会被丢弃，客户端要等约1秒重传SYN
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StubUpstream:
+    """在后台线程中运行的上游替身服务"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 drop_rate=0.0, posts_per_category=200, seed=None):
+        """
+        参数:
+            host (str): 监听地址
+            port (int): 监听端口，0表示随机分配
+            latency (float): 每个请求的固定延迟（秒）
+            jitter (float): 在固定延迟上叠加的随机延迟上限（秒）
+            error_rate (float): 返回500的概率
+            drop_rate (float): 不返回任何响应直接断开连接的概率
+            posts_per_category (int): 每个板块的帖子总数
+            seed (int): 随机数种子，用于复现错误注入
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.posts_per_category = posts_per_category
+        self.categories = load_fixture('category_list.json')
+        self.post_list = load_fixture('post_list.json')
+        self.post_detail = load_fixture('post_detail.json')
+        self.image = make_png()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # 响应头和响应体分两次写出，关闭Nagle算法避免与延迟确认叠加产生约40ms的额外延迟
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self.server = _Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='stub-upstream')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _roll(self):
+        with self._lock:
+            self.requests += 1
+            return self._random.random(), self._random.random() * self.jitter
+
+    def _handle(self, handler):
+        roll, jitter = self._roll()
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+
+        if roll < self.drop_rate:
+            handler.close_connection = True
+            handler.connection.close()
+            with self._lock:
+                self.errors += 1
+            return
+        if roll < self.drop_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            self._send(handler, 500, {'status': 0, 'msg': '服务器错误（注入）'})
+            return
+
+        parts = urlsplit(handler.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if parts.path.startswith('/category/list'):
+            body = self.categories
+        elif parts.path.startswith('/post/list'):
+            body = self._posts(query)
+        elif parts.path.startswith('/post/detail'):
+            body = self._detail(query)
+        elif parts.path.startswith('/image/'):
+            self._send_bytes(handler, 200, self.image, 'image/png')
+            return
+        else:
+            self._send(handler, 404, {'status': 0, 'msg': 'not found'})
+            return
+        self._send(handler, 200, body)
+
+    def _posts(self, query):
+        cat_id = int(query.get('cat_id', 0))
+        start = int(query.get('start', 0))
+        count = int(query.get('count', 20))
+        template = self.post_list['posts']
+        newest = max(post['activeTime'] for post in template)
+
+        posts = []
+        for offset in range(start, min(start + count, self.posts_per_category)):
+            post = copy.copy(template[offset % len(template)])
+            post['postID'] = cat_id * 1000000 + offset
+            post['categoryID'] = cat_id
+            post['activeTime'] = newest - offset * 60000
+            posts.append(post)
+        end = start + len(posts)
+        return {**self.post_list, 'posts': posts, 'start': end,
+                'more': 1 if end < self.posts_per_category else 0}
+
+    def _detail(self, query):
+        post_id = int(query.get('post_id', 0))
+        page_no = int(query.get('page_no', 1))
+        page_size = int(query.get('page_size', 20))
+        post = dict(self.post_detail['post'], postID=post_id)
+
+        template = self.post_detail['comments']
+        total = post['commentCount']
+        comments = []
+        for index in range((page_no - 1) * page_size, min(page_no * page_size, total)):
+            comment = copy.copy(template[index % len(template)])
+            comment['commentID'] = post_id * 1000 + index
+            comments.append(comment)
+        return {**self.post_detail, 'post': post, 'comments': comments,
+                'currPageNo': page_no, 'pageSize': page_size}
+
+    def _send(self, handler, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self._send_bytes(handler, status, data, 'application/json;charset=UTF-8')
+
+    def _send_bytes(self, handler, status, data, content_type):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='葫芦侠上游接口的本地替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='直接断开连接的概率')
+    parser.add_argument('--posts', type=int, default=200, help='每个板块的帖子总数')
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                        args.drop_rate, args.posts)
+    print(f"上游替身已启动: {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
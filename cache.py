@@ -0,0 +1,321 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+
+class TTLCache:
+    """带过期时间的单值缓存
+
+    过期后先返回旧值，同时在后台线程刷新（stale-while-revalidate）；
+    没有任何可用值时，并发的未命中只会触发一次上游请求。
+    加载函数抛出异常时不会覆盖已缓存的值。
+    """
+
+    def __init__(self, loader, ttl=300, name='cache'):
+        """
+        参数:
+            loader (callable): 无参加载函数，返回需要缓存的值，失败时抛出异常
+            ttl (float): 缓存有效期（秒）
+            name (str): 缓存名称，用于日志输出
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._loading = None  # 正在进行的加载（threading.Event），None表示空闲
+        self._error = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self):
+        """获取缓存值，必要时加载或在后台刷新"""
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is not None:
+                if now - self._loaded_at < self.ttl:
+                    self.hits += 1
+                    return self._value
+                # 已过期：返回旧值并在后台刷新
+                self.stale_hits += 1
+                if self._loading is None:
+                    self._loading = threading.Event()
+                    threading.Thread(target=self._refresh, daemon=True,
+                                     name=f"{self.name}-refresh").start()
+                return self._value
+
+            self.misses += 1
+            waiter = self._loading
+            if waiter is None:
+                # 由当前线程负责加载
+                self._loading = threading.Event()
+
+        if waiter is not None:
+            # 已有其他线程在加载，等待其结果
+            waiter.wait()
+            with self._lock:
+                if self._loaded_at is None:
+                    raise self._error
+                return self._value
+
+        self._refresh()
+        with self._lock:
+            if self._loaded_at is None:
+                raise self._error
+            return self._value
+
+    def _refresh(self):
+        """调用加载函数并更新缓存，唤醒所有等待者"""
+        try:
+            value = self.loader()
+        except Exception as e:
+            logging.error(f"{self.name} 刷新失败: {str(e)}")
+            with self._lock:
+                self.errors += 1
+                self._error = e
+                self._loading.set()
+                self._loading = None
+            return
+
+        with self._lock:
+            self.refreshes += 1
+            self._value = value
+            self._loaded_at = time.monotonic()
+            self._error = None
+            self._loading.set()
+            self._loading = None
+
+    def is_failing(self):
+        """最近一次加载是否失败（有旧值时 get 返回的是旧值）"""
+        with self._lock:
+            return self._error is not None
+
+    def invalidate(self):
+        """清除缓存值，下一次访问将重新加载"""
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
+
+    def stats(self):
+        """返回命中/未命中统计信息"""
+        with self._lock:
+            age = None if self._loaded_at is None else time.monotonic() - self._loaded_at
+            return {
+                'name': self.name,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'age': age,
+            }
+
+
+class ResponseCache:
+    """渲染结果缓存
+
+    按键保存渲染好的页面及其 ETag/Last-Modified，每个条目有独立的有效期，
+    超过容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        参数:
+            maxsize (int): 最多缓存的条目数，默认为1024
+        """
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """返回未过期的缓存条目，没有则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, etag, last_modified, ttl):
+        """保存渲染结果并返回对应的缓存条目"""
+        entry = CachedResponse(body, etag, last_modified, time.monotonic() + ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回命中/未命中统计信息"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class LRUCache:
+    """按键缓存
+
+    每个条目在写入后 ttl 秒内有效，超过容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, maxsize=256, ttl=60, name='lru'):
+        """
+        参数:
+            maxsize (int): 最多缓存的条目数，默认为256
+            ttl (float): 条目有效期（秒），默认为60
+            name (str): 缓存名称，用于统计输出
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # 键 -> (值, 过期时间)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """返回未过期的缓存值，没有则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] >= time.monotonic()
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回命中/未命中统计信息"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class CachedResponse:
+    """一条缓存的渲染结果"""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, body, etag, last_modified, expires):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+
+class SingleFlight:
+    """合并并发的相同调用
+
+    同一个键同时只有一个调用真正执行，其余调用者等待并共享它的结果或异常。
+    调用结束后立即移除，不做任何缓存。
+    """
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    def do(self, key, func):
+        """执行 func()，并发的相同 key 共享同一次执行
+
+        参数:
+            key: 可哈希的调用键，应由规范化后的参数组成
+            func (callable): 无参函数
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.deduplicated += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """返回执行与合并次数"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'executed': self.executed,
+                'deduplicated': self.deduplicated,
+                'in_flight': len(self._calls),
+            }
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
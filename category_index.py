@@ -0,0 +1,108 @@
+import unicodedata
+
+
+def normalize_name(name):
+    """规范化板块名称：全角转半角、忽略大小写并去除空白"""
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKC', str(name)).casefold()
+    return ''.join(name.split())
+
+
+class CategoryIndex:
+    """板块内存索引
+
+    每次刷新板块列表时重新构建，提供按板块ID、子版块ID、名称的O(1)查找，
+    以及基于前缀表和字符倒排表的名称搜索。
+    """
+
+    def __init__(self, categories, max_prefix=8):
+        """
+        参数:
+            categories (list): get_categories 返回的板块列表
+            max_prefix (int): 前缀索引的最大长度，默认为8
+        """
+        self.categories = categories
+        self.max_prefix = max_prefix
+        self.by_id = {}
+        self.by_tag = {}
+        self.by_name = {}
+        self._names = []      # 与 categories 对应的规范化名称
+        self._prefixes = {}   # 前缀 -> 板块下标列表
+        self._chars = {}      # 单个字符 -> 板块下标集合，用于子串搜索
+
+        for pos, category in enumerate(categories):
+            self.by_id[str(category['板块ID'])] = category
+            for tag in category.get('子版块', []):
+                # 同一个子版块ID只归属于第一个出现的板块
+                self.by_tag.setdefault(str(tag['ID']), category)
+
+            name = normalize_name(category.get('板块名称'))
+            self._names.append(name)
+            if not name:
+                continue
+            self.by_name.setdefault(name, category)
+            for i in range(1, min(len(name), max_prefix) + 1):
+                self._prefixes.setdefault(name[:i], []).append(pos)
+            for char in set(name):
+                self._chars.setdefault(char, set()).add(pos)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def get(self, category_id):
+        """按板块ID查找板块，未找到返回None"""
+        return self.by_id.get(str(category_id))
+
+    def get_by_tag(self, tag_id):
+        """按子版块ID查找其所属板块，未找到返回None"""
+        return self.by_tag.get(str(tag_id))
+
+    def get_by_name(self, name):
+        """按名称精确查找板块（忽略大小写、全半角和空白），未找到返回None"""
+        return self.by_name.get(normalize_name(name))
+
+    def search(self, query, limit=20):
+        """按名称搜索板块
+
+        结果依次为精确匹配、前缀匹配、子串匹配，同类结果保持板块列表原有顺序。
+
+        参数:
+            query (str): 搜索关键字
+            limit (int): 最多返回的板块数量，默认为20
+        """
+        query = normalize_name(query)
+        if not query or limit <= 0:
+            return []
+
+        if len(query) <= self.max_prefix:
+            prefix_hits = self._prefixes.get(query, [])
+        else:
+            prefix_hits = [pos for pos in self._prefixes.get(query[:self.max_prefix], [])
+                           if self._names[pos].startswith(query)]
+
+        # 子串候选：包含查询中所有字符的板块，再逐个校验
+        candidates = None
+        for char in set(query):
+            positions = self._chars.get(char)
+            if not positions:
+                candidates = set()
+                break
+            candidates = positions if candidates is None else candidates & positions
+        substring_hits = sorted(pos for pos in candidates if query in self._names[pos])
+
+        results = []
+        seen = set()
+        exact = self.by_name.get(query)
+        if exact is not None:
+            results.append(exact)
+            seen.add(id(exact))
+        for pos in prefix_hits + substring_hits:
+            category = self.categories[pos]
+            if id(category) in seen:
+                continue
+            seen.add(id(category))
+            results.append(category)
+            if len(results) >= limit:
+                break
+        return results[:limit]
@@ -0,0 +1,253 @@
+"""板块新帖/更新推送
+
+后台线程按活跃时间倒序轮询被订阅的板块，每个板块维护活跃时间水位线，
+只把比水位线新的帖子（新发布或有新回复）作为事件发布。所有订阅者共享同一个轮询循环，
+订阅者再多，每个板块每个轮询周期也只请求一次上游。
+
+事件ID为 "<启动时间>-<序号>"，最近的事件保存在内存中，客户端断线重连时
+按 Last-Event-ID 补发之后的事件；事件已被淘汰或服务重启过时发送 reset 事件，
+客户端应重新获取帖子列表。一次轮询翻到 max_pages 页仍未到达水位线时，
+更早的变化没有取到，同样为该板块发布 reset 事件（帖子为None）。
+
+某页获取失败时本次轮询不发布事件、不推进水位线，下次轮询从头重试。
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import upstream
+from circuit_breaker import degraded, reset_degraded
+from scheduler import PRIORITY_BACKGROUND, priority
+
+
+class ChangeFeed:
+    """板块变化轮询与事件缓存"""
+
+    def __init__(self, get_posts, interval=30, count=20, max_pages=3, history=1000, linger=300,
+                 max_categories=100):
+        """
+        参数:
+            get_posts (callable): 获取帖子列表，参数同 HuluxiaCrawler.get_posts
+            interval (float): 每个板块的轮询间隔（秒），默认为30
+            count (int): 每页获取的帖子数量，默认为20
+            max_pages (int): 单次轮询最多翻的页数，默认为3
+            history (int): 保留用于断线补发的最近事件数，默认为1000
+            linger (float): 板块的最后一个订阅者断开后继续轮询的时间（秒），便于重连后补发，默认为300
+            max_categories (int): 同时轮询的最大板块数，默认为100
+        """
+        self.get_posts = get_posts
+        self.interval = interval
+        self.count = count
+        self.max_pages = max_pages
+        self.linger = linger
+        self.max_categories = max_categories
+        self.epoch = str(int(time.time()))
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)   # (序号, 板块ID, 帖子)
+        self._seq = 0
+        self._subscribers = {}                 # 板块ID -> 订阅数
+        self._released = {}                    # 板块ID -> 最后一个订阅者断开的时间
+        self._watermarks = {}                  # 板块ID -> (活跃时间, 该时间的帖子ID集合)
+        self._next_poll = {}                   # 板块ID -> 下次轮询时间
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._polls = 0
+        self._poll_errors = 0
+
+    # ---- 订阅 ----
+
+    def can_subscribe(self, cat_ids):
+        """订阅这些板块后轮询的板块数是否不超过 max_categories"""
+        with self._cond:
+            return self._can_subscribe(cat_ids)
+
+    def _can_subscribe(self, cat_ids):
+        new = [cat_id for cat_id in cat_ids if cat_id not in self._next_poll]
+        return len(self._next_poll) + len(new) <= self.max_categories
+
+    def subscribe(self, cat_ids):
+        """订阅板块，首次订阅时启动轮询线程
+
+        异常:
+            ValueError: 轮询的板块数将超过 max_categories
+        """
+        with self._cond:
+            if not self._can_subscribe(cat_ids):
+                raise ValueError(f"同时订阅的板块数已达上限 {self.max_categories}")
+            new = [cat_id for cat_id in cat_ids if cat_id not in self._next_poll]
+            for cat_id in cat_ids:
+                self._subscribers[cat_id] = self._subscribers.get(cat_id, 0) + 1
+                self._released.pop(cat_id, None)
+            for cat_id in new:
+                self._next_poll[cat_id] = 0
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='change-feed')
+                self._thread.start()
+        if new:
+            self._wakeup.set()
+
+    def unsubscribe(self, cat_ids):
+        """取消订阅，板块在 linger 秒内没有新的订阅者后停止轮询"""
+        now = time.monotonic()
+        with self._cond:
+            for cat_id in cat_ids:
+                remaining = self._subscribers.get(cat_id, 0) - 1
+                if remaining > 0:
+                    self._subscribers[cat_id] = remaining
+                else:
+                    self._subscribers.pop(cat_id, None)
+                    self._released[cat_id] = now
+
+    # ---- 读取事件 ----
+
+    def last_event_id(self):
+        """返回最新事件的ID，新连接从这里开始接收"""
+        with self._cond:
+            return f"{self.epoch}-{self._seq}"
+
+    def events_after(self, event_id, cat_ids):
+        """返回 event_id 之后属于 cat_ids 的事件
+
+        参数:
+            event_id (str): 客户端收到的最后一个事件ID
+            cat_ids (set): 订阅的板块ID
+
+        返回:
+            (events, seq, reset): events 为 [(事件ID, 板块ID, 帖子)]，帖子为None表示该板块需要重新获取，
+            seq 为当前最新序号；
+            无法从 event_id 继续（事件已淘汰、服务重启过或ID无效）时 reset 为True，events 为空
+        """
+        epoch, _, seq = (event_id or '').partition('-')
+        with self._cond:
+            try:
+                after = int(seq)
+            except ValueError:
+                return [], self._seq, True
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if epoch != self.epoch or after > self._seq or after < oldest - 1:
+                return [], self._seq, True
+            return self._collect(after, cat_ids), self._seq, False
+
+    def wait(self, after, cat_ids, timeout):
+        """等待序号 after 之后的新事件，最多等待 timeout 秒
+
+        返回:
+            (events, seq): 属于 cat_ids 的新事件和当前最新序号
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after, timeout)
+            return self._collect(after, cat_ids), self._seq
+
+    def _collect(self, after, cat_ids):
+        return [(f"{self.epoch}-{seq}", cat_id, post) for seq, cat_id, post in self._events
+                if seq > after and cat_id in cat_ids]
+
+    # ---- 轮询 ----
+
+    def _run(self):
+        while True:
+            for cat_id in self._due_categories():
+                try:
+                    self.poll(cat_id)
+                except Exception as e:
+                    self._poll_errors += 1
+                    logging.error(f"轮询板块 {cat_id} 的新帖失败: {str(e)}")
+            with self._cond:
+                wait = min(self._next_poll.values(), default=time.monotonic() + self.interval) - time.monotonic()
+            self._wakeup.wait(max(wait, 0.05))
+            self._wakeup.clear()
+
+    def _due_categories(self):
+        """返回到达轮询时间的板块，并移除已无人订阅超过 linger 秒的板块"""
+        now = time.monotonic()
+        with self._cond:
+            for cat_id, released in list(self._released.items()):
+                if now - released > self.linger:
+                    del self._released[cat_id]
+                    self._next_poll.pop(cat_id, None)
+                    self._watermarks.pop(cat_id, None)
+            due = [cat_id for cat_id, at in self._next_poll.items() if at <= now]
+            for cat_id in due:
+                self._next_poll[cat_id] = now + self.interval
+        return due
+
+    def poll(self, cat_id):
+        """轮询一次板块，发布比水位线新的帖子，返回发布的事件数
+
+        第一次轮询只记录水位线，不发布事件。
+        """
+        with self._cond:
+            watermark = self._watermarks.get(cat_id)
+        self._polls += 1
+
+        fresh = {}
+        cursor = 0
+        truncated = True
+        for _ in range(self.max_pages):
+            reset_degraded()
+            with priority(PRIORITY_BACKGROUND):
+                page = self.get_posts(cat_id, 0, self.count, upstream.SORT_BY_ACTIVE, cursor)
+            if degraded():
+                # 上游失败时返回的是旧数据或空列表；已翻到的页也不发布，
+                # 否则推进水位线后失败页中的变化就再也不会发布
+                self._poll_errors += 1
+                return 0
+            posts = page['帖子列表']
+            if not posts:
+                truncated = False
+                break
+            if watermark is None:
+                newest = max(post['活跃时间'] for post in posts)
+                watermark = (newest, {post['帖子ID'] for post in posts if post['活跃时间'] == newest})
+                with self._cond:
+                    self._watermarks[cat_id] = watermark
+                return 0
+
+            newer = [post for post in posts if _is_newer(post, watermark)]
+            for post in newer:
+                fresh[post['帖子ID']] = post
+            if len(newer) < len(posts) or not page['是否有更多'] or page['下一页游标'] == cursor:
+                truncated = False
+                break
+            cursor = page['下一页游标']
+
+        if not fresh:
+            return 0
+        newest = max(post['活跃时间'] for post in fresh.values())
+        at_newest = {post_id for post_id, post in fresh.items() if post['活跃时间'] == newest}
+        if newest == watermark[0]:
+            at_newest |= watermark[1]
+        with self._cond:
+            self._watermarks[cat_id] = (newest, at_newest)
+            # 按活跃时间从旧到新发布
+            for post in sorted(fresh.values(), key=lambda post: post['活跃时间']):
+                self._seq += 1
+                self._events.append((self._seq, cat_id, post))
+            if truncated:
+                # 更早的变化超出了翻页上限，通知客户端重新获取帖子列表
+                self._seq += 1
+                self._events.append((self._seq, cat_id, None))
+            self._cond.notify_all()
+        if truncated:
+            logging.warning(f"板块 {cat_id} 的变化超过 {self.max_pages} 页，已发布 reset 事件")
+        logging.info(f"板块 {cat_id} 有 {len(fresh)} 个新帖或更新")
+        return len(fresh) + truncated
+
+    def stats(self):
+        """返回轮询与订阅统计"""
+        with self._cond:
+            return {
+                'categories': sorted(self._next_poll),
+                'subscribers': sum(self._subscribers.values()),
+                'events': self._seq,
+                'buffered_events': len(self._events),
+                'polls': self._polls,
+                'poll_errors': self._poll_errors,
+            }
+
+
+def _is_newer(post, watermark):
+    """帖子是否比水位线新，活跃时间相同的按帖子ID判断是否已发布过"""
+    active_time, seen = watermark
+    return post['活跃时间'] > active_time or (post['活跃时间'] == active_time and post['帖子ID'] not in seen)
@@ -0,0 +1,165 @@
+"""上游熔断与降级
+
+每个上游接口独立统计最近若干次请求的结果，失败比例超过阈值后熔断：
+熔断期间的请求直接失败（CircuitOpenError），不再排队等待限速或上游超时；
+熔断时间过后放行一个探测请求，成功则恢复，失败则继续熔断。
+
+请求失败时，调用者可以改为返回最近一次成功的数据，并通过 mark_degraded
+记录本次请求返回的是过期数据（stale）或没有可用数据（unavailable），
+由路由据此设置 Warning 响应头、返回503并跳过页面缓存。
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 降级类型
+STALE = 'stale'
+UNAVAILABLE = 'unavailable'
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"接口 {endpoint} 已熔断，{retry_in:.1f} 秒后重试")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class _Circuit:
+    """单个接口的熔断状态"""
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.results = deque(maxlen=window)   # 最近的请求结果，True表示成功
+        self.opened_at = 0.0
+        self.probing = False
+        self.opens = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """按接口熔断"""
+
+    def __init__(self, failure_rate=0.5, window=20, min_requests=10, open_seconds=30):
+        """
+        参数:
+            failure_rate (float): 触发熔断的失败比例，默认为0.5
+            window (int): 统计最近多少次请求，默认为20
+            min_requests (int): 窗口内至少有多少次请求才判断是否熔断，默认为10
+            open_seconds (float): 熔断持续时间（秒），之后放行一个探测请求，默认为30
+        """
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = _Circuit(self.window)
+        return circuit
+
+    def allow(self, endpoint):
+        """检查是否允许向接口发送请求，熔断中时抛出 CircuitOpenError"""
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == CLOSED:
+                return
+            retry_in = circuit.opened_at + self.open_seconds - time.monotonic()
+            if circuit.state == OPEN and retry_in <= 0:
+                circuit.state = HALF_OPEN
+            # 半开状态同一时间只放行一个探测请求
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                return
+            circuit.rejected += 1
+        raise CircuitOpenError(endpoint, max(retry_in, 0.0))
+
+    def record(self, endpoint, ok):
+        """记录一次请求的结果"""
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == HALF_OPEN and circuit.probing:
+                circuit.probing = False
+                if ok:
+                    circuit.state = CLOSED
+                    circuit.results.clear()
+                    logging.info(f"接口 {endpoint} 探测成功，恢复请求")
+                else:
+                    self._open(endpoint, circuit)
+                return
+            if circuit.state != CLOSED:
+                return
+
+            circuit.results.append(ok)
+            failures = circuit.results.count(False)
+            if (len(circuit.results) >= self.min_requests
+                    and failures / len(circuit.results) >= self.failure_rate):
+                self._open(endpoint, circuit)
+
+    def release(self, endpoint):
+        """放行后请求未发出（如排队超时）时调用，归还探测机会"""
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+
+    def _open(self, endpoint, circuit):
+        circuit.state = OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.opens += 1
+        circuit.results.clear()
+        logging.warning(f"接口 {endpoint} 失败过多，熔断 {self.open_seconds} 秒")
+
+    def state(self, endpoint):
+        with self._lock:
+            return self._circuit(endpoint).state
+
+    def stats(self):
+        """返回各接口的熔断状态"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                endpoint: {
+                    'state': circuit.state,
+                    'recent_requests': len(circuit.results),
+                    'recent_failures': circuit.results.count(False),
+                    'opens': circuit.opens,
+                    'rejected': circuit.rejected,
+                    'retry_in': (round(max(circuit.opened_at + self.open_seconds - now, 0.0), 1)
+                                 if circuit.state == OPEN else None),
+                }
+                for endpoint, circuit in self._circuits.items()
+            }
+
+
+# ---- 本次请求的降级标记 ----
+
+_local = threading.local()
+
+
+def reset_degraded():
+    """清除当前线程的降级标记，每个请求开始时调用"""
+    _local.degraded = set()
+
+
+def mark_degraded(kind):
+    """记录当前请求返回了过期数据（STALE）或没有可用数据（UNAVAILABLE）"""
+    degraded = getattr(_local, 'degraded', None)
+    if degraded is None:
+        degraded = _local.degraded = set()
+    degraded.add(kind)
+
+
+def degraded():
+    """返回当前请求的降级标记集合"""
+    return getattr(_local, 'degraded', None) or set()
@@ -0,0 +1,66 @@
+"""响应压缩
+
+按客户端的 Accept-Encoding 选择 brotli 或 gzip 压缩文本类响应（JSON、HTML等）。
+小于阈值的响应压缩收益很小，不压缩；流式响应、文件（图片）和已编码的响应也不压缩。
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # Brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+# 值得压缩的响应类型
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/javascript',
+}
+
+
+def supported_encodings():
+    """返回服务端支持的编码，按优先顺序排列"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=4):
+    """按客户端支持的编码压缩响应体
+
+    参数:
+        response (Response): Flask 响应
+        accept_encodings (Accept): 请求的 Accept-Encoding（request.accept_encodings）
+        min_size (int): 响应体小于该字节数时不压缩，默认为1024
+        gzip_level (int): gzip 压缩级别，默认为6
+        brotli_quality (int): brotli 压缩质量，动态内容使用较低的4，默认为4
+
+    返回:
+        str: 使用的编码（'br' 或 'gzip'），未压缩时返回None
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return None
+    # 同一地址的响应可能因 Accept-Encoding 不同而不同，告知中间缓存
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return None
+    encoding = accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return None
+
+    if encoding == 'br':
+        data = brotli.compress(body, quality=brotli_quality)
+    else:
+        data = gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # 强ETag标识的是具体字节，压缩后需要区分；弱ETag表示内容等价，保持不变
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return encoding
@@ -0,0 +1,135 @@
+"""帖子内容渲染
+
+将帖子内容中的 <text>、<image> 标签和 @图片URL 转换为HTML。
+使用一个预编译的正则单次扫描内容，输出按列表拼接，并按内容哈希缓存渲染结果。
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# 一次扫描同时匹配：<text>文本</text>、<image>图片URL,宽,高</image>、@图片URL
+# 三者都不会跨行，因此换行可以在扫描之后统一切分。
+# <text> 的内容等价于 (.*?)</text>，展开写法避免惰性匹配逐字符回溯
+_TOKEN_RE = re.compile(
+    r'<(?:text>([^<\n]*(?:<(?!/text>)[^<\n]*)*)</text>|image>([^<\n]*)</image>)'
+    r'|@(https?://[^\s<]+)'
+)
+# <text> 标签内部仍可能夹带图片
+_INLINE_IMAGE_RE = re.compile(r'<image>([^<\n]*)</image>|@(https?://[^\s<]+)')
+
+# 图库缩略图宽度（每行3张）
+GALLERY_THUMBNAIL_WIDTH = 320
+# 图片URL改写函数 image_url(url, width)，None 表示直接使用原始URL
+_image_url = None
+
+# 渲染结果缓存（内容哈希 -> HTML）
+CACHE_SIZE = 512
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def render_content(content):
+    """将帖子内容中的复杂格式转换为HTML（带缓存）"""
+    if not content:
+        return ""
+
+    key = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+    with _cache_lock:
+        html = _cache.get(key)
+        if html is not None:
+            _cache.move_to_end(key)
+            _cache_stats['hits'] += 1
+            return html
+        _cache_stats['misses'] += 1
+
+    html = _render(content)
+
+    with _cache_lock:
+        _cache[key] = html
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return html
+
+
+def _render(content):
+    """单次扫描渲染帖子内容
+
+    <text> 标签内容包裹为段落，图片标签和 @URL 从正文中移除并收集，
+    然后按换行切分为段落；图片按每行3张追加到内容末尾（先 <image> 标签，后 @URL）。
+    """
+    # split 按顺序返回 [普通文本, text, image, url, 普通文本, ...]
+    pieces = _TOKEN_RE.split(content)
+    body = []
+    tag_images = []
+    url_images = []
+
+    for i in range(0, len(pieces) - 1, 4):
+        body.append(pieces[i])
+        text, image, url = pieces[i + 1], pieces[i + 2], pieces[i + 3]
+        if text is not None:
+            if not text.strip():  # 空文本直接移除
+                continue
+            if '<image>' in text or '@' in text:
+                for inline in _INLINE_IMAGE_RE.finditer(text):
+                    if inline.group(1) is not None:
+                        tag_images.append(inline.group(1).split(',', 1)[0])
+                    else:
+                        url_images.append(inline.group(2))
+                text = _INLINE_IMAGE_RE.sub('', text)
+            body.append('<p class="post-text">' + text + '</p>')
+        elif image is not None:
+            tag_images.append(image.split(',', 1)[0])
+        else:
+            url_images.append(url)
+    body.append(pieces[-1])
+
+    parts = ['<p class="post-text">' + line + '</p>' for line in ''.join(body).split('\n') if line.strip()]
+
+    # 将收集到的图片按每行3张的方式添加到内容后面，并支持Lightbox点击放大
+    image_urls = tag_images + url_images
+    if image_urls:
+        parts.append('<div class="post-image-gallery">')
+        for i in range(0, len(image_urls), 3):
+            parts.append('<div class="post-image-row">')
+            # 图片索引从1开始
+            parts.extend(_gallery_item(url, index) for index, url in enumerate(image_urls[i:i + 3], i + 1))
+            parts.append('</div>')
+        parts.append('</div>')
+
+    return ''.join(parts)
+
+
+def _gallery_item(url, index):
+    """单张图片的HTML，设置了图片代理时缩略图与原图都经代理加载"""
+    href = src = url
+    if _image_url is not None:
+        href = _image_url(url)
+        src = _image_url(url, GALLERY_THUMBNAIL_WIDTH)
+    return f'''
+                <div class="post-image-container">
+                    <a href="{href}" data-lightbox="post-images" data-title="帖子图片 {index}">
+                        <img src="{src}" alt="帖子图片" class="post-image">
+                    </a>
+                </div>
+                '''
+
+
+def set_image_url(func):
+    """设置图片URL改写函数 func(url, width=None)，并清空渲染缓存"""
+    global _image_url
+    _image_url = func
+    clear_cache()
+
+
+def cache_stats():
+    """返回渲染缓存的命中统计"""
+    with _cache_lock:
+        return {'size': len(_cache), 'maxsize': CACHE_SIZE, **_cache_stats}
+
+
+def clear_cache():
+    """清空渲染缓存"""
+    with _cache_lock:
+        _cache.clear()
@@ -1,9 +1,17 @@
-import requests
+import argparse
 import json
+import os
+import socket
+import sys
+import threading
 import time
-import random
 import logging
-from urllib.parse import urljoin
+
+from api_crawler import HuluxiaCrawler as ApiCrawler
+from category_index import CategoryIndex
+from scheduler import CrawlScheduler, PRIORITY_BACKGROUND, priority
+import models
+import upstream
 
 # 配置日志
 logging.basicConfig(
@@ -15,86 +23,33 @@ logging.basicConfig(
     ]
 )
 
+# 上游接口地址，测试时可用 HULUXIA_BASE_URL 指向本地桩服务（与网站相同）
+BASE_URL = os.environ.get('HULUXIA_BASE_URL', upstream.BASE_URL)
+
 class HuluxiaCrawler:
-    """葫芦侠数据采集器"""
-    
-    def __init__(self):
-        self.base_url = "http://floor.huluxia.com"
-        self.headers = {
-            'Host': 'floor.huluxia.com',
-            'Accept': 'application/json, text/json, text/x-json, text/javascript, application/xml, text/xml',
-            'User-Agent': 'PHP cURL Request',
-            'Connection': 'Keep-Alive',
-            'Accept-Encoding': 'gzip, deflate'
-        }
+    """葫芦侠板块信息查看器，请求由 make_api_crawler 创建的接口采集器发送"""
+    
+    def __init__(self, api_crawler=None, rate=5):
+        """
+        参数:
+            api_crawler (api_crawler.HuluxiaCrawler): 接口采集器，默认按 rate 新建一个
+            rate (float): 新建接口采集器时每个上游接口的初始请求速率（次/秒），默认为5
+        """
+        self.api_crawler = api_crawler or make_api_crawler(rate)
     
     def get_categories(self):
-        """获取葫芦侠板块信息"""
-        try:
-            # 使用需求文件中指定的板块接口
-            url = urljoin(self.base_url, "/category/list/ANDROID/2.0")
-            logging.info(f"开始获取板块信息: {url}")
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()  # 如果请求不成功则抛出异常
-            
-            # 解析JSON响应
-            data = response.json()
-            logging.info(f"成功获取板块信息，状态消息: {data.get('msg', '')}")
-            
-            # 提取板块数据
-            categories = data.get('categories', [])
-            logging.info(f"共获取到 {len(categories)} 个板块")
-            
-            # 整理板块数据
-            categories_data = []
-            for category in categories:
-                category_info = {
-                    '板块ID': category.get('categoryID', ''),
-                    '板块名称': category.get('title', ''),
-                    '板块描述': category.get('description', ''),
-                    '帖子数量': category.get('postCount', 0),
-                    '浏览数量': category.get('viewCount', 0),
-                    '板块图标': category.get('icon', ''),
-                    '模型类型': category.get('model', 0),
-                    '是否精品': category.get('isGood', 0),
-                    '是否订阅': category.get('isSubscribe', 0),
-                    '排序序号': category.get('seq', 0),
-                    '订阅类型': category.get('subscribeType', 0),
-                }
-                
-                # 提取版主信息
-                moderators = category.get('moderator', [])
-                moderator_names = [mod.get('nick', '') for mod in moderators]
-                category_info['版主'] = '、'.join(moderator_names)
-                
-                # 提取子版块（标签）信息，包含ID和名称
-                tags = category.get('tags', [])
-                category_info['子版块'] = [{'ID': tag.get('ID', ''), '名称': tag.get('name', '')} for tag in tags]
-                
-                categories_data.append(category_info)
-            
-            return categories_data
-            
-        except Exception as e:
-            logging.error(f"获取板块信息失败: {str(e)}")
-            return []
+        """获取葫芦侠板块信息，失败时返回空列表"""
+        return self.api_crawler.get_categories()
     
     def save_to_json(self, data, filename):
         """将数据保存到JSON文件"""
         try:
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+                json.dump(data, f, ensure_ascii=False, indent=4, default=models.json_default)
             logging.info(f"数据已保存到 {filename}")
         except Exception as e:
             logging.error(f"保存数据到JSON失败: {str(e)}")
     
-    def random_sleep(self, min_seconds=1, max_seconds=3):
-        """随机休眠一段时间，避免请求过于频繁"""
-        sleep_time = random.uniform(min_seconds, max_seconds)
-        logging.info(f"休眠 {sleep_time:.2f} 秒")
-        time.sleep(sleep_time)
-
     def display_categories(self, categories):
         """在控制台直接显示板块信息"""
         if not categories:
@@ -138,14 +93,14 @@ class HuluxiaCrawler:
             print("未获取到任何板块信息")
             return
         
-        # 查找目标板块
+        # 通过ID或名称在索引中查找目标板块
+        index = CategoryIndex(categories)
         target_category = None
-        for category in categories:
-            # 通过名称或ID匹配
-            if (target_name and target_name in category['板块名称']) or \
-               (target_id and str(target_id) == str(category['板块ID'])):
-                target_category = category
-                break
+        if target_id:
+            target_category = index.get(target_id)
+        if not target_category and target_name:
+            matches = index.search(target_name, limit=1)
+            target_category = matches[0] if matches else None
         
         if not target_category:
             print(f"未找到指定的板块: {target_name or target_id}")
@@ -193,10 +148,311 @@ class HuluxiaCrawler:
         print("\n" + "="*80)
 
 
-if __name__ == "__main__":
+def make_api_crawler(rate, mirror=None):
+    """创建命令行使用的接口采集器（帖子列表与详情），rate 为每个上游接口的初始请求速率（次/秒）"""
+    return ApiCrawler(base_url=BASE_URL, mirror=mirror, scheduler=CrawlScheduler(rate=rate, max_rate=max(rate, 20)))
+
+
+def export_category(cat_id, output, tag_id=0, with_details=False, sort_by=0, resume=False, rate=5):
+    """将板块下的全部帖子导出为NDJSON文件
+    
+    每获取一页就追加写入并刷新到磁盘，随后把下一页游标写入 <output>.cursor。
+    resume 为True时从检查点记录的游标继续，已写入的记录不会重复。
+    rate 为每个上游接口的初始请求速率（次/秒），之后根据上游响应自适应调整。
+    上游失败时停止导出，检查点保留最后一页成功写入后的游标。
+    
+    返回:
+        bool: 是否已导出完成
+    """
+    checkpoint = output + '.cursor'
+    start = 0
+    mode = 'w'
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('板块ID') != cat_id or state.get('子版块ID') != tag_id:
+            logging.error(f"检查点 {checkpoint} 与当前板块不一致，无法继续导出")
+            return False
+        if state.get('已完成'):
+            logging.info(f"板块 {cat_id} 已导出完成: {output}")
+            return True
+        start = state.get('下一页游标', 0)
+        mode = 'a'
+        logging.info(f"从游标 {start} 继续导出板块 {cat_id}")
+    
+    api_crawler = make_api_crawler(rate)
+    written = 0
+    next_cursor = start
+    # 命令行导出没有交互请求，以后台优先级排队，不受排队超时限制
+    with priority(PRIORITY_BACKGROUND), open(output, mode, encoding='utf-8') as f:
+        try:
+            for next_cursor, records in api_crawler.iter_export_records(cat_id, tag_id, with_details, sort_by=sort_by, start=start):
+                for record in records:
+                    f.write(models.dumps(record) + '\n')
+                f.flush()
+                written += len(records)
+                save_checkpoint(checkpoint, {'板块ID': cat_id, '子版块ID': tag_id, '下一页游标': next_cursor})
+                logging.info(f"已导出 {written} 条帖子，下一页游标: {next_cursor}")
+        except Exception as e:
+            logging.error(f"导出板块 {cat_id} 中断: {str(e)}，已导出 {written} 条帖子，"
+                          f"可使用 --resume 从游标 {next_cursor} 继续")
+            return False
+    
+    save_checkpoint(checkpoint, {'板块ID': cat_id, '子版块ID': tag_id, '已完成': True})
+    logging.info(f"板块 {cat_id} 导出完成，共 {written} 条帖子: {output}")
+    return True
+
+
+def sync_categories(cat_ids, db_path, rate=5):
+    """把指定板块增量同步到本地SQLite镜像"""
+    from mirror import Mirror
+    
+    api_crawler = make_api_crawler(rate, mirror=Mirror(db_path))
+    for cat_id in cat_ids:
+        result = api_crawler.sync_category(cat_id)
+        print(f"板块 {cat_id}: 翻页 {result['页数']} 页，{result['变化帖子数']} 个帖子有变化，"
+              f"更新详情 {result['更新详情数']} 个")
+
+
+# 任务类型与优先级（数值小的先执行）：先翻页，尽早发现需要获取详情的帖子
+JOB_POSTS = 'posts'
+JOB_DETAIL = 'detail'
+JOB_PRIORITY = {JOB_POSTS: 0, JOB_DETAIL: 1}
+
+
+def posts_job(cat_id, tag_id, sort_by, count, start, page, max_pages, details, all_comments, version):
+    """返回帖子列表一页的任务"""
+    payload = {'cat_id': cat_id, 'tag_id': tag_id, 'sort_by': sort_by, 'count': count, 'start': start,
+               'page': page, 'max_pages': max_pages, 'details': details, 'all_comments': all_comments}
+    return JOB_POSTS, f"{cat_id}:{tag_id}:{sort_by}:{start}", payload, version, JOB_PRIORITY[JOB_POSTS]
+
+
+def detail_job(post_id, page_no, page_size, all_comments, version):
+    """返回帖子详情（一页评论）的任务"""
+    payload = {'post_id': post_id, 'page_no': page_no, 'page_size': page_size, 'all_comments': all_comments}
+    return JOB_DETAIL, f"{post_id}:{page_no}", payload, version, JOB_PRIORITY[JOB_DETAIL]
+
+
+def enqueue_categories(cat_ids, queue_path, tag_id=0, sort_by=0, count=20, max_pages=20, details=True,
+                       all_comments=False):
+    """把板块加入采集任务队列，由 worker 进程翻页并获取帖子详情
+    
+    参数:
+        cat_ids (list): 板块ID列表
+        queue_path (str): 任务队列数据库文件
+        tag_id (int): 子版块ID，默认为0（全部）
+        sort_by (int): 排序方式，默认为0
+        count (int): 每页帖子数量，默认为20
+        max_pages (int): 每个板块最多翻的页数，0表示不限，默认为20
+        details (bool): 是否获取每个帖子的详情，默认为True
+        all_comments (bool): 是否获取帖子的全部评论页，默认为False（只获取第一页）
+    """
+    from work_queue import WorkQueue
+    
+    # 以加入时间作为版本：已完成的翻页任务会重新执行，等待中的不会重复加入
+    version = int(time.time() * 1000)
+    jobs = [posts_job(cat_id, tag_id, sort_by, count, 0, 0, max_pages, details, all_comments, version)
+            for cat_id in cat_ids]
+    added = WorkQueue(queue_path).enqueue(jobs)
+    print(f"已加入 {added} 个板块任务（共 {len(jobs)} 个，其余已在队列中）")
+
+
+def process_job(api_crawler, job):
+    """执行一个采集任务，返回它产生的后续任务，失败时抛出异常"""
+    payload = job.payload
+    if job.kind == JOB_POSTS:
+        start = payload['start']
+        page = api_crawler.fetch_posts(payload['cat_id'], payload['tag_id'], payload['count'],
+                                       payload['sort_by'], start)
+        new_jobs = []
+        if payload['details']:
+            # 帖子详情以活跃时间为版本，帖子有新回复时才重新获取
+            new_jobs.extend(detail_job(post['帖子ID'], 1, 20, payload['all_comments'], post['活跃时间'])
+                            for post in page['帖子列表'])
+        next_page = payload['page'] + 1
+        next_cursor = page['下一页游标']
+        if (page['帖子列表'] and page['是否有更多'] and next_cursor != start
+                and (not payload['max_pages'] or next_page < payload['max_pages'])):
+            new_jobs.append(posts_job(payload['cat_id'], payload['tag_id'], payload['sort_by'], payload['count'],
+                                      next_cursor, next_page, payload['max_pages'], payload['details'],
+                                      payload['all_comments'], job.version))
+        return new_jobs
+    
+    if job.kind == JOB_DETAIL:
+        detail = api_crawler.fetch_post_detail(payload['post_id'], payload['page_no'], payload['page_size'])
+        if payload['all_comments'] and detail['是否有更多评论']:
+            return [detail_job(payload['post_id'], payload['page_no'] + 1, payload['page_size'], True, job.version)]
+        return []
+    
+    raise ValueError(f"未知的任务类型: {job.kind}")
+
+
+def run_worker(queue_path, db_path, rate=5, threads=4, lease_seconds=60, exit_when_idle=False, poll_interval=2):
+    """从任务队列领取并执行采集任务，结果写入本地SQLite镜像
+    
+    同一台机器上可以同时运行任意多个 worker 进程，总吞吐随进程数增加；
+    rate 是每个进程、每个上游接口的初始请求速率。
+    
+    参数:
+        queue_path (str): 任务队列数据库文件
+        db_path (str): 镜像数据库文件
+        rate (float): 每个上游接口的初始请求速率（次/秒），默认为5
+        threads (int): 本进程同时执行的任务数，默认为4
+        lease_seconds (float): 任务租约有效期（秒），默认为60，每隔三分之一有效期续约一次
+        exit_when_idle (bool): 队列中没有等待或处理中的任务时退出，默认为False（持续等待新任务）
+        poll_interval (float): 没有任务时的轮询间隔（秒），默认为2
+    """
+    from mirror import Mirror
+    from work_queue import WorkQueue
+    
+    work_queue = WorkQueue(queue_path)
+    api_crawler = make_api_crawler(rate, mirror=Mirror(db_path))
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    lock = threading.Lock()
+    counts = {'完成': 0, '重试': 0, '失败': 0}
+    
+    def heartbeat():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                work_queue.heartbeat(owner, lease_seconds)
+            except Exception as e:
+                logging.error(f"任务续约失败: {str(e)}")
+    
+    def work():
+        # 没有交互请求，以后台优先级排队，不受排队超时限制
+        with priority(PRIORITY_BACKGROUND):
+            while not stop.is_set():
+                jobs = work_queue.lease(owner, 1, lease_seconds)
+                if not jobs:
+                    idle = work_queue.is_idle()
+                    if exit_when_idle and idle:
+                        return
+                    # 其他任务仍在执行时很快会产生后续任务，缩短轮询间隔
+                    stop.wait(poll_interval if idle else 0.1)
+                    continue
+                
+                job = jobs[0]
+                try:
+                    new_jobs = process_job(api_crawler, job)
+                except Exception as e:
+                    retry = work_queue.fail(job, owner, e)
+                    logging.error(f"任务 {job} 第 {job.attempts} 次执行失败{'，稍后重试' if retry else ''}: {str(e)}")
+                    with lock:
+                        counts['重试' if retry else '失败'] += 1
+                    continue
+                if work_queue.complete(job, owner, new_jobs):
+                    with lock:
+                        counts['完成'] += 1
+    
+    logging.info(f"采集进程 {owner} 开始领取任务: {queue_path}")
+    threading.Thread(target=heartbeat, daemon=True, name='queue-heartbeat').start()
+    workers = [threading.Thread(target=work, daemon=True, name=f"queue-worker-{i}") for i in range(max(threads, 1))]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=1)
+    except KeyboardInterrupt:
+        logging.info("收到中断信号，等待正在执行的任务结束")
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        stop.set()
+        released = work_queue.release(owner)
+        if released:
+            logging.info(f"已归还 {released} 个未完成的任务")
+    print(f"采集进程 {owner} 退出: 完成 {counts['完成']} 个任务，重试 {counts['重试']} 次，失败 {counts['失败']} 个")
+
+
+def show_queue_status(queue_path):
+    """显示任务队列中各类任务的数量和最近的失败"""
+    from work_queue import WorkQueue
+    
+    work_queue = WorkQueue(queue_path)
+    print(f"{'类型':<10}{'等待':>8}{'处理中':>8}{'完成':>8}{'失败':>8}")
+    for kind, states in sorted(work_queue.stats().items()):
+        print(f"{kind:<10}{states['pending']:>8}{states['leased']:>8}{states['done']:>8}{states['failed']:>8}")
+    for kind, key, attempts, error in work_queue.failures():
+        print(f"失败: {kind} {key}（{attempts} 次）: {error}")
+
+
+def save_checkpoint(path, state):
+    """原子地写入导出检查点"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='葫芦侠数据采集器')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    export_parser = subparsers.add_parser('export', help='将板块下的全部帖子导出为NDJSON')
+    export_parser.add_argument('cat_id', type=int, help='板块ID')
+    export_parser.add_argument('-o', '--output', help='输出文件，默认为 category_<板块ID>.ndjson')
+    export_parser.add_argument('--tag-id', type=int, default=0, help='子版块ID，默认为0（全部）')
+    export_parser.add_argument('--sort-by', type=int, default=0, help='排序方式，默认为0')
+    export_parser.add_argument('--details', action='store_true', help='同时获取每个帖子的详情')
+    export_parser.add_argument('--resume', action='store_true', help='从上次中断的位置继续导出')
+    export_parser.add_argument('--rate', type=float, default=5, help='每个上游接口的初始请求速率（次/秒），默认为5')
+    
+    sync_parser = subparsers.add_parser('sync', help='把板块增量同步到本地SQLite镜像')
+    sync_parser.add_argument('cat_ids', type=int, nargs='+', help='板块ID')
+    sync_parser.add_argument('--db', default='huluxia.db', help='镜像数据库文件，默认为 huluxia.db')
+    sync_parser.add_argument('--rate', type=float, default=5, help='每个上游接口的初始请求速率（次/秒），默认为5')
+    
+    enqueue_parser = subparsers.add_parser('enqueue', help='把板块加入采集任务队列')
+    enqueue_parser.add_argument('cat_ids', type=int, nargs='+', help='板块ID')
+    enqueue_parser.add_argument('--queue', default='crawl_queue.db', help='任务队列数据库文件，默认为 crawl_queue.db')
+    enqueue_parser.add_argument('--tag-id', type=int, default=0, help='子版块ID，默认为0（全部）')
+    enqueue_parser.add_argument('--sort-by', type=int, default=0, help='排序方式，默认为0')
+    enqueue_parser.add_argument('--pages', type=int, default=20, help='每个板块最多翻的页数，0表示不限，默认为20')
+    enqueue_parser.add_argument('--no-details', action='store_true', help='只翻页，不获取帖子详情')
+    enqueue_parser.add_argument('--all-comments', action='store_true', help='获取帖子的全部评论页')
+    
+    worker_parser = subparsers.add_parser('worker', help='从任务队列领取并执行采集任务，结果写入本地SQLite镜像')
+    worker_parser.add_argument('--queue', default='crawl_queue.db', help='任务队列数据库文件，默认为 crawl_queue.db')
+    worker_parser.add_argument('--db', default='huluxia.db', help='镜像数据库文件，默认为 huluxia.db')
+    worker_parser.add_argument('--rate', type=float, default=5, help='本进程每个上游接口的初始请求速率（次/秒），默认为5')
+    worker_parser.add_argument('--threads', type=int, default=4, help='本进程同时执行的任务数，默认为4')
+    worker_parser.add_argument('--lease', type=float, default=60, help='任务租约有效期（秒），默认为60')
+    worker_parser.add_argument('--exit-when-idle', action='store_true', help='队列中没有任务时退出')
+    
+    status_parser = subparsers.add_parser('status', help='显示采集任务队列的状态')
+    status_parser.add_argument('--queue', default='crawl_queue.db', help='任务队列数据库文件，默认为 crawl_queue.db')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'export':
+        output = args.output or f"category_{args.cat_id}.ndjson"
+        if not export_category(args.cat_id, output, args.tag_id, args.details, args.sort_by, args.resume, args.rate):
+            sys.exit(1)
+        return
+    if args.command == 'sync':
+        sync_categories(args.cat_ids, args.db, args.rate)
+        return
+    if args.command == 'enqueue':
+        enqueue_categories(args.cat_ids, args.queue, args.tag_id, args.sort_by, max_pages=args.pages,
+                           details=not args.no_details, all_comments=args.all_comments)
+        return
+    if args.command == 'worker':
+        run_worker(args.queue, args.db, args.rate, args.threads, args.lease, args.exit_when_idle)
+        return
+    if args.command == 'status':
+        show_queue_status(args.queue)
+        return
+    
     crawler = HuluxiaCrawler()
     categories = crawler.get_categories()
     
     # 显示所有板块及其子版块
     crawler.display_all_categories_with_subcategories(categories)
-    logging.info("板块信息获取完成") 
\ No newline at end of file
+    logging.info("板块信息获取完成")
+
+
+if __name__ == "__main__":
+    main()
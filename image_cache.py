@@ -0,0 +1,253 @@
+"""图片代理的磁盘缓存
+
+图片按内容的SHA-256保存（objects/<前两位>/<摘要>），相同的图片只存一份，
+摘要同时用作 ETag。每个 (图片URL, 缩略图宽度) 对应一个引用文件（refs/<键>），
+记录内容摘要和类型。总大小超过上限时按最近访问时间淘汰内容文件，
+并删除指向它的引用文件。
+缩略图需要 Pillow，未安装时直接返回原图。
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from cache import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+# 允许生成的缩略图宽度，避免任意尺寸撑满缓存
+THUMBNAIL_WIDTHS = (64, 160, 320, 640)
+
+# 多帧（动图）不生成缩略图
+_THUMBNAIL_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+class ImageCache:
+    """内容寻址、按大小LRU淘汰的图片磁盘缓存"""
+
+    def __init__(self, directory, fetch, max_bytes=512 * 1024 * 1024, allowed_hosts=(),
+                 max_image_bytes=20 * 1024 * 1024):
+        """
+        参数:
+            directory (str): 缓存目录
+            fetch (callable): fetch(url) 返回 (图片字节, Content-Type)，失败时抛出异常
+            max_bytes (int): 缓存总大小上限（字节），默认为512MB
+            allowed_hosts (tuple): 允许代理的图片域名（含子域名），为空时不限制
+            max_image_bytes (int): 单张图片的大小上限（字节），默认为20MB
+        """
+        self.directory = directory
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.allowed_hosts = tuple(host.lower().lstrip('.') for host in allowed_hosts)
+        self.max_image_bytes = max_image_bytes
+        self.flight = SingleFlight(name='图片下载合并')
+        self._lock = threading.Lock()
+        self._objects = OrderedDict()   # 内容摘要 -> 文件大小，按最近访问排序
+        self._refs = {}                 # 内容摘要 -> 指向它的引用文件名集合
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'refs'), exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """启动时按修改时间重建LRU顺序，并删除指向不存在内容的引用文件"""
+        found = []
+        objects_dir = os.path.join(self.directory, 'objects')
+        for prefix in os.listdir(objects_dir):
+            prefix_dir = os.path.join(objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name.endswith('.tmp'):
+                    continue
+                st = os.stat(os.path.join(prefix_dir, name))
+                found.append((st.st_mtime, name, st.st_size))
+        found.sort()
+        for _, digest, size in found:
+            self._objects[digest] = size
+            self._total += size
+        
+        refs_dir = os.path.join(self.directory, 'refs')
+        removed = 0
+        for name in os.listdir(refs_dir):
+            path = os.path.join(refs_dir, name)
+            digest = None if name.endswith('.tmp') else _read_ref(path)[0]
+            if digest in self._objects:
+                self._refs.setdefault(digest, set()).add(name)
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        logging.info(f"图片缓存已加载: {len(self._objects)} 个文件，共 {self._total} 字节，"
+                     f"清理失效引用 {removed} 个")
+
+    def is_allowed(self, url):
+        """只代理 http(s) 且域名在白名单中的图片"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return False
+        if not self.allowed_hosts:
+            return True
+        host = parts.hostname.lower()
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts)
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _ref_path(self, url, width):
+        key = hashlib.sha256(f"{url}\0{width or 0}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'refs', key)
+
+    def get(self, url, width=None):
+        """返回 (文件路径, Content-Type, 内容摘要)，必要时下载原图并生成缩略图
+
+        参数:
+            url (str): 图片地址，需通过 is_allowed 检查
+            width (int): 缩略图宽度，需在 THUMBNAIL_WIDTHS 中，默认为None（原图）
+        """
+        if width is not None and (Image is None or width not in THUMBNAIL_WIDTHS):
+            width = None
+        cached = self._lookup(url, width)
+        if cached is not None:
+            return cached
+        return self.flight.do((url, width), lambda: self._lookup(url, width, count=False) or self._load(url, width))
+
+    def _lookup(self, url, width, count=True):
+        """查找引用文件及其指向的内容文件，任意一个缺失时返回None"""
+        digest, mimetype = _read_ref(self._ref_path(url, width))
+
+        with self._lock:
+            if digest is None or digest not in self._objects:
+                if count:
+                    self.misses += 1
+                return None
+            self._objects.move_to_end(digest)
+            if count:
+                self.hits += 1
+        path = self._object_path(digest)
+        try:
+            # 记录访问时间，重启后据此恢复LRU顺序
+            os.utime(path)
+        except OSError:
+            return None
+        return path, mimetype, digest
+
+    def _load(self, url, width):
+        """下载原图（必要时生成缩略图）并写入缓存"""
+        if width is None:
+            data, mimetype = self.fetch(url)
+            if len(data) > self.max_image_bytes:
+                raise ValueError(f"图片超过 {self.max_image_bytes} 字节: {url}")
+            mimetype = (mimetype or 'application/octet-stream').split(';', 1)[0].strip()
+            if not mimetype.startswith('image/'):
+                raise ValueError(f"不是图片: {url} ({mimetype})")
+        else:
+            path, mimetype, _ = self.get(url)
+            with open(path, 'rb') as f:
+                data, mimetype = _make_thumbnail(f.read(), mimetype, width)
+        return self._store(url, width, data, mimetype)
+
+    def _store(self, url, width, data, mimetype):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        with self._lock:
+            known = digest in self._objects
+        if not known:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        ref_path = self._ref_path(url, width)
+        tmp_path = f"{ref_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{digest}\n{mimetype}")
+        os.replace(tmp_path, ref_path)
+
+        with self._lock:
+            if digest not in self._objects:
+                self._objects[digest] = len(data)
+                self._total += len(data)
+            self._objects.move_to_end(digest)
+            self._refs.setdefault(digest, set()).add(os.path.basename(ref_path))
+            self._evict()
+        return path, mimetype, digest
+
+    def _evict(self):
+        """淘汰最久未访问的内容文件及指向它的引用文件，直到不超过上限（调用时已持有锁）
+
+        引用文件可能已改为指向其他内容（上游图片有变化），这样的引用文件保留。
+        """
+        while self._total > self.max_bytes and len(self._objects) > 1:
+            digest, size = self._objects.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._object_path(digest))
+            except OSError as e:
+                logging.error(f"删除缓存图片失败: {str(e)}")
+            for name in self._refs.pop(digest, ()):
+                path = os.path.join(self.directory, 'refs', name)
+                if _read_ref(path)[0] != digest:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.error(f"删除图片引用失败: {str(e)}")
+
+    def stats(self):
+        """返回缓存大小与命中统计"""
+        with self._lock:
+            return {
+                'files': len(self._objects),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'thumbnails': Image is not None,
+            }
+
+
+def _read_ref(path):
+    """读取引用文件，返回 (内容摘要, Content-Type)，文件不存在或无效时返回 (None, None)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            digest, mimetype = f.read().split('\n', 1)
+    except (OSError, ValueError):
+        return None, None
+    return digest, mimetype
+
+
+def _make_thumbnail(data, mimetype, width):
+    """把图片缩小到指定宽度，返回 (图片字节, Content-Type)
+
+    比目标宽度小的图片、动图和无法识别的格式原样返回。
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        fmt = image.format
+        if fmt not in _THUMBNAIL_FORMATS or getattr(image, 'n_frames', 1) > 1 or image.width <= width:
+            return data, mimetype
+        image.thumbnail((width, width * 4))
+        output = io.BytesIO()
+        if fmt == 'JPEG':
+            image.save(output, 'JPEG', quality=80, optimize=True, progressive=True)
+        else:
+            image.save(output, fmt)
+        return output.getvalue(), _THUMBNAIL_FORMATS[fmt]
+    except Exception as e:
+        logging.error(f"生成缩略图失败: {str(e)}")
+        return data, mimetype
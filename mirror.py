@@ -0,0 +1,223 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import models
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    category_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    post_id INTEGER PRIMARY KEY,
+    cat_id INTEGER NOT NULL,
+    user_id INTEGER,
+    create_time INTEGER NOT NULL DEFAULT 0,
+    active_time INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_cat_active ON posts (cat_id, active_time DESC);
+CREATE TABLE IF NOT EXISTS post_pages (
+    post_id INTEGER NOT NULL,
+    page_no INTEGER NOT NULL,
+    page_size INTEGER NOT NULL,
+    active_time INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (post_id, page_no, page_size)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL,
+    user_id INTEGER,
+    create_time INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comments_post ON comments (post_id, create_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    cat_id INTEGER PRIMARY KEY,
+    watermark INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def _dumps(data):
+    return models.dumps(data)
+
+
+class Mirror:
+    """基于SQLite的本地镜像
+
+    保存板块、帖子、用户和评论，所有写入均为批量 upsert。
+    每个线程使用独立的连接，数据库开启WAL模式以便并发读写。
+    """
+
+    def __init__(self, path, max_age=600):
+        """
+        参数:
+            path (str): 数据库文件路径
+            max_age (float): 镜像数据的最长使用时间（秒），超过后视为过期，默认为600
+        """
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        logging.info(f"本地镜像已打开: {path}")
+
+    def _connect(self):
+        """返回当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _is_fresh(self, timestamp):
+        return timestamp is not None and time.time() - timestamp < self.max_age
+
+    # ---- 写入 ----
+
+    def upsert_categories(self, categories):
+        """批量保存板块列表"""
+        now = time.time()
+        rows = [(category['板块ID'], _dumps(category), now) for category in categories]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO categories (category_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(category_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+                rows)
+
+    def upsert_posts(self, cat_id, posts):
+        """批量保存帖子列表中的帖子及其作者"""
+        now = time.time()
+        rows = [(post['帖子ID'], cat_id, post['用户']['用户ID'], post['创建时间'], post['活跃时间'],
+                 _dumps(post), now) for post in posts]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO posts (post_id, cat_id, user_id, create_time, active_time, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(post_id) DO UPDATE SET cat_id=excluded.cat_id, user_id=excluded.user_id, "
+                "create_time=excluded.create_time, active_time=excluded.active_time, "
+                "data=excluded.data, updated_at=excluded.updated_at",
+                rows)
+            self._upsert_users(conn, [post['用户'] for post in posts], now)
+
+    def upsert_post_detail(self, detail):
+        """保存一页帖子详情，以及其中的作者和评论"""
+        now = time.time()
+        post_id = detail['帖子ID']
+        comments = detail['评论列表']
+        with self._connect() as conn:
+            # 详情中的活跃时间取自 updateTime，与列表中的 activeTime 不同；
+            # 记录获取时已知的列表活跃时间，之后列表中出现更新的时间即视为过期
+            conn.execute(
+                "INSERT OR REPLACE INTO post_pages (post_id, page_no, page_size, active_time, data, fetched_at) "
+                "VALUES (?, ?, ?, MAX(?, IFNULL((SELECT active_time FROM posts WHERE post_id = ?), 0)), ?, ?)",
+                (post_id, detail['当前页码'], detail['每页数量'], detail['活跃时间'], post_id, _dumps(detail), now))
+            conn.executemany(
+                "INSERT OR REPLACE INTO comments (comment_id, post_id, user_id, create_time, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(comment['commentID'], post_id, (comment.get('user') or {}).get('userID'),
+                  comment.get('createTime', 0), _dumps(comment))
+                 for comment in comments if comment.get('commentID') is not None])
+            self._upsert_users(conn, [detail['用户']], now)
+
+    def _upsert_users(self, conn, users, now):
+        rows = [(user['用户ID'], _dumps(user), now) for user in users if user.get('用户ID')]
+        conn.executemany(
+            "INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+            rows)
+
+    def set_watermark(self, cat_id, watermark):
+        """记录板块同步到的最新活跃时间"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (cat_id, watermark, synced_at) VALUES (?, ?, ?)",
+                (cat_id, watermark, time.time()))
+
+    # ---- 读取 ----
+
+    def get_categories(self):
+        """返回未过期的板块列表，没有或已过期时返回None"""
+        rows = self._connect().execute(
+            "SELECT data, updated_at FROM categories ORDER BY rowid").fetchall()
+        if not rows or not self._is_fresh(min(row[1] for row in rows)):
+            return None
+        return [json.loads(row[0]) for row in rows]
+
+    def get_posts(self, cat_id, count=20):
+        """按活跃时间返回板块最新的帖子列表
+
+        只有该板块最近同步过（未过期）时才返回，否则返回None。
+        """
+        state = self._connect().execute(
+            "SELECT synced_at FROM sync_state WHERE cat_id = ?", (cat_id,)).fetchone()
+        if state is None or not self._is_fresh(state[0]):
+            return None
+        rows = self._connect().execute(
+            "SELECT data FROM posts WHERE cat_id = ? ORDER BY active_time DESC LIMIT ?",
+            (cat_id, count + 1)).fetchall()
+        posts = [json.loads(row[0]) for row in rows[:count]]
+        return {
+            '帖子列表': posts,
+            '是否有更多': 1 if len(rows) > count else 0,
+            '板块ID': cat_id,
+            '子版块ID': 0,
+            '下一页游标': len(posts),
+        }
+
+    def get_post_detail(self, post_id, page_no=1, page_size=20):
+        """返回镜像中的帖子详情页
+
+        帖子列表中出现了更新的活跃时间，或者超过 max_age 时视为过期，返回None。
+        """
+        row = self._connect().execute(
+            "SELECT p.data, p.active_time, p.fetched_at, posts.active_time FROM post_pages p "
+            "LEFT JOIN posts ON posts.post_id = p.post_id "
+            "WHERE p.post_id = ? AND p.page_no = ? AND p.page_size = ?",
+            (post_id, page_no, page_size)).fetchone()
+        if row is None or not self._is_fresh(row[2]):
+            return None
+        if row[3] is not None and row[3] > row[1]:
+            return None
+        return json.loads(row[0])
+
+    def get_watermark(self, cat_id):
+        """返回板块上次同步到的活跃时间，从未同步过返回0"""
+        row = self._connect().execute(
+            "SELECT watermark FROM sync_state WHERE cat_id = ?", (cat_id,)).fetchone()
+        return row[0] if row else 0
+
+    def changed_posts(self, post_ids):
+        """返回需要重新获取详情的帖子ID（没有详情或列表中的活跃时间更新）"""
+        if not post_ids:
+            return []
+        placeholders = ','.join('?' * len(post_ids))
+        rows = self._connect().execute(
+            f"SELECT posts.post_id FROM posts LEFT JOIN post_pages p "
+            f"ON p.post_id = posts.post_id AND p.page_no = 1 "
+            f"WHERE posts.post_id IN ({placeholders}) "
+            f"GROUP BY posts.post_id HAVING MAX(IFNULL(p.active_time, -1)) < posts.active_time",
+            list(post_ids)).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        """返回各表的记录数"""
+        conn = self._connect()
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('categories', 'posts', 'post_pages', 'users', 'comments')}
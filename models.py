@@ -0,0 +1,228 @@
+"""板块、帖子和用户的数据模型
+
+上游JSON只在 from_upstream 中转换一次，得到使用 __slots__ 的紧凑对象。
+模型实现只读的 Mapping 接口，仍可按原来的中文键访问（post['标题']、
+post.get('用户')、dict(post)），模板、镜像和索引无需修改。
+
+槽位直接以中文键命名，并按键排序声明为数据类字段：orjson 把模型当作数据类
+直接编码，不回调 Python 代码，也不构建中间字典；输出与原先 jsonify 的 sort_keys 结果一致，
+中文直接输出，不转义为 \\uXXXX。未安装 orjson 时由标准库 json 经 to_dict 编码。
+
+只需要部分字段时用 project 转换，未选中的字段不会进入输出的字典，也不会被编码。
+"""
+import dataclasses
+import json
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json 编码
+    orjson = None
+
+
+class Model(Mapping):
+    """只读模型基类
+
+    子类通过 FIELDS 声明中文键（即属性名），并设置 __slots__ = FIELDS。
+    定义子类时按键排序生成数据类字段，数据类字段的顺序就是编码时的键顺序。
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = tuple(cls.FIELDS)
+        cls._key_set = frozenset(cls.FIELDS)
+        # 序列化时的字段顺序，定义类时排序一次
+        cls._sorted_keys = tuple(sorted(cls.FIELDS))
+        cls.__annotations__ = {key: object for key in cls._sorted_keys}
+        # 只生成字段信息，不生成 __init__/__eq__/__repr__，保留 Mapping 的行为
+        dataclasses.dataclass(init=False, repr=False, eq=False)(cls)
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def to_dict(self):
+        """转换为按键排序的普通字典（嵌套模型不展开）"""
+        return {key: getattr(self, key) for key in self._sorted_keys}
+
+
+def parse_fields(cls, text):
+    """解析逗号分隔的字段列表（中文键）
+    
+    参数:
+        cls (type): 模型类
+        text (str): 如 '帖子ID,标题'，为空时表示全部字段
+    
+    返回:
+        tuple: 排序后的字段元组，全部字段时为None
+    
+    异常:
+        ValueError: 包含模型没有的字段
+    """
+    keys = {key.strip() for key in (text or '').split(',') if key.strip()}
+    if not keys:
+        return None
+    unknown = keys - set(cls._keys)
+    if unknown:
+        raise ValueError(f"不支持的字段: {'、'.join(sorted(unknown))}，可选字段: {'、'.join(cls._keys)}")
+    return tuple(sorted(keys))
+
+
+def project(obj, keys):
+    """只取模型的部分字段，返回普通字典（嵌套模型不展开）
+    
+    参数:
+        obj (Model): 模型，也可以是同样键名的字典（如本地镜像中读出的数据）
+        keys (tuple): parse_fields 的返回值，为None时原样返回
+    """
+    if keys is None:
+        return obj
+    if isinstance(obj, Model):
+        return {key: getattr(obj, key) for key in keys}
+    return {key: obj[key] for key in keys if key in obj}
+
+
+class User(Model):
+    """用户"""
+
+    FIELDS = ('用户ID', '昵称', '头像', '性别', '等级')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_upstream(cls, user):
+        self = cls.__new__(cls)
+        get = user.get
+        self.用户ID = get('userID', 0)
+        self.昵称 = get('nick', '')
+        self.头像 = get('avatar', '')
+        self.性别 = get('gender', 0)
+        self.等级 = get('level', 0)
+        return self
+
+
+class Category(Model):
+    """板块，子版块为 [{'ID', '名称'}]"""
+
+    FIELDS = ('板块ID', '板块名称', '板块描述', '帖子数量', '浏览数量', '板块图标', '模型类型',
+              '是否精品', '是否订阅', '排序序号', '订阅类型', '版主', '子版块')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_upstream(cls, category):
+        self = cls.__new__(cls)
+        get = category.get
+        self.板块ID = get('categoryID', '')
+        self.板块名称 = get('title', '')
+        self.板块描述 = get('description', '')
+        self.帖子数量 = get('postCount', 0)
+        self.浏览数量 = get('viewCount', 0)
+        self.板块图标 = get('icon', '')
+        self.模型类型 = get('model', 0)
+        self.是否精品 = get('isGood', 0)
+        self.是否订阅 = get('isSubscribe', 0)
+        self.排序序号 = get('seq', 0)
+        self.订阅类型 = get('subscribeType', 0)
+        self.版主 = '、'.join(mod.get('nick', '') for mod in get('moderator', []))
+        self.子版块 = [{'ID': tag.get('ID', ''), '名称': tag.get('name', '')} for tag in get('tags', [])]
+        return self
+
+
+class Post(Model):
+    """帖子列表中的帖子"""
+
+    FIELDS = ('帖子ID', '标题', '内容', '图片', '点击数', '评论数', '创建时间', '活跃时间',
+              '是否精华', '子版块ID', '用户')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_upstream(cls, post):
+        self = cls.__new__(cls)
+        get = post.get
+        self.帖子ID = get('postID', '')
+        self.标题 = get('title', '')
+        self.内容 = get('detail', '')
+        self.图片 = get('images', [])
+        self.点击数 = get('hit', 0)
+        self.评论数 = get('commentCount', 0)
+        self.创建时间 = get('createTime', 0)
+        self.活跃时间 = get('activeTime', 0)
+        self.是否精华 = get('isGood', 0)
+        self.子版块ID = get('tagid', 0)
+        self.用户 = User.from_upstream(get('user', {}))
+        return self
+
+
+class PostDetail(Model):
+    """帖子详情（一页评论）
+
+    详情接口的帖子数据中没有所属子版块（tagid），不输出子版块ID。
+    """
+
+    FIELDS = ('帖子ID', '标题', '内容', '图片', '点击数', '评论数', '创建时间', '活跃时间',
+              '是否精华', '评论列表', '是否有更多评论', '当前页码', '每页数量', '用户')
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_upstream(cls, data, page_no=1, page_size=20):
+        self = cls.__new__(cls)
+        post = data.get('post', {})
+        get = post.get
+        comments = data.get('comments', [])
+        self.帖子ID = get('postID', '')
+        self.标题 = get('title', '')
+        # 保存原始帖子内容，不进行任何预处理
+        self.内容 = get('detail', '') or get('description', '')
+        self.图片 = get('images', [])
+        self.点击数 = get('hit', 0)
+        self.评论数 = get('commentCount', 0)
+        self.创建时间 = get('createTime', 0)
+        self.活跃时间 = get('updateTime', 0) or get('createTime', 0)
+        self.是否精华 = get('isGood', 0)
+        # 评论按上游原样输出（键为上游的英文键），直接引用不复制
+        self.评论列表 = comments
+        self.是否有更多评论 = len(comments) >= page_size
+        self.当前页码 = page_no
+        self.每页数量 = page_size
+        self.用户 = User.from_upstream(get('user', {}))
+        return self
+
+
+def json_default(obj):
+    """json 编码器的 default 钩子，把模型转换为字典"""
+    if isinstance(obj, Model):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+
+def dumpb(obj):
+    """同 dumps，返回UTF-8编码的字节串；用作响应体时省去一次解码和再编码"""
+    if orjson is not None:
+        # 模型作为数据类直接编码，default 只处理其他类型；与标准库一致，允许整数等非字符串的键
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return _encoder.encode(obj).encode('utf-8')
+
+
+def dumps(obj):
+    """把包含模型的数据编码为紧凑的JSON字符串（UTF-8字符不转义）"""
+    if orjson is not None:
+        return dumpb(obj).decode('utf-8')
+    return _encoder.encode(obj)
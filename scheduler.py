@@ -0,0 +1,259 @@
+"""上游请求调度
+
+每个上游接口使用独立的令牌桶限速，等待令牌的请求按优先级排队，
+交互请求（网页/API）总是排在后台采集任务之前。速率按 AIMD 自适应调整：
+请求成功时缓慢提高，上游报错、限流或明显变慢时减半。
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# 优先级，数值越小越先执行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_local = threading.local()
+
+
+def current_priority():
+    """返回当前线程的请求优先级，默认为交互优先级"""
+    return getattr(_local, 'priority', PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """在 with 块内把当前线程发出的上游请求设为指定优先级"""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def run_with_priority(level, func, *args, **kwargs):
+    """以指定优先级调用 func，用于把优先级带到线程池中执行的任务"""
+    with priority(level):
+        return func(*args, **kwargs)
+
+
+class RateLimitTimeout(Exception):
+    """排队等待令牌超时"""
+
+
+class TokenBucket:
+    """令牌桶，速率可随时调整"""
+
+    def __init__(self, rate, burst):
+        """
+        参数:
+            rate (float): 每秒补充的令牌数
+            burst (float): 桶容量，即允许的最大突发请求数
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def take(self, now=None):
+        """尝试取出一个令牌，成功返回0，否则返回还需等待的秒数"""
+        now = time.monotonic() if now is None else now
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def set_rate(self, rate, now=None):
+        """调整速率，已积累的令牌按旧速率结算"""
+        self._refill(time.monotonic() if now is None else now)
+        self.rate = rate
+
+    def pause(self, seconds, now=None):
+        """在 seconds 秒内不发放令牌，并清空已积累的令牌"""
+        now = time.monotonic() if now is None else now
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self._updated = self.paused_until
+
+
+class _Endpoint:
+    """一个上游接口的限速状态"""
+
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.cond = threading.Condition()
+        self.waiters = []           # [(优先级, 序号)] 小顶堆
+        self.last_decrease = 0.0
+        self.latency = None         # 响应时间的指数移动平均（秒）
+        self.granted = 0
+        self.waited = 0.0
+        self.timeouts = 0
+        self.successes = 0
+        self.failures = 0
+        self.slow = 0
+
+
+class CrawlScheduler:
+    """按接口限速、按优先级排队的上游请求调度器
+
+    用法:
+        scheduler.acquire('detail')        # 阻塞直到获得令牌
+        response = transport.get(...)
+        scheduler.report('detail', ok=True, latency=elapsed, status=response.status_code)
+    """
+
+    def __init__(self, rate=5, burst=None, min_rate=0.5, max_rate=20, increase=1.0,
+                 decrease=0.5, slow_threshold=3.0, cooldown=1.0, max_wait=10):
+        """
+        参数:
+            rate (float): 每个接口的初始速率（请求/秒），默认为5
+            burst (float): 令牌桶容量，默认与初始速率相同
+            min_rate (float): 自适应调整的最低速率，默认为0.5
+            max_rate (float): 自适应调整的最高速率，默认为20
+            increase (float): 成功时每秒大约提高的速率，默认为1.0
+            decrease (float): 失败或变慢时速率乘以的系数，默认为0.5
+            slow_threshold (float): 平均响应时间超过该值（秒）视为上游变慢，默认为3.0
+            cooldown (float): 两次降速之间的最短间隔（秒），避免一批失败连续降速，默认为1.0
+            max_wait (float): 交互请求排队等待令牌的最长时间（秒），后台请求不限，默认为10
+        """
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_threshold = slow_threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._seq = itertools.count()
+
+    def _endpoint(self, name):
+        with self._lock:
+            state = self._endpoints.get(name)
+            if state is None:
+                state = self._endpoints[name] = _Endpoint(self.rate, self.burst)
+            return state
+
+    def acquire(self, endpoint, level=None, timeout=None):
+        """等待并取得指定接口的一个令牌，返回排队等待的秒数
+
+        同一接口上等待的请求按优先级（相同优先级按到达顺序）依次获得令牌。
+
+        参数:
+            endpoint (str): 接口名称
+            level (int): 优先级，默认为当前线程的优先级
+            timeout (float): 最长等待时间（秒），默认交互请求为 max_wait，后台请求不限
+
+        异常:
+            RateLimitTimeout: 超时仍未获得令牌
+        """
+        if level is None:
+            level = current_priority()
+        if timeout is None and level < PRIORITY_BACKGROUND:
+            timeout = self.max_wait
+        state = self._endpoint(endpoint)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        entry = (level, next(self._seq))
+
+        with state.cond:
+            heapq.heappush(state.waiters, entry)
+            try:
+                while True:
+                    delay = None
+                    if state.waiters[0] is entry:
+                        delay = state.bucket.take()
+                        if delay == 0:
+                            heapq.heappop(state.waiters)
+                            waited = time.monotonic() - started
+                            state.granted += 1
+                            state.waited += waited
+                            # 下一个等待者可能已经可以获得令牌
+                            state.cond.notify_all()
+                            return waited
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            state.timeouts += 1
+                            raise RateLimitTimeout(f"接口 {endpoint} 排队超过 {timeout} 秒")
+                        delay = remaining if delay is None else min(delay, remaining)
+                    state.cond.wait(delay)
+            finally:
+                if entry in state.waiters:
+                    state.waiters.remove(entry)
+                    heapq.heapify(state.waiters)
+                    state.cond.notify_all()
+
+    def report(self, endpoint, ok, latency=None, status=None, retry_after=None):
+        """报告一次请求的结果，据此调整接口速率
+
+        参数:
+            endpoint (str): 接口名称
+            ok (bool): 请求是否成功
+            latency (float): 响应时间（秒）
+            status (int): HTTP状态码，429 和 5xx 视为上游过载
+            retry_after (float): 上游要求的等待时间（秒），期间暂停发放令牌
+        """
+        state = self._endpoint(endpoint)
+        now = time.monotonic()
+        with state.cond:
+            if latency is not None:
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            overloaded = status is not None and (status == 429 or status >= 500)
+            slow = state.latency is not None and state.latency > self.slow_threshold
+
+            bucket = state.bucket
+            if ok and not overloaded and not slow:
+                state.successes += 1
+                # 约每秒提高 increase（每个成功请求提高 increase / rate）
+                if bucket.rate < self.max_rate:
+                    bucket.set_rate(min(self.max_rate, bucket.rate + self.increase / bucket.rate), now)
+                return
+
+            if ok and not overloaded:
+                state.slow += 1
+            else:
+                state.failures += 1
+            if retry_after:
+                bucket.pause(retry_after, now)
+            if now - state.last_decrease >= self.cooldown:
+                state.last_decrease = now
+                new_rate = max(self.min_rate, bucket.rate * self.decrease)
+                if new_rate < bucket.rate:
+                    bucket.set_rate(new_rate, now)
+                    logging.warning(f"接口 {endpoint} 降速至 {new_rate:.2f} 次/秒"
+                                    f"（状态码: {status}，平均响应: {state.latency or 0:.2f} 秒）")
+
+    def stats(self):
+        """返回每个接口的当前速率、排队和成功/失败统计"""
+        with self._lock:
+            endpoints = list(self._endpoints.items())
+        result = {}
+        for name, state in endpoints:
+            with state.cond:
+                result[name] = {
+                    'rate': round(state.bucket.rate, 3),
+                    'queued': len(state.waiters),
+                    'granted': state.granted,
+                    'avg_wait': round(state.waited / state.granted, 4) if state.granted else 0,
+                    'timeouts': state.timeouts,
+                    'successes': state.successes,
+                    'failures': state.failures,
+                    'slow': state.slow,
+                    'avg_latency': None if state.latency is None else round(state.latency, 4),
+                }
+        return result
@@ -0,0 +1,368 @@
+"""帖子全文索引
+
+对帖子标题、内容和评论建立倒排索引。中文按相邻两字（bigram）切分，
+英文和数字按整词切分，查询使用BM25打分并按帖子汇总。
+索引随帖子获取增量更新，可保存为压缩的二进制文件。
+"""
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import unicodedata
+import zlib
+from array import array
+from itertools import accumulate, chain
+from operator import sub
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+')
+# 帖子内容中的图片标签、链接和其他标签
+_MARKUP_RE = re.compile(r'<image>[^<]*</image>|@?https?://\S+|</?\w+>')
+
+# 文档类型及其权重
+KIND_TITLE = 0
+KIND_CONTENT = 1
+KIND_COMMENT = 2
+KIND_WEIGHTS = (3.0, 1.0, 0.5)
+
+_MAGIC = b'HLXIDX1\n'
+
+# BM25 参数
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text):
+    """把文本切分为词项：中文取相邻两字，单个汉字保留本身，英文数字取整词"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class SearchIndex:
+    """帖子倒排索引
+
+    每个帖子的标题、内容分别作为一个文档，每条评论也是一个文档，
+    查询时按帖子汇总各文档的得分。帖子内容变化时旧文档标记删除，
+    保存时压缩掉已删除的文档。
+    """
+
+    def __init__(self, path=None):
+        """
+        参数:
+            path (str): 索引文件路径，存在时自动加载，默认为None（仅内存）
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        # 每次修改加一，保存时据此判断快照之后索引是否有变化
+        self._version = 0
+        self._reset()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _reset(self):
+        self._postings = {}           # 词项 -> (文档ID数组, 词频数组)
+        self._doc_post = array('q')   # 文档ID -> 帖子ID
+        self._doc_kind = array('B')   # 文档ID -> 文档类型
+        self._doc_len = array('I')    # 文档ID -> 词项数
+        self._deleted = set()
+        self._post_docs = {}          # 帖子ID -> (内容哈希, [标题/内容文档ID], 是否为详情中的完整内容)
+        self._comments = set()        # 已索引的评论ID
+        self._titles = {}             # 帖子ID -> 标题
+        self._total_len = 0
+        self._version += 1
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _add_doc(self, post_id, kind, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        doc_id = len(self._doc_post)
+        self._doc_post.append(post_id)
+        self._doc_kind.append(kind)
+        self._doc_len.append(len(tokens))
+        self._total_len += len(tokens)
+
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = (array('I'), array('H'))
+            posting[0].append(doc_id)
+            posting[1].append(min(tf, 0xFFFF))
+        return doc_id
+
+    def add_post(self, post, full=False):
+        """索引帖子的标题和内容，内容未变化时跳过
+
+        参数:
+            post (dict): 帖子（Post、PostDetail 或同样键名的字典）
+            full (bool): 内容是否为帖子详情中的完整内容，默认为False（帖子列表中的摘要）
+        """
+        post_id = int(post['帖子ID'])
+        title = post.get('标题') or ''
+        content = _MARKUP_RE.sub(' ', post.get('内容') or '')
+        digest = hashlib.blake2b(f"{title}\0{content}".encode('utf-8'), digest_size=8).digest()
+
+        with self._lock:
+            existing = self._post_docs.get(post_id)
+            if existing is not None:
+                # 列表中的内容只是摘要，标题未变时不覆盖已索引的完整内容
+                if existing[0] == digest or (existing[2] and not full and title == self._titles.get(post_id)):
+                    return
+                for doc_id in existing[1]:
+                    self._deleted.add(doc_id)
+                    self._total_len -= self._doc_len[doc_id]
+            doc_ids = [doc_id for doc_id in (self._add_doc(post_id, KIND_TITLE, title),
+                                             self._add_doc(post_id, KIND_CONTENT, content))
+                       if doc_id is not None]
+            self._post_docs[post_id] = (digest, doc_ids, full)
+            self._titles[post_id] = title
+            self._version += 1
+            self.dirty = True
+
+    def add_posts(self, posts):
+        """批量索引帖子"""
+        for post in posts:
+            self.add_post(post)
+
+    def add_comments(self, post_id, comments):
+        """索引帖子的评论，已索引过的评论跳过"""
+        post_id = int(post_id)
+        with self._lock:
+            for comment in comments:
+                comment_id = comment.get('commentID')
+                if comment_id is None or comment_id in self._comments:
+                    continue
+                self._comments.add(comment_id)
+                if self._add_doc(post_id, KIND_COMMENT, comment.get('text')) is not None:
+                    self._version += 1
+                    self.dirty = True
+
+    def add_post_detail(self, detail):
+        """索引帖子详情（标题、完整内容和本页评论）"""
+        self.add_post(detail, full=True)
+        self.add_comments(detail['帖子ID'], detail.get('评论列表') or [])
+
+    def search(self, query, limit=20):
+        """按相关度返回帖子
+
+        参数:
+            query (str): 查询文本
+            limit (int): 最多返回的帖子数量，默认为20
+
+        返回:
+            [{'帖子ID', '标题', '得分'}]，按得分从高到低排列
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_post) - len(self._deleted)
+            if doc_count <= 0:
+                return []
+            avg_len = self._total_len / doc_count
+            doc_post = self._doc_post
+            doc_kind = self._doc_kind
+            doc_len = self._doc_len
+            deleted = self._deleted
+
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                doc_ids, tfs = posting
+                idf = math.log(1 + (doc_count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+                for doc_id, tf in zip(doc_ids, tfs):
+                    if doc_id in deleted:
+                        continue
+                    norm = tf + _K1 * (1 - _B + _B * doc_len[doc_id] / avg_len)
+                    score = KIND_WEIGHTS[doc_kind[doc_id]] * idf * tf * (_K1 + 1) / norm
+                    post_id = doc_post[doc_id]
+                    scores[post_id] = scores.get(post_id, 0.0) + score
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{'帖子ID': post_id, '标题': self._titles.get(post_id, ''), '得分': round(score, 4)}
+                    for post_id, score in top]
+
+    def stats(self):
+        """返回索引规模"""
+        with self._lock:
+            return {
+                'posts': len(self._titles),
+                'documents': len(self._doc_post) - len(self._deleted),
+                'deleted_documents': len(self._deleted),
+                'terms': len(self._postings),
+                'comments': len(self._comments),
+            }
+
+    # ---- 持久化 ----
+
+    def save(self, path=None):
+        """压缩掉已删除的文档后保存为二进制文件
+
+        文件格式：魔数 + zlib压缩的 [头部JSON长度][头部JSON][文档数组][词项表]，
+        词项表中文档ID按差值存储。
+
+        持有锁期间只复制一份快照，去掉已删除文档、编码、压缩和写文件都在锁外进行，
+        保存期间索引和搜索不会被阻塞。保存期间索引没有变化时，把去掉已删除文档后的
+        数据换入内存；有变化时保留当前数据，仍标记为有变化，下次保存时再压缩。
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("未指定索引文件路径")
+
+        with self._lock:
+            snapshot = self._snapshot()
+            version = self._version
+
+        compacted = bool(snapshot['deleted'])
+        if compacted:
+            snapshot = _compact(snapshot)
+        doc_post, postings = snapshot['doc_post'], snapshot['postings']
+        header = json.dumps({
+            'titles': {str(k): v for k, v in snapshot['titles'].items()},
+            'post_docs': {str(k): [v[0].hex(), v[1], v[2]] for k, v in snapshot['post_docs'].items()},
+            'comments': sorted(snapshot['comments']),
+            'docs': len(doc_post),
+            'terms': len(postings),
+        }, ensure_ascii=False).encode('utf-8')
+
+        chunks = [struct.pack('<I', len(header)), header,
+                  doc_post.tobytes(), snapshot['doc_kind'].tobytes(), snapshot['doc_len'].tobytes()]
+        for term, doc_ids, tfs, count in postings:
+            doc_ids, tfs = doc_ids[:count], tfs[:count]
+            term_bytes = term.encode('utf-8')
+            deltas = array('I', map(sub, doc_ids, chain((0,), doc_ids)))
+            chunks.append(struct.pack('<HI', len(term_bytes), len(doc_ids)))
+            chunks.append(term_bytes)
+            chunks.append(deltas.tobytes())
+            chunks.append(tfs.tobytes())
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(zlib.compress(b''.join(chunks), 6))
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._version == version:
+                if compacted:
+                    self._doc_post, self._doc_kind, self._doc_len = doc_post, snapshot['doc_kind'], snapshot['doc_len']
+                    self._postings = {term: (doc_ids, tfs) for term, doc_ids, tfs, _ in postings}
+                    self._post_docs = snapshot['post_docs']
+                    self._deleted = set()
+                    self._total_len = sum(self._doc_len)
+                self.dirty = False
+        logging.info(f"搜索索引已保存: {path}，{len(snapshot['titles'])} 个帖子，{len(postings)} 个词项")
+
+    def _snapshot(self):
+        """复制保存所需的数据（调用时已持有锁）
+
+        文档数组和字典复制一份；词项的数组只会追加（去掉已删除文档时整体替换），
+        记录 (词项, 文档ID数组, 词频数组, 当前长度)，在锁外截取即可。
+        """
+        return {
+            'doc_post': array('q', self._doc_post),
+            'doc_kind': array('B', self._doc_kind),
+            'doc_len': array('I', self._doc_len),
+            'postings': [(term, doc_ids, tfs, len(doc_ids)) for term, (doc_ids, tfs) in self._postings.items()],
+            'post_docs': dict(self._post_docs),
+            'titles': dict(self._titles),
+            'comments': set(self._comments),
+            'deleted': set(self._deleted),
+        }
+
+    def load(self, path):
+        """从 save 生成的文件加载索引"""
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"不是有效的索引文件: {path}")
+            data = zlib.decompress(f.read())
+
+        header_len = struct.unpack_from('<I', data)[0]
+        offset = 4
+        header = json.loads(data[offset:offset + header_len].decode('utf-8'))
+        offset += header_len
+
+        def read_array(typecode, count):
+            nonlocal offset
+            arr = array(typecode)
+            size = arr.itemsize * count
+            arr.frombytes(data[offset:offset + size])
+            offset += size
+            return arr
+
+        with self._lock:
+            self._reset()
+            docs = header['docs']
+            self._doc_post = read_array('q', docs)
+            self._doc_kind = read_array('B', docs)
+            self._doc_len = read_array('I', docs)
+            for _ in range(header['terms']):
+                term_len, count = struct.unpack_from('<HI', data, offset)
+                offset += 6
+                term = data[offset:offset + term_len].decode('utf-8')
+                offset += term_len
+                doc_ids = array('I', accumulate(read_array('I', count)))
+                self._postings[term] = (doc_ids, read_array('H', count))
+
+            self._titles = {int(k): v for k, v in header['titles'].items()}
+            # 旧版本的索引文件记录的是内容长度，无法区分来源，按摘要处理
+            self._post_docs = {int(k): (bytes.fromhex(v[0]), v[1], v[2] is True)
+                               for k, v in header['post_docs'].items()}
+            self._comments = set(header['comments'])
+            self._total_len = sum(self._doc_len)
+        logging.info(f"搜索索引已加载: {path}，{len(self._titles)} 个帖子")
+
+
+def _compact(snapshot):
+    """重新编号快照中的文档，去掉已删除的文档，返回新的快照"""
+    deleted = snapshot['deleted']
+    remap = {}
+    doc_post = array('q')
+    doc_kind = array('B')
+    doc_len = array('I')
+    for doc_id in range(len(snapshot['doc_post'])):
+        if doc_id in deleted:
+            continue
+        remap[doc_id] = len(doc_post)
+        doc_post.append(snapshot['doc_post'][doc_id])
+        doc_kind.append(snapshot['doc_kind'][doc_id])
+        doc_len.append(snapshot['doc_len'][doc_id])
+
+    postings = []
+    for term, doc_ids, tfs, count in snapshot['postings']:
+        new_ids = array('I')
+        new_tfs = array('H')
+        for doc_id, tf in zip(doc_ids[:count], tfs[:count]):
+            if doc_id in remap:
+                new_ids.append(remap[doc_id])
+                new_tfs.append(tf)
+        if new_ids:
+            postings.append((term, new_ids, new_tfs, len(new_ids)))
+
+    return dict(snapshot, doc_post=doc_post, doc_kind=doc_kind, doc_len=doc_len, postings=postings, deleted=set(),
+                post_docs={post_id: (digest, [remap[d] for d in doc_ids if d in remap], full)
+                           for post_id, (digest, doc_ids, full) in snapshot['post_docs'].items()})
@@ -0,0 +1,52 @@
+"""HuluxiaCrawler 向调度器和熔断器反馈请求结果的测试
+
+运行: python -m pytest tests
+"""
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_crawler import HuluxiaCrawler  # noqa: E402
+from circuit_breaker import CircuitBreaker  # noqa: E402
+from scheduler import CrawlScheduler  # noqa: E402
+
+
+class FakeTransport:
+    """每次请求都返回指定状态码的响应"""
+
+    def __init__(self, status):
+        self.status = status
+
+    def get(self, url, headers=None, params=None):
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = b'{}'
+        return response
+
+
+def make_crawler(status):
+    scheduler = CrawlScheduler(rate=20, max_rate=20, cooldown=0)
+    crawler = HuluxiaCrawler(transport=FakeTransport(status), base_url='http://upstream.test',
+                             scheduler=scheduler, breaker=CircuitBreaker(), max_retries=0)
+    return crawler, scheduler
+
+
+def test_not_found_keeps_rate():
+    crawler, scheduler = make_crawler(404)
+    for _ in range(6):
+        assert crawler._request('detail', 'http://upstream.test/post/detail', {}).status_code == 404
+    stats = scheduler.stats()['detail']
+    assert stats['rate'] == 20
+    assert stats['failures'] == 0
+    assert crawler.breaker.stats()['detail']['recent_failures'] == 0
+
+
+def test_server_error_lowers_rate():
+    crawler, scheduler = make_crawler(503)
+    crawler._request('detail', 'http://upstream.test/post/detail', {})
+    stats = scheduler.stats()['detail']
+    assert stats['rate'] < 20
+    assert stats['failures'] == 1
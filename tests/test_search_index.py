@@ -0,0 +1,43 @@
+"""SearchIndex 增量更新的测试
+
+运行: python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+
+
+def post(content, title='攻略'):
+    return {'帖子ID': 1, '标题': title, '内容': content}
+
+
+def found(index, query):
+    return [result['帖子ID'] for result in index.search(query)]
+
+
+def test_summary_does_not_replace_detail():
+    index = SearchIndex()
+    index.add_post_detail(post('完整内容提到了隐藏关卡'))
+    index.add_posts([post('完整内容')])
+    assert found(index, '隐藏关卡') == [1]
+
+
+def test_shorter_edit_replaces_content():
+    index = SearchIndex()
+    index.add_post_detail(post('原来的内容提到了隐藏关卡'))
+    index.add_post_detail(post('删减后的内容'))
+    assert found(index, '隐藏关卡') == []
+    assert found(index, '删减') == [1]
+
+
+def test_saved_index_keeps_content_source(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    index = SearchIndex(path)
+    index.add_post_detail(post('完整内容提到了隐藏关卡'))
+    index.save()
+    loaded = SearchIndex(path)
+    loaded.add_posts([post('完整内容')])
+    assert found(loaded, '隐藏关卡') == [1]
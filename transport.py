@@ -0,0 +1,102 @@
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 表示上游过载或暂时故障、值得重试的状态码
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpTransport:
+    """共享的HTTP传输层
+
+    所有上游请求复用同一个 requests.Session 与连接池（keep-alive），
+    对幂等的GET请求按指数退避自动重试，并区分连接超时与读取超时。
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, max_retries=2,
+                 backoff_factor=0.3, connect_timeout=3.05, read_timeout=10, retry_statuses=RETRY_STATUSES):
+        """
+        参数:
+            pool_connections (int): 缓存的连接池数量（每个主机一个池），默认为4
+            pool_maxsize (int): 每个连接池保持的最大连接数，默认为16
+            max_retries (int): GET请求的最大重试次数，默认为2
+            backoff_factor (float): 重试退避系数，第n次重试前等待 backoff_factor * 2^(n-1) 秒
+            connect_timeout (float): 建立连接的超时时间（秒），默认为3.05
+            read_timeout (float): 读取响应的超时时间（秒），默认为10
+            retry_statuses (tuple): 自动重试的响应状态码，默认为 RETRY_STATUSES。
+                由调度器限速时应传入空元组，改由采集器经调度器重试，
+                否则重试的请求不经过限速，也不计入速率调整
+        """
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_statuses,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        """发送GET请求，返回 requests.Response
+
+        参数:
+            url (str): 请求地址
+            headers (dict): 请求头
+            params (dict): 查询参数
+            timeout (float|tuple): 覆盖默认的 (连接超时, 读取超时)
+        """
+        with self._lock:
+            self.requests += 1
+        try:
+            return self.session.get(url, headers=headers, params=params,
+                                    timeout=timeout or self.timeout)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+
+    def stats(self):
+        """返回连接池统计信息"""
+        pools = []
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_created': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': idle,
+                'maxsize': self.pool_maxsize,
+            })
+
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'connect_timeout': self.timeout[0],
+                'read_timeout': self.timeout[1],
+                'pools': pools,
+            }
+
+    def close(self):
+        """关闭会话并释放所有连接"""
+        self.session.close()
+        logging.info("HTTP连接池已关闭")
@@ -0,0 +1,117 @@
+"""葫芦侠上游接口定义
+
+同步与异步采集器共用的接口地址、请求参数和响应解析函数，
+保证两者输出相同结构的中文键数据（见 models.py）。
+"""
+from models import Category, Post, PostDetail, User
+
+BASE_URL = "http://floor.huluxia.com"
+
+# 接口路径
+CATEGORY_LIST_PATH = "/category/list/ANDROID/2.0"
+POST_LIST_PATH = "/post/list/ANDROID/4.1.8"
+POST_DETAIL_PATH = "/post/detail/ANDROID/2.3"
+
+# 帖子列表排序方式：按活跃时间（最新回复）倒序
+SORT_BY_ACTIVE = 0
+
+# 板块列表请求头
+HEADERS = {
+    'Host': 'floor.huluxia.com',
+    'Accept': 'application/json, text/json, text/x-json, text/javascript, application/xml, text/xml',
+    'User-Agent': 'PHP cURL Request',
+    'Connection': 'Keep-Alive',
+    'Accept-Encoding': 'gzip, deflate'
+}
+# 帖子列表请求头
+POST_HEADERS = {
+    'Connection': 'Keep-Alive',
+    'Host': 'floor.huluxia.com',
+    'Accept-Encoding': 'gzip',
+    'User-Agent': 'okhttp/3.8.1',
+    'Content-Type': 'application/json; charset=utf-8'
+}
+# 帖子详情请求头
+DETAIL_HEADERS = {
+    'Connection': 'Keep-Alive',
+    'Host': 'floor.huluxia.com',
+    'Accept-Encoding': 'gzip',
+    'User-Agent': 'okhttp/3.8.1',
+    'Content-Type': 'application/json; charset=utf-8'
+}
+# 图片请求头：图片在其他域名（CDN）上，不能带接口域名的 Host
+IMAGE_HEADERS = {
+    'Connection': 'Keep-Alive',
+    'Accept': 'image/*',
+    'User-Agent': 'okhttp/3.8.1',
+}
+
+
+def post_list_params(cat_id, tag_id=0, count=20, sort_by=0, start=0):
+    """构建帖子列表接口的查询参数
+
+    start 为分页游标，取上一页返回的“下一页游标”，0表示第一页。
+    """
+    return {
+        'platform': 2,
+        'gkey': '000000',
+        'app_version': '4.3.0.3',
+        'versioncode': 20141494,
+        'market_id': 'floor_web',
+        'count': count,
+        'cat_id': cat_id,
+        'tag_id': tag_id,
+        'sort_by': sort_by,
+        'start': start
+    }
+
+
+def post_detail_params(post_id, page_no=1, page_size=20):
+    """构建帖子详情接口的查询参数"""
+    return {
+        'platform': 2,
+        'gkey': '000000',
+        'app_version': '4.0.1.7',
+        'versioncode': 300,
+        'market_id': 'tool_web',
+        '_key': '',
+        'device_code': '[d]c24a6dbd-5823-4c08-a559-19569c07c6fa',
+        'post_id': post_id,
+        'page_no': page_no,
+        'page_size': page_size,
+        'doc': 1
+    }
+
+
+def parse_user(user):
+    """整理用户信息"""
+    return User.from_upstream(user)
+
+
+def parse_categories(data):
+    """将板块列表接口的响应整理为板块列表"""
+    return [Category.from_upstream(category) for category in data.get('categories', [])]
+
+
+def parse_posts(data, cat_id, tag_id=0, start=0):
+    """将帖子列表接口的响应整理为帖子列表数据"""
+    posts_data = [Post.from_upstream(post) for post in data.get('posts', [])]
+
+    return {
+        '帖子列表': posts_data,
+        '是否有更多': data.get('more', 0),  # 是否有更多帖子
+        '板块ID': cat_id,
+        '子版块ID': tag_id,
+        # 上游会返回下一页的起始位置，缺失时按已获取的数量推算
+        '下一页游标': data.get('start', start + len(posts_data)),
+    }
+
+
+def empty_posts(cat_id, tag_id=0, start=0):
+    """获取失败时返回的空帖子列表数据"""
+    return {'帖子列表': [], '是否有更多': 0, '板块ID': cat_id, '子版块ID': tag_id, '下一页游标': start}
+
+
+def parse_post_detail(data, page_no=1, page_size=20):
+    """将帖子详情接口的响应整理为帖子详情数据"""
+    return PostDetail.from_upstream(data, page_no, page_size)
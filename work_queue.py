@@ -0,0 +1,288 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (state, priority, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (lease_owner);
+"""
+
+# 任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """一个已租出的任务"""
+
+    __slots__ = ('job_id', 'kind', 'key', 'payload', 'version', 'attempts')
+
+    def __init__(self, job_id, kind, key, payload, version, attempts):
+        self.job_id = job_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.version = version
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Job({self.job_id}, {self.kind}, {self.key})"
+
+
+class WorkQueue:
+    """基于SQLite的采集任务队列
+
+    多个进程共用同一个数据库文件，按租约领取任务：
+    - 领取后在 lease_seconds 内有效，处理期间需定期 heartbeat 续约；
+      进程退出或卡死导致租约过期后，任务会被其他进程重新领取
+    - 失败的任务按指数退避重试，超过 max_attempts 次后标记为失败
+    - 同一 (kind, key) 只有一条任务。等待中或处理中的任务不会重复加入；
+      已完成的任务只有在新加入的 version 更大时（如帖子活跃时间变化）才重新执行
+
+    每个线程使用独立的连接，数据库开启WAL模式。WAL依赖共享内存，
+    所有进程需要运行在同一台机器上，不能放在网络文件系统中。
+    """
+
+    def __init__(self, path, max_attempts=5, retry_delay=5, max_retry_delay=300):
+        """
+        参数:
+            path (str): 数据库文件路径
+            max_attempts (int): 每个任务最多执行的次数，默认为5
+            retry_delay (float): 第一次重试前的等待时间（秒），之后每次翻倍，默认为5
+            max_retry_delay (float): 重试等待时间的上限（秒），默认为300
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._local = threading.local()
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+        logging.info(f"任务队列已打开: {path}")
+
+    def _connect(self):
+        """返回当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 写事务的等待由 _Transaction 自行重试，见其说明
+            conn = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+            _retry_locked(lambda: conn.execute('PRAGMA journal_mode=WAL'))
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """开始一个写事务（BEGIN IMMEDIATE），多个进程的写入依次进行"""
+        return _Transaction(self._connect())
+
+    # ---- 加入任务 ----
+
+    def enqueue(self, jobs):
+        """批量加入任务
+
+        参数:
+            jobs (list): [(kind, key, payload, version, priority)]，payload 为可JSON编码的数据
+
+        返回:
+            int: 新加入或重新开始的任务数
+        """
+        with self._transaction() as conn:
+            return self._enqueue(conn, jobs, time.time())
+
+    def _enqueue(self, conn, jobs, now):
+        added = 0
+        for kind, key, payload, version, priority in jobs:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, key, payload, version, priority, state, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?) "
+                "ON CONFLICT(kind, key) DO UPDATE SET payload=excluded.payload, version=excluded.version, "
+                "priority=excluded.priority, state='pending', attempts=0, available_at=excluded.available_at, "
+                "lease_owner=NULL, lease_expires=NULL, last_error=NULL, updated_at=excluded.updated_at "
+                "WHERE jobs.state IN ('done', 'failed') AND excluded.version > jobs.version",
+                (kind, str(key), json.dumps(payload, ensure_ascii=False), version, priority, now, now))
+            added += cursor.rowcount
+        return added
+
+    # ---- 领取与处理 ----
+
+    def lease(self, owner, limit=1, lease_seconds=60, kinds=None):
+        """领取最多 limit 个可执行的任务
+
+        先回收租约已过期的任务，再按优先级（数值小的优先）和加入顺序领取。
+
+        参数:
+            owner (str): 领取者标识，同一进程内的线程可共用
+            limit (int): 最多领取的任务数，默认为1
+            lease_seconds (float): 租约有效期（秒），默认为60
+            kinds (list): 只领取这些类型的任务，默认为None（全部）
+
+        返回:
+            list: Job 列表，没有可执行的任务时为空
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._reclaim(conn, now)
+            sql = "SELECT job_id FROM jobs WHERE state = 'pending' AND available_at <= ?"
+            params = [now]
+            if kinds:
+                sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+                params.extend(kinds)
+            sql += " ORDER BY priority, job_id LIMIT ?"
+            params.append(limit)
+            job_ids = [row[0] for row in conn.execute(sql, params)]
+            if not job_ids:
+                return []
+
+            placeholders = ','.join('?' * len(job_ids))
+            conn.execute(
+                f"UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                f"updated_at = ? WHERE job_id IN ({placeholders})",
+                [owner, now + lease_seconds, now, *job_ids])
+            rows = conn.execute(
+                f"SELECT job_id, kind, key, payload, version, attempts FROM jobs WHERE job_id IN ({placeholders}) "
+                f"ORDER BY priority, job_id", job_ids).fetchall()
+        return [Job(job_id, kind, key, json.loads(payload), version, attempts)
+                for job_id, kind, key, payload, version, attempts in rows]
+
+    def _reclaim(self, conn, now):
+        """把租约已过期的任务放回队列，已用完执行次数的标记为失败"""
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', lease_owner = NULL, last_error = '租约过期', updated_at = ? "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts))
+        conn.execute(
+            "UPDATE jobs SET state = 'pending', lease_owner = NULL, last_error = '租约过期', updated_at = ? "
+            "WHERE state = 'leased' AND lease_expires < ?",
+            (now, now))
+
+    def heartbeat(self, owner, lease_seconds=60):
+        """为 owner 持有的全部任务续约，返回续约的任务数"""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE state = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, owner)).rowcount
+
+    def complete(self, job, owner, new_jobs=()):
+        """标记任务完成，并在同一事务中加入它产生的后续任务
+
+        租约已被其他领取者接手时不做任何修改。
+
+        返回:
+            bool: 是否成功标记
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+                "updated_at = ? WHERE job_id = ? AND state = 'leased' AND lease_owner = ?",
+                (now, job.job_id, owner)).rowcount
+            if updated and new_jobs:
+                self._enqueue(conn, new_jobs, now)
+        if not updated:
+            logging.warning(f"任务 {job} 的租约已失效，结果不再提交")
+        return bool(updated)
+
+    def fail(self, job, owner, error):
+        """记录任务失败：未超过最大次数时按指数退避重新排队，否则标记为失败
+
+        返回:
+            bool: 是否会重试
+        """
+        now = time.time()
+        retry = job.attempts < self.max_attempts
+        delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = ?, updated_at = ? WHERE job_id = ? AND state = 'leased' AND lease_owner = ?",
+                (PENDING if retry else FAILED, now + delay, str(error)[:500], now, job.job_id, owner))
+        return retry
+
+    def release(self, owner):
+        """把 owner 持有的任务立即放回队列（进程正常退出时调用），不计入执行次数"""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE state = 'leased' AND lease_owner = ?",
+                (now, owner)).rowcount
+
+    # ---- 查询 ----
+
+    def is_idle(self):
+        """是否已没有等待中或处理中的任务"""
+        row = self._connect().execute(
+            "SELECT 1 FROM jobs WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is None
+
+    def stats(self):
+        """返回各类型任务在各状态下的数量"""
+        rows = self._connect().execute(
+            "SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state").fetchall()
+        stats = {}
+        for kind, state, count in rows:
+            stats.setdefault(kind, {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0})[state] = count
+        return stats
+
+    def failures(self, limit=20):
+        """返回最近失败的任务 [(kind, key, attempts, last_error)]"""
+        return self._connect().execute(
+            "SELECT kind, key, attempts, last_error FROM jobs WHERE state = 'failed' "
+            "ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK
+
+    数据库被其他进程锁定时以1~2毫秒的间隔重试。SQLite自带的忙等待
+    （busy_timeout）会把重试间隔逐步拉长到100毫秒，多个进程频繁领取任务时
+    个别进程可能等待近一秒；写事务都很短，短间隔重试的延迟低得多。
+    """
+
+    def __init__(self, conn, timeout=30):
+        self.conn = conn
+        self.timeout = timeout
+
+    def __enter__(self):
+        _retry_locked(lambda: self.conn.execute('BEGIN IMMEDIATE'), self.timeout)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def _retry_locked(func, timeout=30):
+    """执行 func()，数据库被锁定时短暂等待后重试，超过 timeout 秒后抛出异常"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() > deadline:
+                raise
+        time.sleep(random.uniform(0.001, 0.002))
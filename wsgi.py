@@ -0,0 +1,24 @@
+"""生产环境入口
+
+使用 gunicorn 的多线程 worker 运行：
+
+    gunicorn -k gthread -w 1 --threads 64 -b 0.0.0.0:5000 wsgi:app
+
+处理请求的大部分时间在等待上游响应，一个进程内的多个线程即可同时保持大量进行中的上游请求；
+页面内互不依赖的上游调用再由 HuluxiaCrawler.gather 并发执行。缓存、限速和熔断状态都保存在进程内，
+增加 worker 进程数时每个进程各自限速，后台同步（HULUXIA_SYNC_CATEGORIES）也会在每个进程中各运行一份。
+
+没有安装 gunicorn 时可直接运行 python wsgi.py，使用 werkzeug 的多线程服务器（不开启调试模式）。
+"""
+import logging
+import os
+
+from app import app
+
+if __name__ == '__main__':
+    from werkzeug.serving import run_simple
+
+    host = os.environ.get('HULUXIA_HOST', '0.0.0.0')
+    port = int(os.environ.get('HULUXIA_PORT', 5000))
+    logging.info(f"启动网站: http://{host}:{port}")
+    run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)